@@ -0,0 +1,229 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# ASGI Server: async serving mode for the recommendation API
+#
+# Under sync gunicorn workers a request that has to wait for queue-times.com
+# holds a whole worker process until upstream answers. This module serves the
+# hot endpoints natively on an event loop instead:
+#
+#   POST /recommend, POST /recommend/batch, GET /debug, GET /stream
+#
+# They run the same validation, scoring and response cache as the Flask
+# handlers in predictive_in_park.py, but read snapshots with
+# WAIT_CACHE.get_async, so a cache miss awaits the httpx-based
+# ASYNC_UPSTREAM while the worker keeps answering other requests, and an open
+# /stream costs a coroutine rather than a thread. Session lookups, herding
+# counts and scoring run in worker threads (asyncio.to_thread), so a slow
+# sqlite or disk read never stalls the loop. Every other route is passed
+# through to the Flask app (run in a small thread pool by a2wsgi).
+#
+# Run it with uvicorn workers under gunicorn (see gunicorn.conf.py):
+#     SERVER_MODE=async gunicorn -c gunicorn.conf.py
+# or on its own for development:
+#     uvicorn asgi:app --port 5001
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import os
+import time
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.http import parse_etags
+
+import predictive_in_park as api
+
+# Threads for the routes that still run through Flask (sessions, itinerary, ...)
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 10))
+
+FLASK_APP = WSGIMiddleware(api.app, workers=ASGI_WSGI_THREADS)
+
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]  # what flask_cors sends for CORS(app)
+
+
+class Request:
+    """The bits of an ASGI HTTP scope the handlers need."""
+
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        self.args = {}
+        for key, value in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True):
+            self.args.setdefault(key, value)  # first value wins, like request.args.get
+        self.body = body
+
+    def json(self):
+        """The parsed JSON body, or None if there isn't a valid one."""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _respond(send, status, body=b"", content_type="application/json", headers=()):
+    response_headers = [(b"content-type", content_type.encode()),
+                        (b"content-length", str(len(body)).encode())]
+    response_headers += CORS_HEADERS + list(headers)
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _json(send, data, status=200):
+    """Same bytes jsonify() would send."""
+    await _respond(send, status, (api.app.json.dumps(data) + "\n").encode("utf-8"))
+
+
+async def _cached_json(send, request, entry, volatile):
+    """_cached_json_response for ASGI: 200 with the cached body, or 304."""
+    etag = f'W/"{entry.etag}"'.encode()
+    headers = [(b"etag", etag), (b"cache-control", b"no-cache")]
+    if parse_etags(request.headers.get("if-none-match")).contains_weak(entry.etag):
+        await send({"type": "http.response.start", "status": 304, "headers": headers + CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await _respond(send, 200, entry.render(volatile).encode("utf-8"), headers=headers)
+
+
+# ── handlers ────────────────────────────────────────────────────────────────────
+
+async def recommend(request, receive, send):
+    data = request.json()
+    if not data:
+        return await _json(send, {"error": "No JSON provided"}, 400)
+
+    # Session lookups, herding counts and scoring touch sqlite, shared files and
+    # the CPU; only the snapshot read stays on the loop
+    prepared, error = await asyncio.to_thread(api._prepare_recommend, data)
+    if error:
+        body, status = error
+        return await _json(send, body, status)
+
+    snapshot = await api.WAIT_CACHE.get_async(prepared["park_id"])
+    entry = await asyncio.to_thread(api._recommend_entry, prepared, snapshot,
+                                    parse_etags(request.headers.get("if-none-match")))
+    await _cached_json(send, request, *entry)
+
+
+async def recommend_batch(request, receive, send):
+    items, error = api._batch_items(request.json())
+    if error:
+        return await _json(send, {"error": error}, 400)
+
+    park_ids = sorted(api._batch_park_ids(items))
+    fetched = await asyncio.gather(*(api.WAIT_CACHE.get_async(park_id) for park_id in park_ids))
+    # Scoring a large batch is CPU work; a thread keeps the loop answering meanwhile
+    results = await asyncio.to_thread(api.recommend_batch, items, snapshots=dict(zip(park_ids, fetched)))
+    await _json(send, {"results": results})
+
+
+async def debug(request, receive, send):
+    park_id = api._debug_park_id(request.args.get("park"))
+    snapshot = await api.WAIT_CACHE.get_async(park_id)
+    await _cached_json(send, request, *await asyncio.to_thread(api._debug_entry, park_id, snapshot))
+
+
+async def stream(request, receive, send):
+    park_id = api.PARK_IDS.get(request.args.get("park"))
+    if not park_id:
+        return await _json(send, {"error": f"Unknown park '{request.args.get('park')}'"}, 400)
+    since, error = api._parse_since(request.headers.get("last-event-id") or request.args.get("since"))
+    if error:
+        return await _json(send, {"error": error}, 400)
+
+    await api.WAIT_CACHE.get_async(park_id)            # warm the park without blocking the loop
+    await asyncio.to_thread(api.WAIT_STREAM.watch, park_id)
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ] + CORS_HEADERS})
+
+    async def push(text):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    try:
+        await push(f"retry: {int(api.STREAM_POLL_SECONDS * 1000) + 1000}\n\n")
+        version = since
+        idle_since = time.monotonic()
+        while not disconnected.is_set():
+            events = api.WAIT_STREAM.events_since(park_id, version)
+            for version, event in events:
+                await push(event)
+            if events:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= api.STREAM_HEARTBEAT_SECONDS:
+                await push(": keep-alive\n\n")  # stops proxies from closing an idle stream
+                idle_since = time.monotonic()
+            try:
+                # The pump thread records new versions; poll it at the same pace
+                await asyncio.wait_for(disconnected.wait(), api.STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    except OSError:
+        pass  # client went away mid-write
+    finally:
+        watcher.cancel()
+
+
+ROUTES = {
+    ("POST", "/recommend"): recommend,
+    ("POST", "/recommend/batch"): recommend_batch,
+    ("GET", "/debug"): debug,
+    ("GET", "/stream"): stream,
+}
+
+
+# ── application ─────────────────────────────────────────────────────────────────
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await api.ASYNC_UPSTREAM.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    handler = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if handler is None:
+        return await FLASK_APP(scope, receive, send)
+
+    # Same request metrics the Flask hooks record (profiling stays Flask-only)
+    started = time.perf_counter()
+
+    async def send_with_metrics(message):
+        if message["type"] == "http.response.start":
+            labels = {"endpoint": scope["path"]}
+            api.METRICS.observe("request_seconds", time.perf_counter() - started, labels)
+            api.METRICS.inc("requests_total", {**labels, "status": message["status"]})
+        await send(message)
+
+    request = Request(scope, await _read_body(receive) if scope["method"] == "POST" else b"")
+    await handler(request, receive, send_with_metrics)
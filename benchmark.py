@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+⏱️ Recommendation API Benchmarks
+
+Reproducible, fully offline measurements of the recommendation service. Both
+modes run against the bundled fake queue-times server (fake_queue_times.py),
+so results don't depend on the real upstream or the network.
+
+Usage:
+    python3 benchmark.py micro --output micro.json
+    python3 benchmark.py load --concurrency 32 --duration 20 --workers 2 --output load.json
+    python3 benchmark.py compare baseline.json load.json --threshold 0.10
+
+Modes:
+    micro     in-process timings of haversine, scoring, name resolution,
+              itinerary planning and JSON serialization
+    load      starts the app under gunicorn (or hits --target), drives
+              POST /recommend from many concurrent clients and reports
+              p50/p95/p99 latency and throughput
+    compare   prints the change in every metric shared by two result files
+              and exits with status 1 if any got worse by more than --threshold
+
+Options (load):
+    --concurrency N       concurrent clients
+    --duration SECONDS    how long to drive load (after --warmup)
+    --workers N           gunicorn worker processes
+    --server MODE         "sync" (Flask) or "async" (ASGI on uvicorn workers),
+                          started through gunicorn.conf.py
+    --gunicorn-args ARGS  extra gunicorn arguments, e.g. "--threads 4"
+    --target URL          benchmark an already-running server instead
+    --rides N             rides per park served by the fake upstream
+    --upstream-latency S  delay the fake upstream adds to every response
+
+Results are JSON: {"mode", "params", "environment", "metrics": {name: value}}.
+Metric names ending in _rps are better when higher; everything else is a
+time, better when lower.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARK = "Islands of Adventure"
+
+
+# ── shared setup ────────────────────────────────────────────────────────────────
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def go_offline():
+    """
+    Point this process (and any app it starts) at a fake upstream on a free
+    port, with every state directory in a fresh temp dir so nothing a real
+    server on this host reads (herding counts, metrics, ...) is touched.
+    Must run before predictive_in_park is imported. Returns the fake
+    upstream's port.
+    """
+    port = free_port()
+    state = tempfile.mkdtemp(prefix="udx-bench-")
+    os.environ.update({
+        "QUEUE_TIMES_BASE": f"http://127.0.0.1:{port}/parks/{{}}/queue_times.json",
+        "WAIT_CACHE_DIR": os.path.join(state, "wait-cache"),
+        "WAIT_HISTORY_DIR": os.path.join(state, "wait-history"),
+        "WAIT_HISTORY_ENABLED": "false",
+        "HERDING_DIR": os.path.join(state, "herding"),
+        "METRICS_DIR": os.path.join(state, "metrics"),
+        "PROFILE_DIR": os.path.join(state, "profiles"),
+        "SESSION_STORE": "memory",
+    })
+    sys.path.insert(0, HERE)
+    return port
+
+
+def start_fake_upstream(port, rides=None, latency=0.0, seed=1):
+    """Serve fake queue-times for our parks on `port`."""
+    from fake_queue_times import FakeQueueTimes, default_parks, with_ride_count
+    fake = FakeQueueTimes(with_ride_count(default_parks(), rides), latency=latency, seed=seed)
+    return fake.serve("127.0.0.1", port)
+
+
+def environment():
+    """Where the numbers came from, so runs can be compared fairly."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git_commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def write_results(results, path):
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"📝 Results written to {path}")
+
+
+# ── micro-benchmarks ────────────────────────────────────────────────────────────
+
+def synthetic_park_index(rides, seed=1):
+    """A ParkIndex of `rides` rides scattered over a park-sized area."""
+    from park_index import ParkIndex
+    from predictive_in_park import haversine
+    rng = random.Random(seed)
+    coords = {f"Ride {i}": (28.470 + rng.random() * 0.006, -81.474 + rng.random() * 0.006)
+              for i in range(rides)}
+    waits = {name: rng.randrange(0, 125, 5) for name in coords}
+    return ParkIndex("Synthetic", coords, haversine), waits
+
+
+def micro(args):
+    port = go_offline()
+    os.environ["WAIT_CACHE_REFRESHER"] = "false"
+    server = start_fake_upstream(port, args.rides, seed=args.seed)
+    import predictive_in_park as app_module
+
+    snapshot = app_module.get_wait_snapshot(app_module.PARK_IDS[PARK])
+    rides = list(app_module.PARK_RIDE_COORDS[PARK])
+    last_ride = rides[1]
+    a, b = app_module.RIDE_COORDS[rides[0]], app_module.RIDE_COORDS[rides[5]]
+    result = app_module._recommend_from_snapshot(last_ride, PARK, snapshot, k=5)
+    big_index, big_waits = synthetic_park_index(args.synthetic_rides, args.seed)
+    big_row = big_index.distances[0]
+    big_vector = big_index.wait_vector(big_waits)
+    client = app_module.app.test_client()
+    body = {"last_ride": last_ride, "park": PARK, "exclude_rides": rides[5:8]}
+
+    cases = {
+        "haversine": lambda: app_module.haversine(a, b),
+        "resolve_ride_name": lambda: app_module.resolve_ride_name("flight of the hippogriff"),
+        "score_matrix": lambda: app_module._recommend_from_snapshot(
+            last_ride, PARK, snapshot, scoring_mode="matrix"),
+        "score_loop": lambda: app_module._recommend_from_snapshot(
+            last_ride, PARK, snapshot, scoring_mode="loop"),
+        "score_top5": lambda: app_module._recommend_from_snapshot(last_ride, PARK, snapshot, k=5),
+        f"score_synthetic_{args.synthetic_rides}_rides": lambda: big_index.best(
+            big_row, big_vector, set(), app_module.WAIT_WEIGHT),
+        "recommend_next_ride": lambda: app_module.recommend_next_ride(last_ride, PARK),
+        "itinerary_8_rides": lambda: app_module.plan_park_itinerary(last_ride, PARK, rides[:8], 240),
+        "json_serialize": lambda: json.dumps(result),
+        "flask_jsonify": lambda: app_module.app.json.response(result),
+        "http_recommend_cached": lambda: client.post("/recommend", json=body),
+    }
+
+    metrics = {}
+    print(f"{'benchmark':<36} {'median':>12} {'min':>12}")
+    with app_module.app.app_context():
+        for name, fn in cases.items():
+            if args.only and name not in args.only:
+                continue
+            timer = timeit.Timer(fn)
+            number, _ = timer.autorange()
+            runs = [t / number for t in timer.repeat(repeat=args.repeat, number=number)]
+            metrics[f"micro.{name}.median_us"] = statistics.median(runs) * 1e6
+            metrics[f"micro.{name}.min_us"] = min(runs) * 1e6
+            print(f"{name:<36} {statistics.median(runs) * 1e6:>10.2f}µs {min(runs) * 1e6:>10.2f}µs")
+
+    server.shutdown()
+    results = {
+        "mode": "micro",
+        "params": {"repeat": args.repeat, "rides": args.rides,
+                   "synthetic_rides": args.synthetic_rides, "seed": args.seed},
+        "environment": environment(),
+        "metrics": metrics,
+    }
+    write_results(results, args.output)
+    return results
+
+
+# ── load generator ──────────────────────────────────────────────────────────────
+
+def start_gunicorn(args):
+    """Run the app under gunicorn on a free port. Returns (process, base URL)."""
+    port = free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+           "--bind", f"127.0.0.1:{port}", "--workers", str(args.workers),
+           "--log-level", "warning"] + shlex.split(args.gunicorn_args or "")
+    process = subprocess.Popen(cmd, cwd=HERE, env=dict(os.environ, SERVER_MODE=args.server))
+    return process, f"http://127.0.0.1:{port}"
+
+
+def wait_until_ready(base_url, timeout=30):
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/debug", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def request_bodies(count, seed):
+    """A reproducible mix of /recommend payloads across every park."""
+    from predictive_in_park import PARK_RIDE_COORDS
+    rng = random.Random(seed)
+    parks = list(PARK_RIDE_COORDS)
+    bodies = []
+    for _ in range(count):
+        park = rng.choice(parks)
+        rides = list(PARK_RIDE_COORDS[park])
+        bodies.append({
+            "last_ride": rng.choice(rides),
+            "park": park,
+            "exclude_rides": rng.sample(rides, rng.randint(0, 3)),
+        })
+    return bodies
+
+
+def drive_load(base_url, concurrency, duration, warmup, bodies):
+    """Run `concurrency` keep-alive clients. Returns (latencies_s, errors, elapsed_s)."""
+    import requests
+    url = f"{base_url}/recommend"
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def client(n):
+        session = requests.Session()
+        mine, my_errors = [], []
+        i = n
+        while True:
+            body = bodies[i % len(bodies)]
+            i += concurrency
+            t0 = time.monotonic()
+            if t0 >= stop_at:
+                break
+            try:
+                status = session.post(url, json=body, timeout=30).status_code
+                error = None if status == 200 else f"HTTP {status}"
+            except requests.RequestException as e:
+                error = type(e).__name__
+            t1 = time.monotonic()
+            if t0 >= start_at:  # warmup requests aren't counted
+                if error:
+                    my_errors.append(error)
+                else:
+                    mine.append(t1 - t0)
+        with lock:
+            latencies.extend(mine)
+            errors.extend(my_errors)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, duration
+
+
+def load(args):
+    port = go_offline()
+    server = start_fake_upstream(port, args.rides, args.upstream_latency, args.seed)
+    process = None
+    try:
+        base_url = args.target
+        if not base_url:
+            process, base_url = start_gunicorn(args)
+            if not wait_until_ready(base_url):
+                print("❌ gunicorn did not become ready")
+                sys.exit(1)
+        print(f"🎢 Driving {base_url}/recommend with {args.concurrency} clients for {args.duration}s")
+
+        bodies = request_bodies(args.requests_mix, args.seed)
+        latencies, errors, elapsed = drive_load(base_url, args.concurrency, args.duration,
+                                                args.warmup, bodies)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        server.shutdown()
+
+    latencies.sort()
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    metrics = {
+        "load.p50_ms": ms(percentile(latencies, 50)),
+        "load.p95_ms": ms(percentile(latencies, 95)),
+        "load.p99_ms": ms(percentile(latencies, 99)),
+        "load.max_ms": ms(latencies[-1] if latencies else None),
+        "load.throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+    error_counts = {}
+    for error in errors:
+        error_counts[error] = error_counts.get(error, 0) + 1
+
+    print(f"   requests: {len(latencies)} ok, {len(errors)} failed")
+    for name, value in metrics.items():
+        print(f"   {name:<22} {value}")
+    results = {
+        "mode": "load",
+        "params": {"concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup,
+                   "workers": None if args.target else args.workers,
+                   "server": None if args.target else args.server,
+                   "gunicorn_args": args.gunicorn_args, "target": args.target, "rides": args.rides,
+                   "upstream_latency": args.upstream_latency, "seed": args.seed},
+        "environment": environment(),
+        "metrics": metrics,
+        "requests": {"ok": len(latencies), "failed": len(errors), "errors": error_counts},
+    }
+    write_results(results, args.output)
+    return results
+
+
+# ── comparison ──────────────────────────────────────────────────────────────────
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["metrics"]
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)["metrics"]
+
+    regressions = []
+    print(f"{'metric':<48} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[name], candidate[name]
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if name.endswith("_rps") else change
+        flag = "  ⚠️" if worse > args.threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<48} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the recommendation API")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_micro = sub.add_parser("micro", help="in-process micro-benchmarks")
+    p_micro.add_argument("--repeat", type=int, default=5)
+    p_micro.add_argument("--rides", type=int, default=None)
+    p_micro.add_argument("--synthetic-rides", type=int, default=500)
+    p_micro.add_argument("--only", nargs="*", default=None)
+    p_micro.add_argument("--seed", type=int, default=1)
+    p_micro.add_argument("--output", default=None)
+
+    p_load = sub.add_parser("load", help="end-to-end load test")
+    p_load.add_argument("--concurrency", type=int, default=16)
+    p_load.add_argument("--duration", type=float, default=10)
+    p_load.add_argument("--warmup", type=float, default=2)
+    p_load.add_argument("--workers", type=int, default=2)
+    p_load.add_argument("--server", choices=("sync", "async"), default="sync")
+    p_load.add_argument("--gunicorn-args", default="")
+    p_load.add_argument("--target", default=None)
+    p_load.add_argument("--rides", type=int, default=None)
+    p_load.add_argument("--upstream-latency", type=float, default=0.0)
+    p_load.add_argument("--requests-mix", type=int, default=1000)
+    p_load.add_argument("--seed", type=int, default=1)
+    p_load.add_argument("--output", default=None)
+
+    p_compare = sub.add_parser("compare", help="compare two result files")
+    p_compare.add_argument("baseline")
+    p_compare.add_argument("candidate")
+    p_compare.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args()
+    {"micro": micro, "load": load, "compare": compare}[args.mode](args)
+
+
+if __name__ == "__main__":
+    main()
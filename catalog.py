@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# ────────────────────────────────────────────────────────────────────────────────
+# Park Catalog
+#
+# Parks and rides live in a versioned JSON file (data/catalog.json) instead of
+# the code, so adding a ride or a whole park is a data change:
+#
+#   {"version": 3, "parks": [
+#     {"id": 64, "name": "Islands of Adventure", "rides": [
+#       {"id": 0, "name": "Jurassic World VelociCoaster", "aliases": ["VelociCoaster"],
+#        "type": "coaster", "lat": 28.471231, "lon": -81.472616}, ...]}, ...]}
+#
+# Park ids are queue-times.com ids. Ride ids are ours and must never be reused
+# for a different ride: guest sessions store visited rides as bits at those
+# ids (session_store.RideBits), so a ride keeps its id when renamed, and a
+# reload that moves an existing ride to another id is refused.
+#
+# load_catalog parses and validates the file into per-park compact arrays.
+# RideData builds everything the API serves from one catalog version (park
+# indexes, the name index, session ride bits) and CatalogStore swaps a new
+# RideData in with a single assignment once it is fully built, so requests
+# see either the old catalog or the new one, never a mix. Each worker checks
+# the file every `check_interval` seconds and reloads when its version changes.
+#
+# Run this file to check a catalog, optionally against what upstream reports:
+#     python3 catalog.py data/catalog.json --check-upstream
+# ────────────────────────────────────────────────────────────────────────────────
+
+import json
+import os
+import threading
+import time
+from array import array
+from collections.abc import Mapping
+
+from park_index import ParkIndex
+from ride_names import RideNameIndex, normalize_name
+from session_store import RideBits
+from walkways import load_park_walkways
+
+RIDE_TYPES = ("coaster", "dark_ride", "simulator", "water_ride", "flat_ride", "drop_tower",
+              "carousel", "train", "show", "other")
+
+
+class CatalogError(ValueError):
+    """Raised when a catalog file is malformed or incompatible with the current one."""
+
+
+class ParkCatalog:
+    """One park's rides as parallel arrays, in file order."""
+
+    __slots__ = ("park_id", "name", "ride_ids", "names", "lat", "lon", "types", "aliases", "approximate")
+
+    def __init__(self, park_id, name, rides):
+        self.park_id = park_id
+        self.name = name
+        self.ride_ids = array("I", (ride["id"] for ride in rides))
+        self.names = tuple(ride["name"] for ride in rides)
+        self.lat = array("d", (ride["lat"] for ride in rides))
+        self.lon = array("d", (ride["lon"] for ride in rides))
+        self.types = tuple(ride["type"] for ride in rides)
+        self.aliases = {alias: ride["name"] for ride in rides for alias in ride.get("aliases", ())}
+        self.approximate = frozenset(ride["name"] for ride in rides if ride.get("approximate"))
+
+    def __len__(self):
+        return len(self.names)
+
+    def ride_coords(self):
+        """Ordered {ride_name: (lat, lon)}."""
+        return {name: (lat, lon) for name, lat, lon in zip(self.names, self.lat, self.lon)}
+
+
+class Catalog:
+    """A validated catalog file: `version` plus one ParkCatalog per park, in file order."""
+
+    def __init__(self, version, parks):
+        self.version = version
+        self.parks = parks
+
+    def ride_ids(self):
+        """{ride_name: ride id} across every park."""
+        return {name: ride_id for park in self.parks
+                for name, ride_id in zip(park.names, park.ride_ids)}
+
+    def check_compatible(self, previous):
+        """Refuse a catalog that would give an existing ride a different id."""
+        old_ids = previous.ride_ids()
+        moved = [f"{name} ({old_ids[name]} -> {ride_id})"
+                 for name, ride_id in self.ride_ids().items()
+                 if name in old_ids and old_ids[name] != ride_id]
+        if moved:
+            raise CatalogError(f"ride ids changed: {', '.join(moved)}")
+
+
+def _require(condition, message):
+    if not condition:
+        raise CatalogError(message)
+
+
+def _check_ride(ride, where):
+    _require(isinstance(ride, dict), f"{where}: ride must be an object")
+    ride_id, name = ride.get("id"), ride.get("name")
+    _require(isinstance(ride_id, int) and not isinstance(ride_id, bool) and ride_id >= 0,
+             f"{where}: 'id' must be a non-negative integer")
+    _require(isinstance(name, str) and name.strip(), f"{where}: 'name' must be a non-empty string")
+    for axis, bound in (("lat", 90), ("lon", 180)):
+        value = ride.get(axis)
+        _require(isinstance(value, (int, float)) and not isinstance(value, bool) and -bound <= value <= bound,
+                 f"{where} ({name}): '{axis}' must be a number between -{bound} and {bound}")
+    _require(ride.get("type") in RIDE_TYPES,
+             f"{where} ({name}): 'type' must be one of {', '.join(RIDE_TYPES)}")
+    aliases = ride.get("aliases", [])
+    _require(isinstance(aliases, list) and all(isinstance(a, str) and a.strip() for a in aliases),
+             f"{where} ({name}): 'aliases' must be a list of non-empty strings")
+
+
+def parse_catalog(data):
+    """Validate a decoded catalog document into a Catalog. Raises CatalogError."""
+    _require(isinstance(data, dict), "catalog must be a JSON object")
+    version = data.get("version")
+    _require(isinstance(version, int) and not isinstance(version, bool), "'version' must be an integer")
+    parks = data.get("parks")
+    _require(isinstance(parks, list) and parks, "'parks' must be a non-empty list")
+
+    park_ids, park_names, ride_ids, ride_keys = set(), set(), set(), {}
+    compiled = []
+    for p, park in enumerate(parks):
+        where = f"parks[{p}]"
+        _require(isinstance(park, dict), f"{where}: park must be an object")
+        park_id, park_name, rides = park.get("id"), park.get("name"), park.get("rides")
+        _require(isinstance(park_id, int) and not isinstance(park_id, bool), f"{where}: 'id' must be an integer")
+        _require(isinstance(park_name, str) and park_name.strip(), f"{where}: 'name' must be a non-empty string")
+        _require(park_id not in park_ids, f"{where}: duplicate park id {park_id}")
+        _require(park_name not in park_names, f"{where}: duplicate park name '{park_name}'")
+        _require(isinstance(rides, list), f"{where} ({park_name}): 'rides' must be a list")
+        park_ids.add(park_id)
+        park_names.add(park_name)
+
+        for r, ride in enumerate(rides):
+            ride_where = f"{where}.rides[{r}]"
+            _check_ride(ride, ride_where)
+            _require(ride["id"] not in ride_ids, f"{ride_where}: duplicate ride id {ride['id']}")
+            ride_ids.add(ride["id"])
+            # Names and aliases must resolve to exactly one ride across the catalog
+            for label in [ride["name"], *ride.get("aliases", [])]:
+                key = normalize_name(label)
+                owner = ride_keys.setdefault(key, ride["name"])
+                _require(owner == ride["name"], f"{ride_where}: '{label}' also names '{owner}'")
+        compiled.append(ParkCatalog(park_id, park_name, rides))
+
+    return Catalog(version, compiled)
+
+
+def load_catalog(path):
+    """Read and validate a catalog file. Raises CatalogError (or OSError)."""
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise CatalogError(f"{path}: {e}") from e
+    return parse_catalog(data)
+
+
+class RideData:
+    """
+    Everything the API looks up for one catalog version, built together so it
+    can be swapped as a single object.
+
+    catalog: a Catalog
+    distance_fn: callable((lat, lon), (lat, lon)) -> meters
+    walkways_dir: directory of per-park walkway graphs (see walkways.py)
+    walking_speed_mps: walking speed for the walkway graphs and park indexes
+    """
+
+    def __init__(self, catalog, distance_fn, walkways_dir=None, walking_speed_mps=1.4):
+        self.catalog = catalog
+        self.version = catalog.version
+        self.park_ids = {park.name: park.park_id for park in catalog.parks}
+        self.park_names_by_id = {park.park_id: park.name for park in catalog.parks}
+        self.park_ride_coords = {park.name: park.ride_coords() for park in catalog.parks}
+        self.ride_coords = {name: coord for rides in self.park_ride_coords.values()
+                            for name, coord in rides.items()}
+        self.ride_coords_available = list(self.ride_coords)
+        self.walkways = (load_park_walkways(walkways_dir, self.park_ids, distance_fn, walking_speed_mps)
+                         if walkways_dir else {})
+        self.park_indexes = {
+            park.name: ParkIndex(park.name, self.park_ride_coords[park.name], distance_fn,
+                                 self.walkways.get(park.name), aliases=park.aliases,
+                                 walking_speed_mps=walking_speed_mps)
+            for park in catalog.parks
+        }
+        aliases = {alias: name for park in catalog.parks for alias, name in park.aliases.items()}
+        self.ride_names = RideNameIndex(self.ride_coords, aliases=aliases)
+
+        self.ride_ids = catalog.ride_ids()
+        self.park_ride_ids = {park.name: park.ride_ids for park in catalog.parks}  # aligned with park_indexes
+        self.ride_id_limit = max(self.ride_ids.values(), default=-1) + 1
+        bit_names = [None] * self.ride_id_limit
+        for name, ride_id in self.ride_ids.items():
+            bit_names[ride_id] = name
+        self.ride_bits = RideBits(bit_names)  # bit n = ride id n
+
+    def park_index_for(self, park_id):
+        """ParkIndex for a queue-times park id, or None if the catalog doesn't have it."""
+        name = self.park_names_by_id.get(park_id)
+        return None if name is None else self.park_indexes[name]
+
+
+class CatalogStore:
+    """
+    path: catalog JSON file
+    build: callable(Catalog) -> the object requests read (e.g. a RideData)
+    check_interval: seconds between checks of the file; 0 disables hot reload
+    """
+
+    def __init__(self, path, build, check_interval=30.0):
+        self.path = path
+        self.build = build
+        self.check_interval = check_interval
+        self.listeners = []              # callables(data) run after each swap
+        self.reloads = 0
+        self._file_key = self._stat()
+        self._catalog = load_catalog(path)  # a bad catalog at startup is fatal
+        self.data = build(self._catalog)
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+
+    def current(self):
+        """The data built from the newest good catalog."""
+        if self.check_interval and self._watcher_pid != os.getpid():
+            self._start_watcher()
+        return self.data
+
+    def add_listener(self, fn):
+        """Call fn(data) after every swap (not for the initial load)."""
+        self.listeners.append(fn)
+
+    def reload(self, force=False):
+        """
+        Load the file again if it changed; swap when its version differs.
+        Returns True if a new catalog was swapped in. Never raises: a bad file
+        is reported and the current catalog keeps being served.
+        """
+        with self._lock:
+            file_key = self._stat()
+            if not force and file_key == self._file_key:
+                return False
+            self._file_key = file_key
+            try:
+                catalog = load_catalog(self.path)
+                if not force and catalog.version == self._catalog.version:
+                    print(f"Catalog {self.path} changed but is still version {catalog.version}; "
+                          "bump 'version' to publish it")
+                    return False
+                catalog.check_compatible(self._catalog)
+                data = self.build(catalog)  # built off to the side...
+            except (OSError, CatalogError) as e:
+                print(f"Keeping catalog version {self._catalog.version}: {e}")
+                return False
+            self._catalog, self.data = catalog, data  # ...and swapped in one step
+            self.reloads += 1
+
+        for fn in self.listeners:
+            try:
+                fn(data)
+            except Exception as e:
+                print(f"Catalog listener error: {e}")
+        return True
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _start_watcher(self):
+        """One watcher thread per process (threads don't survive a fork)."""
+        self._watcher_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(self.check_interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"Catalog watcher error: {e}")
+
+        threading.Thread(target=loop, name="catalog-watcher", daemon=True).start()
+
+
+class CatalogView(Mapping):
+    """Read-only mapping that always shows one attribute of the store's current data."""
+
+    def __init__(self, store, attribute):
+        self._store = store
+        self._attribute = attribute
+
+    def _mapping(self):
+        # .data rather than current(): safe at import time, before any fork
+        return getattr(self._store.data, self._attribute)
+
+    def __getitem__(self, key):
+        return self._mapping()[key]
+
+    def __contains__(self, key):
+        return key in self._mapping()
+
+    def get(self, key, default=None):
+        return self._mapping().get(key, default)
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __len__(self):
+        return len(self._mapping())
+
+    def __repr__(self):
+        return repr(self._mapping())
+
+
+def check_upstream(catalog, fetch_ride_names):
+    """
+    Compare every park with upstream's full ride list (open or closed).
+    fetch_ride_names: callable(park_id) -> [upstream ride names]
+    Returns {park_name: {"unknown_upstream": [...], "missing_upstream": [...]}}.
+    """
+    report = {}
+    for park in catalog.parks:
+        names = RideNameIndex(park.names, aliases=park.aliases)
+        upstream = fetch_ride_names(park.park_id)
+        matched = {names.resolve(name) for name in upstream}
+        report[park.name] = {
+            "unknown_upstream": sorted(name for name in upstream if names.resolve(name) is None),
+            "missing_upstream": sorted(name for name in park.names if name not in matched),
+        }
+    return report
+
+
+def main():
+    import argparse
+    from upstream_client import UpstreamClient
+
+    parser = argparse.ArgumentParser(description="Validate a park catalog file")
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "data", "catalog.json"))
+    parser.add_argument("--check-upstream", action="store_true",
+                        help="also compare every park with queue-times.com (QUEUE_TIMES_BASE)")
+    args = parser.parse_args()
+
+    try:
+        catalog = load_catalog(args.path)
+    except (OSError, CatalogError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    rides = sum(len(park) for park in catalog.parks)
+    print(f"✅ {args.path}: version {catalog.version}, {len(catalog.parks)} parks, {rides} rides")
+
+    if args.check_upstream:
+        client = UpstreamClient(os.getenv("QUEUE_TIMES_BASE", "https://queue-times.com/parks/{}/queue_times.json"))
+        problems = 0
+        for park_name, found in check_upstream(catalog, client.fetch_ride_names).items():
+            print(f"🎢 {park_name}")
+            for name in found["unknown_upstream"]:
+                print(f"   upstream ride not in catalog: {name}")
+            for name in found["missing_upstream"]:
+                print(f"   catalog ride not reported upstream: {name}")
+            problems += len(found["unknown_upstream"]) + len(found["missing_upstream"])
+        if problems:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Lets the tests in test/ import the backend modules from the repository root.
+#
+# The API module reads its settings at import, so they are pinned here before
+# any test imports it: state goes to a throwaway directory, nothing refreshes
+# or records in the background, and upstream is an address nobody listens on.
+
+import os
+import tempfile
+
+_STATE_DIR = tempfile.mkdtemp(prefix="udx-test-")
+
+for _name, _value in {
+    "QUEUE_TIMES_BASE": "http://127.0.0.1:9/parks/{}/queue_times.json",
+    "WAIT_CACHE_DIR": os.path.join(_STATE_DIR, "wait-cache"),
+    "WAIT_CACHE_REFRESHER": "false",
+    "WAIT_HISTORY_DIR": os.path.join(_STATE_DIR, "wait-history"),
+    "WAIT_HISTORY_ENABLED": "false",
+    "HERDING_DIR": os.path.join(_STATE_DIR, "herding"),
+    "HERDING_MINUTES_PER_RECOMMENDATION": "0",
+    "METRICS_DIR": os.path.join(_STATE_DIR, "metrics"),
+    "PROFILE_DIR": os.path.join(_STATE_DIR, "profiles"),
+    "CATALOG_CHECK_SECONDS": "0",
+    "SESSION_STORE": "memory",
+}.items():
+    os.environ.setdefault(_name, _value)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+🎢 Fake Queue-Times Server
+
+A local stand-in for queue-times.com that serves queue_times.json-shaped
+payloads for our parks, with injectable latency and errors. Point the API at it
+to exercise the upstream client, circuit breakers and snapshot cache offline.
+
+Usage:
+    python3 fake_queue_times.py --port 8765 --latency 0.2 --error-rate 0.1
+    QUEUE_TIMES_BASE=http://127.0.0.1:8765/parks/{}/queue_times.json python3 predictive_in_park.py
+
+Options:
+    --latency SECONDS     delay added to every response
+    --error-rate RATE     fraction of requests answered with HTTP 503
+    --fail-park ID        park that always answers 503 (repeatable)
+    --seed N              seed for wait times and injected errors
+    --rides N             rides per park: our real rides, then synthetic ones
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_RE = re.compile(r"^/parks/(\d+)/queue_times\.json$")
+
+
+class FakeQueueTimes:
+    """
+    parks: {park_id: [ride names]}
+    latency: seconds added to every response
+    error_rate: fraction of requests answered with HTTP 503
+    fail_parks: park ids that always fail
+    """
+
+    def __init__(self, parks, latency=0.0, error_rate=0.0, fail_parks=(), seed=None):
+        self.parks = {int(k): list(v) for k, v in parks.items()}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_parks = set(int(p) for p in fail_parks)
+        self.requests_served = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def payload(self, park_id):
+        """One queue_times.json document with freshly jittered wait times."""
+        with self._lock:
+            rides = [
+                {
+                    "id": i + 1,
+                    "name": name,
+                    "is_open": self._rng.random() > 0.1,
+                    "wait_time": self._rng.randrange(0, 125, 5),
+                    "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+                }
+                for i, name in enumerate(self.parks[park_id])
+            ]
+        return {"lands": [{"id": 1, "name": "Fake Land", "rides": rides}], "rides": []}
+
+    def handle(self, path):
+        """Return (status, body dict) for a request path."""
+        with self._lock:
+            self.requests_served += 1
+            fail = self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+
+        match = PATH_RE.match(path.split("?")[0])
+        if not match or int(match.group(1)) not in self.parks:
+            return 404, {"error": "Not found"}
+        park_id = int(match.group(1))
+        if fail or park_id in self.fail_parks:
+            return 503, {"error": "Service unavailable (injected)"}
+        return 200, self.payload(park_id)
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Start serving in a daemon thread. Returns the server; use server.server_port."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real upstream
+
+            def do_GET(self):
+                status, body = fake.handle(self.path)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-queue-times", daemon=True).start()
+        return server
+
+
+def default_parks(catalog_path=None):
+    """Our real ride names (from the ride catalog), so responses line up with the API's coordinates."""
+    from catalog import load_catalog
+    catalog_path = catalog_path or os.getenv("CATALOG_PATH") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data", "catalog.json")
+    return {park.park_id: list(park.names) for park in load_catalog(catalog_path).parks}
+
+
+def with_ride_count(parks, rides_per_park):
+    """
+    Resize every park to exactly `rides_per_park` rides: the real names first,
+    padded with "Synthetic Ride N" (which the API reports as unmatched).
+    """
+    if rides_per_park is None:
+        return parks
+    return {
+        park_id: (names + [f"Synthetic Ride {i}" for i in range(len(names), rides_per_park)])[:rides_per_park]
+        for park_id, names in parks.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for queue-times.com")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fail-park", type=int, action="append", default=[])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--rides", type=int, default=None)
+    args = parser.parse_args()
+
+    parks = with_ride_count(default_parks(), args.rides)
+    fake = FakeQueueTimes(parks, args.latency, args.error_rate, args.fail_park, args.seed)
+    server = fake.serve(args.host, args.port)
+    print(f"🎢 Fake queue-times serving on http://{args.host}:{server.server_port}")
+    print(f"   QUEUE_TIMES_BASE=http://{args.host}:{server.server_port}/parks/{{}}/queue_times.json")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Gunicorn configuration
+#
+#     gunicorn -c gunicorn.conf.py
+#
+# SERVER_MODE picks how requests are served:
+#
+#   sync    Flask app (predictive_in_park:app) on gunicorn's default sync
+#           workers: one request per worker at a time
+#   async   ASGI app (asgi:app) on uvicorn workers: each worker is an event
+#           loop, so requests waiting on queue-times.com or holding a /stream
+#           open don't tie up the process (needs uvicorn, uvicorn-worker,
+#           httpx and a2wsgi)
+#
+# Workers come from WEB_CONCURRENCY (gunicorn's own default, 1) and the port
+# from PORT, as on Render; command-line flags override both.
+#
+# GUNICORN_PRELOAD (default true) imports the app once in the master before
+# forking, so the ride catalog, distance matrices and name indexes are built
+# once and shared copy-on-write by every worker instead of once per worker.
+# Background threads (cache refresher, stream pump, metrics flusher) start
+# lazily in each worker, so nothing is lost across the fork.
+#
+# When a worker exits (crash, restart, max_requests) its metrics file in
+# METRICS_DIR is folded into the retired totals (see metrics.py).
+# ────────────────────────────────────────────────────────────────────────────────
+
+import gc
+import os
+
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+
+if SERVER_MODE == "async":
+    wsgi_app = "asgi:app"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    if SERVER_MODE != "sync":
+        print(f"Unknown SERVER_MODE '{SERVER_MODE}', using sync")
+    wsgi_app = "predictive_in_park:app"
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    """Runs in the master after a preload, just before the first worker forks."""
+    if preload_app:
+        # Move everything built so far out of the collector's reach: a gc pass
+        # in a worker would otherwise write to every tracked object's header
+        # and un-share the pages holding them.
+        gc.freeze()
+        server.log.info("Preloaded app; %d objects frozen for copy-on-write sharing", gc.get_freeze_count())
+
+
+def child_exit(server, worker):
+    """Runs in the master after a worker exits."""
+    from metrics import DEFAULT_DIRECTORY, retire_worker
+    try:
+        retire_worker(os.getenv("METRICS_DIR", DEFAULT_DIRECTORY), worker.pid)
+    except OSError as e:
+        server.log.warning("Could not retire metrics of worker %s: %s", worker.pid, e)
@@ -0,0 +1,214 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Recommendation Counts (herding control)
+#
+# Greedy scoring sends every guest leaving the same ride to the same "best"
+# ride, and queue-times.com only shows the resulting queue minutes later. So we
+# count the recommendations we issue per ride over a sliding window and score
+# each ride as if its queue were already that much longer (see the penalty in
+# predictive_in_park.py), which spreads guests over near-equal options.
+#
+# Counts are sharded by process: each gunicorn worker owns one memory-mapped
+# file, <directory>/herding-<pid>.bin, and is its only writer, so workers never
+# contend. A shard is a ring of `slots` time buckets of `bucket_seconds` each:
+#
+#   header    "UDXH", capacity, slots, bucket_seconds   (4 x uint32)
+#   epochs    int64 per slot: which bucket (time // bucket_seconds) it holds
+#   counts    uint32 per slot per ride id (catalog ids, see catalog.py)
+#
+# Recording is one integer add in the worker's own map. Reads sum every shard's
+# live buckets at most once per `refresh_interval` and add what this worker
+# has recorded since, so a worker sees its own recommendations immediately and
+# the other workers' within `refresh_interval`. Buckets age out by epoch, so
+# shards left by exited workers stop counting on their own and are then deleted.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+_HEADER = struct.Struct("<4sIII")
+_MAGIC = b"UDXH"
+
+
+class _Shard:
+    """Memory map of one worker's shard file, with views over its epochs and counts."""
+
+    def __init__(self, path, writable=False):
+        with open(path, "r+b" if writable else "rb") as f:
+            self.key = os.fstat(f.fileno()).st_ino
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, self.capacity, self.slots, self.bucket_seconds = _HEADER.unpack_from(self.map)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a recommendation count shard")
+        counts_at = _HEADER.size + 8 * self.slots
+        self.epochs = memoryview(self.map)[_HEADER.size:counts_at].cast("q")
+        self.counts = memoryview(self.map)[counts_at:].cast("I")
+
+    @staticmethod
+    def create(path, capacity, slots, bucket_seconds):
+        """Write an empty shard file atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, capacity, slots, bucket_seconds))
+            f.write(struct.pack(f"<{slots}q", *([-1] * slots)))
+            f.write(bytes(4 * slots * capacity))
+        os.replace(tmp_path, path)
+
+
+class RecommendationCounter:
+    """
+    directory: shared by every worker; one shard file per process
+    capacity: ride ids counted (ids >= capacity grow the shard, see ensure_capacity)
+    window_seconds: how far back recommendations count
+    bucket_seconds: granularity the window slides by
+    refresh_interval: seconds between re-reads of the other workers' shards
+    """
+
+    def __init__(self, directory, capacity=64, window_seconds=300, bucket_seconds=30, refresh_interval=1.0):
+        self.directory = directory
+        self.capacity = capacity
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self.slots = max(1, -(-int(window_seconds) // self.bucket_seconds))  # ceil
+        self.refresh_interval = refresh_interval
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._pid = None
+        self._own = None          # this process's writable _Shard
+        self._readers = {}        # path -> read-only _Shard
+        self._totals = {}         # ride id -> count over every shard at the last refresh
+        self._pending = {}        # ride id -> recorded by this process since then
+        self._refreshed_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f"herding-{pid or os.getpid()}.bin")
+
+    def _own_shard(self):
+        """This process's shard, created on first use (a forked worker gets its own)."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            _Shard.create(self._path(), self.capacity, self.slots, self.bucket_seconds)
+            self._own = _Shard(self._path(), writable=True)
+            self._totals, self._pending, self._refreshed_at = {}, {}, 0.0
+        return self._own
+
+    # ── recording ───────────────────────────────────────────────────────────────
+
+    def record(self, ride_id, now=None):
+        """Count one recommendation of `ride_id` now."""
+        epoch = int((time.time() if now is None else now) // self.bucket_seconds)
+        with self._lock:
+            shard = self._own_shard()
+            if ride_id >= shard.capacity:
+                return  # ensure_capacity wasn't told about this ride yet
+            slot = epoch % shard.slots
+            if shard.epochs[slot] != epoch:
+                # The bucket rolled over: clear it before claiming it
+                base = slot * shard.capacity
+                shard.counts[base:base + shard.capacity] = memoryview(bytes(4 * shard.capacity)).cast("I")
+                shard.epochs[slot] = epoch
+            shard.counts[slot * shard.capacity + ride_id] += 1
+            self._pending[ride_id] = self._pending.get(ride_id, 0) + 1
+            self.recorded += 1
+
+    def ensure_capacity(self, capacity):
+        """Grow this process's shard so ride ids below `capacity` can be counted."""
+        with self._lock:
+            if capacity <= self.capacity:
+                return
+            self.capacity = max(capacity, 2 * self.capacity)
+            if self._pid != os.getpid():
+                return  # no shard yet; the first record creates it at the new size
+            old = self._own
+            _Shard.create(self._path(), self.capacity, self.slots, self.bucket_seconds)
+            self._own = new = _Shard(self._path(), writable=True)
+            new.epochs[:] = old.epochs
+            for slot in range(old.slots):
+                new.counts[slot * new.capacity:slot * new.capacity + old.capacity] = \
+                    old.counts[slot * old.capacity:(slot + 1) * old.capacity]
+
+    # ── reading ─────────────────────────────────────────────────────────────────
+
+    def counts(self, ride_ids, now=None):
+        """Recommendations per ride id over the window, in the order given."""
+        now = time.time() if now is None else now
+        if now - self._refreshed_at >= self.refresh_interval and self._refreshing.acquire(blocking=False):
+            try:  # one thread re-reads; the others keep using the last totals meanwhile
+                self.refresh(now)
+            finally:
+                self._refreshing.release()
+        totals, pending = self._totals, self._pending
+        return [totals.get(i, 0) + pending.get(i, 0) for i in ride_ids]
+
+    def refresh(self, now=None):
+        """Re-sum the live buckets of every worker's shard."""
+        now = time.time() if now is None else now
+        epoch = int(now // self.bucket_seconds)
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, "herding-*.bin")):
+            if path == self._path():
+                continue
+            shard = self._reader(path)
+            if shard is not None and not self._add_live(shard, epoch, totals):
+                self._forget_if_dead(path)
+
+        with self._lock:
+            own = self._own_shard()
+            self._add_live(own, epoch, totals)  # under the lock, so nothing is counted twice
+            self._totals, self._pending, self._refreshed_at = totals, {}, now
+
+    def _reader(self, path):
+        """Cached read-only map of another worker's shard, remapped if the file was replaced."""
+        try:
+            key = os.stat(path).st_ino
+        except FileNotFoundError:
+            self._readers.pop(path, None)
+            return None
+        shard = self._readers.get(path)
+        if shard is None or shard.key != key:
+            try:
+                shard = self._readers[path] = _Shard(path)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable recommendation count shard {path}: {e}")
+                return None
+        return shard
+
+    @staticmethod
+    def _add_live(shard, epoch, totals):
+        """Add a shard's buckets inside the window to totals. Returns False if none were live."""
+        live = False
+        capacity, counts = shard.capacity, shard.counts
+        for slot in range(shard.slots):
+            bucket_epoch = shard.epochs[slot]
+            if not epoch - shard.slots < bucket_epoch <= epoch:
+                continue
+            live = True
+            base = slot * capacity
+            for ride_id, count in enumerate(counts[base:base + capacity]):
+                if count:
+                    totals[ride_id] = totals.get(ride_id, 0) + count
+        return live
+
+    def _forget_if_dead(self, path):
+        """Delete an idle shard whose worker has exited."""
+        try:
+            pid = int(os.path.basename(path)[len("herding-"):-len(".bin")])
+            os.kill(pid, 0)
+            return  # still running, just quiet
+        except ProcessLookupError:
+            pass
+        except (ValueError, OSError):
+            return
+        self._readers.pop(path, None)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {"recorded": self.recorded, "shards": len(self._readers) + (self._own is not None),
+                "window_seconds": self.slots * self.bucket_seconds}
@@ -0,0 +1,162 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Multi-Stop Itinerary Planner
+#
+# Orders a guest's must-do rides to fit as many as possible into their time
+# budget with the least walking + queueing. Waits may depend on when the guest
+# arrives (forecasts), so every plan is evaluated by walking it in order:
+#
+#   arrive(i) = finish(previous) + walk(previous, i)
+#   finish(i) = arrive(i) + wait(i, arrive(i))
+#
+# Small sets are solved exactly with dynamic programming over subsets
+# (Held-Karp); larger ones use nearest-neighbour followed by 2-opt. Planning is
+# capped by a wall-clock deadline: the heuristic plan is built first, so if the
+# deadline hits during the exact search or 2-opt, the best plan so far is kept.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import time
+
+
+class PlanningTimeout(Exception):
+    """Internal: the exact search ran past its deadline."""
+
+
+def walk_plan(order, start_walk, pair_walk, wait_fn):
+    """[(arrive, wait, finish), ...] in seconds from the start for a visiting order."""
+    timeline = []
+    t, prev = 0.0, None
+    for i in order:
+        arrive = t + (start_walk[i] if prev is None else pair_walk[prev][i])
+        wait = wait_fn(i, arrive)
+        t = arrive + wait
+        timeline.append((arrive, wait, t))
+        prev = i
+    return timeline
+
+
+def _fit_budget(order, start_walk, pair_walk, wait_fn, budget):
+    """Longest prefix of `order` that finishes within budget."""
+    timeline = walk_plan(order, start_walk, pair_walk, wait_fn)
+    n = 0
+    while n < len(timeline) and timeline[n][2] <= budget:
+        n += 1
+    return list(order[:n])
+
+
+def _plan_key(order, start_walk, pair_walk, wait_fn):
+    """Rides completed (more is better), then total seconds (less is better)."""
+    timeline = walk_plan(order, start_walk, pair_walk, wait_fn)
+    return (-len(order), timeline[-1][2] if timeline else 0.0)
+
+
+def nearest_neighbour(targets, start_walk, pair_walk, wait_fn):
+    """Greedy order: always go where we'd be done soonest."""
+    remaining = set(targets)
+    order, t, prev = [], 0.0, None
+    while remaining:
+        best, best_finish = None, None
+        for i in remaining:
+            arrive = t + (start_walk[i] if prev is None else pair_walk[prev][i])
+            finish = arrive + wait_fn(i, arrive)
+            if best_finish is None or finish < best_finish:
+                best, best_finish = i, finish
+        order.append(best)
+        remaining.discard(best)
+        t, prev = best_finish, best
+    return order
+
+
+def two_opt(order, start_walk, pair_walk, wait_fn, deadline):
+    """Reverse segments while that shortens the full (time-dependent) plan."""
+    best = list(order)
+    best_total = walk_plan(best, start_walk, pair_walk, wait_fn)[-1][2] if best else 0.0
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for a in range(len(best) - 1):
+            if time.monotonic() >= deadline:
+                break
+            for b in range(a + 1, len(best)):
+                candidate = best[:a] + best[a:b + 1][::-1] + best[b + 1:]
+                total = walk_plan(candidate, start_walk, pair_walk, wait_fn)[-1][2]
+                if total < best_total - 1e-9:
+                    best, best_total, improved = candidate, total, True
+    return best
+
+
+def held_karp(targets, start_walk, pair_walk, wait_fn, budget, deadline):
+    """
+    Exact DP over subsets: for every (visited set, last ride) keep the earliest
+    finish time. Returns the order completing the most rides within budget,
+    fastest among those. Raises PlanningTimeout past the deadline.
+    """
+    n = len(targets)
+    best = {}    # (mask, j) -> finish seconds
+    parent = {}  # (mask, j) -> previous j (or None)
+    for j in range(n):
+        i = targets[j]
+        arrive = start_walk[i]
+        finish = arrive + wait_fn(i, arrive)
+        if finish <= budget:
+            best[(1 << j, j)] = finish
+            parent[(1 << j, j)] = None
+
+    for mask in range(1, 1 << n):
+        if mask & 0xF == 0 and time.monotonic() >= deadline:
+            raise PlanningTimeout()
+        for j in range(n):
+            t = best.get((mask, j))
+            if t is None:
+                continue
+            for k in range(n):
+                if mask & (1 << k):
+                    continue
+                i = targets[k]
+                arrive = t + pair_walk[targets[j]][i]
+                finish = arrive + wait_fn(i, arrive)
+                if finish > budget:
+                    continue
+                state = (mask | (1 << k), k)
+                if finish < best.get(state, float("inf")):
+                    best[state] = finish
+                    parent[state] = j
+
+    if not best:
+        return []
+    mask, j = min(best, key=lambda s: (-bin(s[0]).count("1"), best[s]))
+    order = []
+    while j is not None:
+        order.append(targets[j])
+        mask, j = mask & ~(1 << j), parent[(mask, j)]
+    return order[::-1]
+
+
+def plan_itinerary(targets, start_walk, pair_walk, wait_fn, budget,
+                   exact_limit=10, time_limit=0.25):
+    """
+    targets: indices to visit
+    start_walk[i]: seconds walking from the start to i
+    pair_walk[i][j]: seconds walking from i to j
+    wait_fn(i, arrive): queue seconds at i when arriving `arrive` seconds in
+    budget: seconds available
+    Returns (order, method) where order fits the budget and method is
+    "exact" or "heuristic".
+    """
+    deadline = time.monotonic() + time_limit
+    targets = list(targets)
+
+    order = nearest_neighbour(targets, start_walk, pair_walk, wait_fn)
+    heuristic = _fit_budget(order, start_walk, pair_walk, wait_fn, budget)
+
+    if len(targets) <= exact_limit:
+        try:
+            exact = held_karp(targets, start_walk, pair_walk, wait_fn, budget, deadline)
+            return exact, "exact"
+        except PlanningTimeout:
+            return heuristic, "heuristic"
+
+    improved = two_opt(order, start_walk, pair_walk, wait_fn, deadline)
+    improved = _fit_budget(improved, start_walk, pair_walk, wait_fn, budget)
+    if _plan_key(improved, start_walk, pair_walk, wait_fn) < _plan_key(heuristic, start_walk, pair_walk, wait_fn):
+        return improved, "heuristic"
+    return heuristic, "heuristic"
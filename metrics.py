@@ -0,0 +1,385 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Metrics and Profiling
+#
+# Cheap counters and timing histograms for the hot paths, exported in the
+# Prometheus text format. Every gunicorn worker keeps its own numbers in memory
+# (a dict update under a lock per event) and periodically writes them to
+# <directory>/metrics-<pid>.json; a scrape of any worker sums the files of all
+# workers, so /metrics shows the whole service no matter which worker answers.
+# When a worker exits its numbers are folded into metrics-retired.json and its
+# file is removed (from gunicorn's child_exit hook, or by the next scrape that
+# finds its pid gone), so counters never go backwards and the directory
+# doesn't grow with every worker restart.
+#
+# Gauges of shared state (snapshot age) are computed by the scraping worker
+# when it renders. Per-worker gauges (breaker state, which each worker tracks
+# on its own) are written to each worker's file and exported with a pid label
+# for every live worker.
+#
+# RequestProfiler runs cProfile on a random sample of requests and dumps a
+# .prof file per profiled request (open with `python -m pstats` or snakeviz).
+# ────────────────────────────────────────────────────────────────────────────────
+
+import bisect
+import cProfile
+import glob
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl  # POSIX only; elsewhere retiring and scraping aren't serialized
+except ImportError:
+    fcntl = None
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "udx-metrics")
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _series(labels):
+    """Prometheus label string for a labels dict: {"park_id": 64} -> '{park_id="64"}'."""
+    if not labels:
+        return ""
+    parts = []
+    for key in sorted(labels):
+        value = str(labels[key]).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _with_le(series, le):
+    le_label = f'le="{le}"'
+    return "{" + le_label + "}" if not series else series[:-1] + "," + le_label + "}"
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics, self.name, self.labels = metrics, name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+class Metrics:
+    """
+    directory: shared by every worker; one metrics-<pid>.json file per process
+    prefix: prepended to every metric name
+    flush_interval: seconds between background writes of this process's file
+    """
+
+    def __init__(self, directory, prefix="udx_", flush_interval=5.0):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self._help = {}        # name -> (type, help text, buckets)
+        self._counters = {}    # name -> {series: value}
+        self._histograms = {}  # name -> {series: [bucket counts..., sum, count]}
+        self._counter_sources = []  # (name, labels, fn() -> cumulative count)
+        self._gauges = {}           # name -> fn() -> value or [(labels, value), ...]
+        self._worker_gauges = set()  # gauge names exported per worker, with a pid label
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ── declaring ───────────────────────────────────────────────────────────────
+
+    def counter(self, name, help_text):
+        self._help[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._help[name] = ("histogram", help_text, tuple(buckets))
+
+    def gauge(self, name, help_text, fn, per_worker=False):
+        """
+        fn() -> number, or [(labels dict, number), ...]; called at scrape time,
+        or with per_worker at every flush of each worker, which is exported with
+        a pid label.
+        """
+        self._help[name] = ("gauge", help_text, None)
+        self._gauges[name] = fn
+        if per_worker:
+            self._worker_gauges.add(name)
+
+    def counter_source(self, name, fn, labels=None):
+        """Export a cumulative count this process already keeps (e.g. cache hits)."""
+        self._counter_sources.append((name, _series(labels), fn))
+
+    # ── recording ───────────────────────────────────────────────────────────────
+
+    def inc(self, name, labels=None, value=1):
+        series = _series(labels)
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[series] = values.get(series, 0) + value
+        self._ensure_flusher()
+
+    def observe(self, name, seconds, labels=None):
+        buckets = self._help[name][2]
+        series = _series(labels)
+        with self._lock:
+            values = self._histograms.setdefault(name, {})
+            counts = values.get(series)
+            if counts is None:
+                # one slot per bucket, one for above the last bucket, then sum and count
+                counts = values[series] = [0] * (len(buckets) + 3)
+            counts[bisect.bisect_left(buckets, seconds)] += 1
+            counts[-2] += seconds
+            counts[-1] += 1
+        self._ensure_flusher()
+
+    def timer(self, name, labels=None):
+        """with metrics.timer("scoring_seconds"): ..."""
+        return _Timer(self, name, labels)
+
+    # ── sharing between workers ─────────────────────────────────────────────────
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f"metrics-{pid or os.getpid()}.json")
+
+    def flush(self):
+        """Write this process's numbers to its file (atomically)."""
+        with self._lock:
+            data = {
+                "counters": {name: dict(values) for name, values in self._counters.items()},
+                "histograms": {name: {s: list(c) for s, c in values.items()}
+                               for name, values in self._histograms.items()},
+            }
+        for name, series, fn in self._counter_sources:
+            try:
+                data["counters"].setdefault(name, {})[series] = fn()
+            except Exception as e:
+                print(f"Metrics source {name} failed: {e}")
+        data["gauges"] = {name: self._gauge_values(name) for name in self._worker_gauges}
+
+        _write(self.directory, self._path(), data)
+
+    def _ensure_flusher(self):
+        """One background flush thread per process (threads don't survive a fork)."""
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Metrics flush error: {e}")
+
+        threading.Thread(target=loop, name="metrics-flusher", daemon=True).start()
+
+    def collect(self):
+        """
+        (counters, histograms) summed over every worker's file, and the
+        per-worker gauges as {name: [(labels with pid, value), ...]}.
+        """
+        self.flush()
+        counters, histograms, gauges, dead = {}, {}, {}, []
+        with _DirectoryLock(self.directory, shared=True):
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+                pid = _file_pid(path)
+                if pid is not None and not _pid_alive(pid):
+                    dead.append(pid)
+                data = _read(path)
+                if data is None:
+                    continue
+                _merge(counters, histograms, data)
+                if pid is not None and pid not in dead:
+                    for name, values in data.get("gauges", {}).items():
+                        gauges.setdefault(name, []).extend(({**labels, "pid": pid}, value)
+                                                           for labels, value in values)
+        for pid in dead:
+            retire_worker(self.directory, pid)  # still counted above, now in the retired file
+        return counters, histograms, gauges
+
+    # ── exporting ───────────────────────────────────────────────────────────────
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        counters, histograms, worker_gauges = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in self._help.items():
+            full = self.prefix + name
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            if kind == "counter":
+                for series, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{full}{series} {value}")
+            elif kind == "histogram":
+                for series, counts in sorted(histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for le, count in zip(buckets, counts):
+                        cumulative += count
+                        lines.append(f"{full}_bucket{_with_le(series, le)} {cumulative}")
+                    lines.append(f"{full}_bucket{_with_le(series, '+Inf')} {counts[-1]}")
+                    lines.append(f"{full}_sum{series} {counts[-2]}")
+                    lines.append(f"{full}_count{series} {counts[-1]}")
+            elif name in self._worker_gauges:
+                lines.extend(f"{full}{_series(labels)} {value}"
+                             for labels, value in sorted(worker_gauges.get(name, []), key=lambda lv: _series(lv[0]))
+                             if value is not None)
+            elif kind == "gauge":
+                lines.extend(self._render_gauge(name, full))
+        return "\n".join(lines) + "\n"
+
+    def _gauge_values(self, name):
+        """[(labels dict, value), ...] from a gauge's fn, or [] if it fails."""
+        try:
+            values = self._gauges[name]()
+        except Exception as e:
+            print(f"Metrics gauge {name} failed: {e}")
+            return []
+        if not isinstance(values, list):
+            values = [({}, values)]
+        return [(labels or {}, value) for labels, value in values]
+
+    def _render_gauge(self, name, full):
+        return [f"{full}{_series(labels)} {value}" for labels, value in self._gauge_values(name) if value is not None]
+
+
+# ── retiring exited workers ─────────────────────────────────────────────────────
+
+def retire_worker(directory, pid):
+    """
+    Fold an exited worker's counters and histograms into metrics-retired.json
+    and remove its file. Safe to call more than once for the same pid.
+    """
+    path = os.path.join(directory, f"metrics-{pid}.json")
+    with _DirectoryLock(directory):
+        data = _read(path) if os.path.exists(path) else None
+        if data is None:
+            return
+        retired_path = os.path.join(directory, "metrics-retired.json")
+        counters, histograms = {}, {}
+        for source in (_read(retired_path) if os.path.exists(retired_path) else None, data):
+            if source is not None:
+                _merge(counters, histograms, source)
+        _write(directory, retired_path, {"counters": counters, "histograms": histograms})
+        os.unlink(path)
+
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable metrics file {path}: {e}")
+        return None
+
+
+def _write(directory, path, data):
+    """Write atomically so scrapes never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _merge(counters, histograms, data):
+    """Add one file's counters and histograms into the running totals."""
+    for name, values in data.get("counters", {}).items():
+        merged = counters.setdefault(name, {})
+        for series, value in values.items():
+            merged[series] = merged.get(series, 0) + value
+    for name, values in data.get("histograms", {}).items():
+        merged = histograms.setdefault(name, {})
+        for series, counts in values.items():
+            total = merged.get(series)
+            if total is None or len(total) != len(counts):
+                merged[series] = list(counts)
+            else:
+                merged[series] = [a + b for a, b in zip(total, counts)]
+
+
+def _file_pid(path):
+    """The worker pid in metrics-<pid>.json, or None (e.g. the retired file)."""
+    stem = os.path.basename(path)[len("metrics-"):-len(".json")]
+    return int(stem) if stem.isdigit() else None
+
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _DirectoryLock:
+    """Advisory lock on the metrics directory: scrapes share it, retiring a worker takes it exclusively."""
+
+    def __init__(self, directory, shared=False):
+        self.path = os.path.join(directory, "metrics.lock")
+        self.shared = shared
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        return False
+
+
+class RequestProfiler:
+    """
+    rate: fraction of requests to profile (0 disables)
+    directory: where .prof files are written
+    """
+
+    def __init__(self, rate=0.0, directory=None):
+        self.rate = rate
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "udx-profiles")
+        self._active = threading.Lock()  # the interpreter allows one active profiler at a time
+
+    def maybe_start(self):
+        """A running cProfile.Profile for a sampled request, else None."""
+        if self.rate <= 0 or random.random() >= self.rate:
+            return None
+        if not self._active.acquire(blocking=False):
+            return None  # another request in this worker is being profiled
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # some other profiler or debugger is active
+            self._active.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, name):
+        """Stop a profiler from maybe_start and write <name>-<time>-<pid>.prof."""
+        profiler.disable()
+        self._active.release()
+        os.makedirs(self.directory, exist_ok=True)
+        safe = "".join(ch if ch.isalnum() else "_" for ch in name).strip("_") or "request"
+        path = os.path.join(self.directory, f"{safe}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        return path
@@ -0,0 +1,280 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Per-Park Ride Index
+#
+# Ride coordinates only change with the catalog (catalog.py), so each park's
+# rides are compiled once per catalog version into index arrays (names, coords)
+# plus a pairwise distance matrix. Scoring a request is then a single pass over
+# one matrix row:
+#
+#     score[i] = distance[last][i] + wait[i] * wait_weight
+#
+# with closed rides, the last ride and excluded rides masked out, followed by
+# an argmin. No trig runs on the request path unless the origin is a ride from
+# another park. When the park has a walkway graph (walkways.py) the matrix holds
+# shortest walking distances instead of straight lines, and a second matrix
+# holds walking times (the graph's per-edge times where it has them, e.g. for
+# stairs, otherwise distance / walking speed) for arrival-time estimates.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import heapq
+from math import cos, radians
+
+from ride_names import RideNameIndex
+
+EARTH_RADIUS_M = 6371000
+
+
+class ParkIndex:
+    """
+    park_name: display name used in PARK_IDS
+    ride_coords: ordered {ride_name: (lat, lon)} for the rides in this park
+    distance_fn: callable((lat, lon), (lat, lon)) -> meters
+    walkways: optional WalkwayGraph; rides with an entrance node use walking distances
+    aliases: optional {alias: ride_name} the name index also accepts
+    walking_speed_mps: pace for walks that don't follow the walkway graph
+    """
+
+    def __init__(self, park_name, ride_coords, distance_fn, walkways=None, aliases=None, walking_speed_mps=1.4):
+        self.park_name = park_name
+        self.distance_fn = distance_fn
+        self.walking_speed_mps = walking_speed_mps
+        self.names = tuple(ride_coords)
+        self.coords = tuple(ride_coords[name] for name in self.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.name_index = RideNameIndex(self.names, aliases=aliases)
+        self.grid = SpatialGrid(self.coords, distance_fn)
+        self.walkways = walkways
+        self.ride_nodes = tuple(
+            walkways.ride_nodes.get(name) if walkways else None for name in self.names
+        )
+        # Walks are symmetric, so only the upper triangle is computed
+        n = len(self.names)
+        rows = [[0.0] * n for _ in range(n)]
+        times = [[0.0] * n for _ in range(n)]
+        for i in range(n):
+            for j in range(i + 1, n):
+                meters, seconds = self._pair_walk(i, j)
+                rows[i][j] = rows[j][i] = meters
+                times[i][j] = times[j][i] = seconds
+        self.distances = tuple(tuple(row) for row in rows)
+        self.walk_times = tuple(tuple(row) for row in times)  # seconds
+        self._wait_cache = (None, None)  # (snapshot version, wait vector)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _pair_walk(self, i, j):
+        """(meters, seconds) of the walk between two rides; the straight line without a graph path."""
+        a, b = self.ride_nodes[i], self.ride_nodes[j]
+        if a is not None and b is not None:
+            meters = self.walkways.distance(a, b)
+            if meters != float("inf"):
+                return meters, self.walkways.walk_seconds(a, b)
+        meters = self.distance_fn(self.coords[i], self.coords[j])
+        return meters, meters / self.walking_speed_mps
+
+    def distance_row(self, origin_name, origin_coord):
+        """Distances from the origin to every ride in this park."""
+        i = self.index.get(origin_name)
+        if i is not None:
+            return self.distances[i]
+        if self.walkways is None or not self.walkways.ids:
+            return tuple(self.distance_fn(origin_coord, c) for c in self.coords)
+
+        # Walk to the nearest walkway node, then along the graph.
+        start, to_start = self.walkways.nearest_node(origin_coord)
+        row = []
+        for node, coord in zip(self.ride_nodes, self.coords):
+            meters = self.walkways.distance(start, node) if node is not None else float("inf")
+            row.append(to_start + meters if meters != float("inf")
+                       else self.distance_fn(origin_coord, coord))
+        return tuple(row)
+
+    def walk_row(self, origin_name, origin_coord):
+        """Walking seconds from the origin to every ride in this park."""
+        i = self.index.get(origin_name)
+        if i is not None:
+            return self.walk_times[i]
+        if self.walkways is None or not self.walkways.ids:
+            return tuple(meters / self.walking_speed_mps for meters in self.distance_row(origin_name, origin_coord))
+
+        start, to_start = self.walkways.nearest_node(origin_coord)
+        row = []
+        for node, coord in zip(self.ride_nodes, self.coords):
+            seconds = self.walkways.walk_seconds(start, node) if node is not None else float("inf")
+            row.append(to_start / self.walking_speed_mps + seconds if seconds != float("inf")
+                       else self.distance_fn(origin_coord, coord) / self.walking_speed_mps)
+        return tuple(row)
+
+    def path(self, origin_name, origin_coord, target):
+        """
+        (polyline, source) from the origin to ride index `target`: the walkway
+        path when the graph connects them, else the straight line.
+        """
+        node = self.ride_nodes[target]
+        if node is not None:
+            origin_i = self.index.get(origin_name)
+            origin_node = self.ride_nodes[origin_i] if origin_i is not None else None
+            if origin_node is not None:
+                polyline = self.walkways.path(origin_node, node)
+            else:
+                start, _ = self.walkways.nearest_node(origin_coord)
+                polyline = self.walkways.path(start, node)
+                if polyline is not None:
+                    polyline = [tuple(origin_coord)] + polyline
+            if polyline is not None:
+                return polyline, "walkways"
+        return [tuple(origin_coord), self.coords[target]], "straight_line"
+
+    def wait_vector(self, wait_times, version=None):
+        """
+        Waits aligned with `names`; None marks rides that are closed or missing
+        upstream. Reused for every request that shares a snapshot version.
+        """
+        cached_version, cached = self._wait_cache
+        if version is not None and version == cached_version:
+            return cached
+        vector = tuple(wait_times.get(name) for name in self.names)
+        if version is not None:
+            self._wait_cache = (version, vector)
+        return vector
+
+    def mask(self, names):
+        """Set of indices for the given ride names (unknown names are ignored)."""
+        return {self.index[n] for n in names if n in self.index}
+
+    def scores(self, row, waits, skip, wait_weight=10):
+        """(score, index) for every open ride that isn't skipped."""
+        return [
+            (row[i] + w * wait_weight, i)
+            for i, w in enumerate(waits)
+            if w is not None and i not in skip
+        ]
+
+    def best(self, row, waits, skip, wait_weight=10):
+        """Index of the lowest-scoring open ride, or None if nothing qualifies."""
+        scored = self.scores(row, waits, skip, wait_weight)
+        if not scored:
+            return None
+        return min(scored)[1]
+
+    def top(self, row, waits, skip, k, wait_weight=10):
+        """
+        The k lowest (score, index) pairs, best first. Uses a bounded heap so
+        only k entries are ever ordered, not the whole park.
+        """
+        scored = self.scores(row, waits, skip, wait_weight)
+        if k == 1:
+            return [min(scored)] if scored else []
+        return heapq.nsmallest(k, scored)
+
+
+class SpatialGrid:
+    """
+    Buckets rides into square cells in a local metric projection, so "what's
+    within 300 m" or "the 5 nearest" only measures rides in nearby cells.
+
+    coords: (lat, lon) per ride; query results refer to positions in this list
+    cell_m: cell edge in meters
+    """
+
+    def __init__(self, coords, distance_fn, cell_m=100.0):
+        self.coords = tuple(coords)
+        self.distance_fn = distance_fn
+        self.cell_m = cell_m
+        if self.coords:
+            self.lat0 = sum(c[0] for c in self.coords) / len(self.coords)
+            self.lon0 = sum(c[1] for c in self.coords) / len(self.coords)
+        else:
+            self.lat0 = self.lon0 = 0.0
+        self._m_per_deg_lat = radians(1) * EARTH_RADIUS_M
+        self._m_per_deg_lon = self._m_per_deg_lat * cos(radians(self.lat0))
+
+        self.cells = {}
+        for i, coord in enumerate(self.coords):
+            self.cells.setdefault(self._cell(coord), []).append(i)
+        # Bounding box of the occupied cells; ring walks are clipped to it, so a
+        # query far away or with a huge radius costs no more than one near the park.
+        if self.cells:
+            xs, ys = [c[0] for c in self.cells], [c[1] for c in self.cells]
+            self.bounds = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            self.bounds = None
+        # Farthest ride from the centroid, in meters
+        self.extent_m = max((self.distance_fn((self.lat0, self.lon0), c) for c in self.coords), default=0.0)
+
+    def project(self, coord):
+        """(x, y) meters east/north of the park's centroid."""
+        lat, lon = coord
+        return (lon - self.lon0) * self._m_per_deg_lon, (lat - self.lat0) * self._m_per_deg_lat
+
+    def _cell(self, coord):
+        x, y = self.project(coord)
+        return int(x // self.cell_m), int(y // self.cell_m)
+
+    def distance_from_center(self, coord):
+        """Meters from the park's centroid to coord."""
+        return self.distance_fn((self.lat0, self.lon0), coord)
+
+    def _ring_span(self, center):
+        """(first, last) ring around center that can contain an occupied cell."""
+        x0, y0, x1, y1 = self.bounds
+        cx, cy = center
+        first = max(x0 - cx, cx - x1, y0 - cy, cy - y1, 0)
+        last = max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+        return first, last
+
+    def _ring(self, center, r):
+        """Cells at Chebyshev distance exactly r from center, inside the occupied bounds."""
+        x0, y0, x1, y1 = self.bounds
+        cx, cy = center
+        if r == 0:
+            if x0 <= cx <= x1 and y0 <= cy <= y1:
+                yield center
+            return
+        xs = range(max(cx - r, x0), min(cx + r, x1) + 1)
+        for y in (cy - r, cy + r):
+            if y0 <= y <= y1:
+                for x in xs:
+                    yield x, y
+        ys = range(max(cy - r + 1, y0), min(cy + r - 1, y1) + 1)
+        for x in (cx - r, cx + r):
+            if x0 <= x <= x1:
+                for y in ys:
+                    yield x, y
+
+    def within(self, coord, radius_m, accept=None):
+        """(distance, index) for every ride within radius_m, nearest first."""
+        if not self.cells:
+            return []
+        center = self._cell(coord)
+        first, last = self._ring_span(center)
+        reach = min(int(radius_m // self.cell_m) + 1, last)
+        found = []
+        for r in range(first, reach + 1):
+            for cell in self._ring(center, r):
+                for i in self.cells.get(cell, ()):
+                    if accept is not None and not accept(i):
+                        continue
+                    d = self.distance_fn(coord, self.coords[i])
+                    if d <= radius_m:
+                        found.append((d, i))
+        found.sort()
+        return found
+
+    def nearest(self, coord, k, accept=None):
+        """(distance, index) for the k nearest rides, nearest first."""
+        if not self.cells:
+            return []
+        center = self._cell(coord)
+        first, last = self._ring_span(center)
+        found = []
+        for r in range(first, last + 1):
+            for cell in self._ring(center, r):
+                for i in self.cells.get(cell, ()):
+                    if accept is None or accept(i):
+                        found.append((self.distance_fn(coord, self.coords[i]), i))
+            # Anything in ring r+1 is at least r * cell_m away.
+            if len(found) >= k and sorted(found)[k - 1][0] <= r * self.cell_m:
+                break
+        return heapq.nsmallest(k, found)
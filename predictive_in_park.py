@@ -9,7 +9,7 @@
 #
 # This Python file does the following:
 #  1. Knows each park's Queue-Times ID for live wait data.
-#  2. Holds sample latitude/longitude for a few rides in each park.
+#  2. Loads ride latitude/longitude for each park from the ride catalog (data/catalog.json).
 #  3. Defines a helper (Haversine) to compute real‐world distances.
 #  4. Fetches live wait times from queue‐times.com for the specified park.
 #  5. Uses a simple "distance + wait * 10" heuristic to pick the best next ride.
@@ -39,13 +39,27 @@
 # ────────────────────────────────────────────────────────────────────────────────
 
 import os
-import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from math import radians, cos, sin, sqrt, atan2
+from math import radians, cos, sin, sqrt, atan2, isfinite
 import random
 from dotenv import load_dotenv
 import socket
+import tempfile
+import time
+import uuid
+
+from catalog import CatalogStore, CatalogView, RideData
+from herding import RecommendationCounter
+from itinerary import plan_itinerary, walk_plan
+from metrics import DEFAULT_DIRECTORY as METRICS_DEFAULT_DIR, Metrics, RequestProfiler
+from response_cache import ResponseCache
+from session_store import open_session_store
+from upstream_client import AsyncUpstreamClient, UpstreamClient
+from wait_forecast import BUCKET_MINUTES, WaitForecaster
+from wait_history import WaitHistory
+from wait_stream import DeltaLog
+from wait_time_cache import WaitTimeCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -80,69 +94,23 @@ def get_local_ip():
 #    – Universal Studios Florida: ID = 65
 #    – Epic Universe:            ID = 334
 #    Base URL format: https://queue-times.com/parks/{PARK_ID}/queue_times.json
+#    Parks and their ids are listed in the ride catalog (section 2).
 # ────────────────────────────────────────────────────────────────────────────────
 
-PARK_IDS = {
-    "Islands of Adventure": 64,
-    "Universal Studios": 65,
-    "Epic Universe": 334
-}
-
-QUEUE_TIMES_BASE = "https://queue-times.com/parks/{}/queue_times.json"
-
-# ────────────────────────────────────────────────────────────────────────────────
-# 2) SAMPLE RIDE COORDINATES (latitude, longitude in decimal degrees)
-#    Add more rides here as needed for each park.
-# ────────────────────────────────────────────────────────────────────────────────
-
-RIDE_COORDS = {
-    # Islands of Adventure (with exact names from API)
-    "Harry Potter and the Forbidden Journey™": (28.472621, -81.472998),  # pre‐supplied
-    "Flight of the Hippogriff™": (28.472233, -81.472426),  # pre‐supplied
-    "Hagrid's Magical Creatures Motorbike Adventure™": (28.472800, -81.473200),  # pre‐supplied
-    "Jurassic World VelociCoaster": (28.471231, -81.472616),  # :contentReference[oaicite:0]{index=0}
-    "The Incredible Hulk Coaster®": (28.471513, -81.468761),  # :contentReference[oaicite:1]{index=1}
-    "The Amazing Adventures of Spider-Man®": (28.470403, -81.469899),  # :contentReference[oaicite:2]{index=2}
-    "Skull Island: Reign of Kong™": (28.473000, -81.473400),  # pre‐supplied
-    "Jurassic Park River Adventure™": (28.470427, -81.474121),  # :contentReference[oaicite:5]{index=5}
-    "Pteranodon Flyers™": (28.470361, -81.472599),  # :contentReference[oaicite:7]{index=7}
-    "Doctor Doom's Fearfall®": (28.470539, -81.469285),  # :contentReference[oaicite:9]{index=9}
-    "Storm Force Accelatron®": (28.470539, -81.469285),  # same coords as Doctor Doom's (adjacent) :contentReference[oaicite:10]{index=10}
-    "Caro-Seuss-el™": (28.472880, -81.469567),  # :contentReference[oaicite:11]{index=11}
-    "One Fish, Two Fish, Red Fish, Blue Fish™": (28.472949, -81.469099),  # :contentReference[oaicite:12]{index=12}
-    "The Cat In The Hat™": (28.472949, -81.469099),  # :contentReference[oaicite:13]{index=13}
-    "The High in the Sky Seuss Trolley Train Ride!™": (28.472800, -81.468900),  # approx. above Seuss Landing (no direct source)
-    "Dudley Do-Right's Ripsaw Falls®": (28.469184, -81.471634),  # :contentReference[oaicite:14]{index=14}
-    "Popeye & Bluto's Bilge-Rat Barges®": (28.470470, -81.471738),  # :contentReference[oaicite:15]{index=15}
-
-    # Universal Studios Florida
-    "Revenge of the Mummy™": (28.476781, -81.469866),  # pre‐supplied
-    "Hollywood Rip Ride Rockit™": (28.474962, -81.468417),  # :contentReference[oaicite:16]{index=16}
-    "E.T. Adventure™": (28.477729, -81.466626),  # approximate based on park map (no direct source)
-    "Despicable Me Minion Mayhem™": (28.475272, -81.468103),  # approximate in Minion Land (no direct source)
-    "Illumination's Villain-Con Minion Blast": (28.475636, -81.467976),  # same Land as Minion Mayhem (no direct source)
-    "Race Through New York Starring Jimmy Fallon™": (28.4756833, -81.46945),  # :contentReference[oaicite:17]{index=17}
-    "TRANSFORMERS™: The Ride-3D": (28.47638, -81.468506),  # approximate in Production Central (no direct source)
-    "Fast & Furious - Supercharged™": (28.478105, -81.469609),  # approximate in San Francisco land (no direct source)
-    "Harry Potter and the Escape from Gringotts™": (28.479903, -81.470182),  # same as King's Cross area (no direct source)
-    "Kang & Kodos' Twirl 'n' Hurl": (28.479345, -81.467864),  # approximate in World Expo (no direct source)
-    "MEN IN BLACK™ Alien Attack!™": (28.480728, -81.467669),  # same land (no direct source)
-    "The Simpsons Ride™": (28.4794389, -81.4673639),  # same World Expo coordinates (no direct source)
-
-    # Epic Universe (with exact names from API)
-    "Constellation Carousel": (28.473200, -81.472900),  # approximate in Celestial Park (no direct source)
-    "Stardust Racers": (28.473500, -81.472750),  # pre‐supplied
-    "Curse of the Werewolf": (28.473800, -81.473100),  # approximate in Dark Universe (no direct source)
-    "Monsters Unchained: The Frankenstein Experiment": (28.474000, -81.473300),  # approximate (no direct source)
-    "Dragon Racer's Rally": (28.473900, -81.472800),  # approximate in Isle of Berk (no direct source)
-    "Fyre Drill": (28.473700, -81.472900),  # approximate (no direct source)
-    "Hiccup Wing Glider": (28.473800, -81.472850),  # approximate (no direct source)
-    "Mario Kart™: Bowser's Challenge": (28.474100, -81.472650),  # approximate (no direct source)
-    "Mine-Cart Madness™": (28.474200, -81.472550),  # approximate (no direct source)
-    "Yoshi's Adventure™": (28.474300, -81.472500),  # approximate (no direct source)
-    "Harry Potter and the Battle at the Ministry™": (28.473246, -81.472388),  # :contentReference[oaicite:19]{index=19}
-}
+# Overridable so the service can run against a local stand-in (see fake_queue_times.py)
+QUEUE_TIMES_BASE = os.getenv('QUEUE_TIMES_BASE', "https://queue-times.com/parks/{}/queue_times.json")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 2) RIDE CATALOG
+#    Every park and ride (id, canonical name, aliases, latitude/longitude, ride
+#    type) comes from the versioned JSON file at CATALOG_PATH; add rides there,
+#    not here (see catalog.py). Each worker checks the file every
+#    CATALOG_CHECK_SECONDS and swaps in a new version without a restart.
+# ────────────────────────────────────────────────────────────────────────────────
 
+CATALOG_PATH = os.getenv('CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      'data', 'catalog.json'))
+CATALOG_CHECK_SECONDS = float(os.getenv('CATALOG_CHECK_SECONDS', 30))  # 0 disables hot reload
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 3) HELPER FUNCTION: HAVERSINE DISTANCE
@@ -162,35 +130,344 @@ def haversine(coord1, coord2):
     R = 6371000  # Earth radius in meters
     return R * c
 
+WALKING_SPEED_MPS = 1.4  # same walking speed the Flutter app uses
+
+# Optional per-park walkway graphs (data/walkways/<park>.json, see walkways.py).
+# Parks with a graph score on real walking distances instead of straight lines.
+# They are loaded with the catalog, so a catalog reload picks up new graphs too.
+WALKWAYS_DIR = os.getenv('WALKWAYS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      'data', 'walkways'))
+
+# Every park's rides compiled once per catalog version into a RideData: index
+# arrays, a pairwise distance matrix and a name index per park, plus a name
+# index across parks (see catalog.py, park_index.py and ride_names.py). Request
+# code takes CATALOG.current() once and uses that one version throughout.
+CATALOG = CatalogStore(CATALOG_PATH,
+                       lambda catalog: RideData(catalog, haversine, WALKWAYS_DIR, WALKING_SPEED_MPS),
+                       check_interval=CATALOG_CHECK_SECONDS)
+
+# Live read-only views of the current catalog
+PARK_IDS = CatalogView(CATALOG, "park_ids")                  # {park_name: queue-times id}
+PARK_RIDE_COORDS = CatalogView(CATALOG, "park_ride_coords")  # {park_name: {ride_name: (lat, lon)}}
+RIDE_COORDS = CatalogView(CATALOG, "ride_coords")            # {ride_name: (lat, lon)} across every park
+PARK_INDEXES = CatalogView(CATALOG, "park_indexes")          # {park_name: ParkIndex}
+
+def resolve_ride_name(name, rides=None):
+    """Canonical RIDE_COORDS key for a ride name, or None if nothing matches."""
+    rides = rides or CATALOG.current()
+    return rides.ride_names.resolve(name) if isinstance(name, str) else None
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 3b) METRICS AND PROFILING
+#    Timings and counters for upstream fetches, scoring and whole requests,
+#    summed across gunicorn workers through per-process files in METRICS_DIR
+#    and served at GET /metrics in the Prometheus text format (see metrics.py).
+#    PROFILE_SAMPLE_RATE > 0 also runs cProfile on that fraction of requests
+#    and writes one .prof file per profiled request to PROFILE_DIR.
+# ────────────────────────────────────────────────────────────────────────────────
+
+METRICS_DIR = os.getenv('METRICS_DIR', METRICS_DEFAULT_DIR)
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # e.g. 0.01 profiles 1% of requests
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'udx-profiles'))
+
+METRICS = Metrics(METRICS_DIR, flush_interval=METRICS_FLUSH_SECONDS)
+PROFILER = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_DIR)
+
+METRICS.histogram("request_seconds", "Time to build each HTTP response, by endpoint.")
+METRICS.counter("requests_total", "HTTP responses by endpoint and status code.")
+METRICS.histogram("upstream_fetch_seconds", "queue-times.com fetch time per park, including failures.")
+METRICS.counter("upstream_errors_total", "Failed queue-times.com fetches per park.")
+METRICS.histogram("scoring_seconds", "Time to score and rank a park's rides for one recommendation.")
+METRICS.counter("recommendations_total",
+                "Computed recommendations by outcome (ok, random_fallback, "
+                "coords_not_found, no_suitable_rides); cached responses aren't recounted.")
+METRICS.counter("wait_cache_requests_total", "Wait-time snapshot lookups: fresh, stale or miss.")
+METRICS.counter("response_cache_requests_total", "Response cache lookups: hit or miss.")
+METRICS.counter("profiles_total", "Requests profiled with cProfile.")
+METRICS.counter("recommendations_issued_total",
+                "Recommendations handed out and counted for herding control, cached answers included.")
+
 # ────────────────────────────────────────────────────────────────────────────────
 # 4) FETCH REAL-TIME WAIT TIMES FOR A GIVEN PARK
 #    Returns a dict: { ride_name: wait_time_in_minutes, ... }
+#
+#    Requests never call queue-times.com directly: they read a per-park snapshot
+#    from WAIT_CACHE (see wait_time_cache.py), which is shared by all gunicorn
+#    workers and kept warm by a background refresher. The refresher fetches
+#    through UPSTREAM; if a park fails, the last good snapshot keeps being served.
+#    Under the ASGI server (asgi.py) requests that must wait for upstream await
+#    ASYNC_UPSTREAM instead, which shares UPSTREAM's circuit breakers.
+# ────────────────────────────────────────────────────────────────────────────────
+
+WAIT_CACHE_DIR = os.getenv('WAIT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'udx-wait-cache'))
+WAIT_CACHE_TTL = float(os.getenv('WAIT_CACHE_TTL', 60))              # seconds a snapshot is fresh
+WAIT_CACHE_MAX_STALE = float(os.getenv('WAIT_CACHE_MAX_STALE', 600))  # seconds it may be served stale
+WAIT_CACHE_REFRESHER = os.getenv('WAIT_CACHE_REFRESHER', 'true').lower() == 'true'
+
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 2))
+UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', 5))
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 10))
+
+# Pooled keep-alive session plus a circuit breaker per park (see upstream_client.py)
+UPSTREAM = UpstreamClient(QUEUE_TIMES_BASE,
+                          timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT),
+                          pool_size=UPSTREAM_POOL_SIZE)
+ASYNC_UPSTREAM = AsyncUpstreamClient(QUEUE_TIMES_BASE, UPSTREAM.breaker,
+                                     timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT),
+                                     pool_size=UPSTREAM_POOL_SIZE)
+
+_reported_unmatched = set()
+
+def _fetch_canonical_wait_times(park_id):
+    """
+    Fetch a park from upstream and key its rides by our canonical names.
+    Rides we can't match keep their upstream name and are reported once.
+    """
+    try:
+        with METRICS.timer("upstream_fetch_seconds", {"park_id": park_id}):
+            raw = UPSTREAM.fetch_wait_times(park_id)
+    except Exception as e:
+        METRICS.inc("upstream_errors_total", {"park_id": park_id, "error": type(e).__name__})
+        raise
+    return _canonical_wait_times(park_id, raw)
+
+async def _fetch_canonical_wait_times_async(park_id):
+    """_fetch_canonical_wait_times without blocking the event loop."""
+    try:
+        with METRICS.timer("upstream_fetch_seconds", {"park_id": park_id}):
+            raw = await ASYNC_UPSTREAM.fetch_wait_times(park_id)
+    except Exception as e:
+        METRICS.inc("upstream_errors_total", {"park_id": park_id, "error": type(e).__name__})
+        raise
+    return _canonical_wait_times(park_id, raw)
+
+def _canonical_wait_times(park_id, raw):
+    park_index = CATALOG.current().park_index_for(park_id)
+    if park_index is None:
+        return dict(raw)  # park was dropped from the catalog; keep upstream's names
+    name_index = park_index.name_index
+    wait_times = {}
+    for name, wait in raw.items():
+        canonical = name_index.resolve(name)
+        if canonical is None:
+            canonical = name
+            if (park_id, name) not in _reported_unmatched:
+                _reported_unmatched.add((park_id, name))
+                print(f"Unmatched upstream ride for park {park_id}: {name}")
+        wait_times.setdefault(canonical, wait)
+    return wait_times
+
+def unmatched_upstream_rides(park_id, wait_times, rides=None):
+    """Upstream rides in a snapshot that have no entry in our catalog."""
+    park_index = (rides or CATALOG.current()).park_index_for(park_id)
+    if park_index is None:
+        return sorted(wait_times)
+    return sorted(name for name in wait_times
+                  if name not in park_index.index and park_index.name_index.resolve(name) is None)
+
+WAIT_CACHE = WaitTimeCache(_fetch_canonical_wait_times, WAIT_CACHE_DIR,
+                           ttl=WAIT_CACHE_TTL, max_stale=WAIT_CACHE_MAX_STALE,
+                           fetch_async=_fetch_canonical_wait_times_async)
+if WAIT_CACHE_REFRESHER:
+    WAIT_CACHE.register(PARK_IDS.values())
+
+METRICS.counter_source("wait_cache_requests_total", lambda: WAIT_CACHE.hits, {"result": "fresh"})
+METRICS.counter_source("wait_cache_requests_total", lambda: WAIT_CACHE.stale_hits, {"result": "stale"})
+METRICS.counter_source("wait_cache_requests_total", lambda: WAIT_CACHE.misses, {"result": "miss"})
+METRICS.gauge("snapshot_age_seconds", "Age of each park's wait-time snapshot.", lambda: [
+    ({"park_id": park_id}, WAIT_CACHE.peek(park_id).age()) for park_id in CATALOG.current().park_ids.values()
+])
+# Each worker has its own breakers, so this one is exported per worker (pid label)
+METRICS.gauge("upstream_circuit_open", "1 while a park's upstream circuit breaker is open, per worker.", lambda: [
+    ({"park_id": park_id}, int(breaker["state"] == "open")) for park_id, breaker in UPSTREAM.status().items()
+], per_worker=True)
+
 # ────────────────────────────────────────────────────────────────────────────────
+# 4b) HISTORICAL WAIT TIMES
+#    Every new snapshot is appended to a memory-mapped columnar store on local
+#    disk (see wait_history.py) so we can learn from past waits later on.
+# ────────────────────────────────────────────────────────────────────────────────
+
+WAIT_HISTORY_DIR = os.getenv('WAIT_HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'udx-wait-history'))
+WAIT_HISTORY_ENABLED = os.getenv('WAIT_HISTORY_ENABLED', 'true').lower() == 'true'
+PARK_TIMEZONE = os.getenv('PARK_TIMEZONE', 'America/New_York')
+
+WAIT_HISTORY = WaitHistory(WAIT_HISTORY_DIR, PARK_TIMEZONE) if WAIT_HISTORY_ENABLED else None
+
+def record_snapshot(snapshot):
+    """Append a freshly fetched snapshot to the history store."""
+    WAIT_HISTORY.append(snapshot.park_id, snapshot.wait_times, snapshot.fetched_at)
+
+if WAIT_HISTORY is not None:
+    WAIT_CACHE.add_listener(record_snapshot)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 4c) WAIT-TIME FORECASTS
+#    With "wait_source": "forecast", rides are scored on the wait predicted for
+#    when the guest arrives (the park's walking times), looked up in tables
+#    precomputed from the history store (see wait_forecast.py) and rebuilt every
+#    FORECAST_REFRESH_SECONDS. Uses the request's weather and the park-local
+#    clock; `hour` isn't used because clients send a fixed default.
+# ────────────────────────────────────────────────────────────────────────────────
+
+WAIT_SOURCE = os.getenv('WAIT_SOURCE', 'live')  # "live" or "forecast"
+WAIT_SOURCES = ("live", "forecast")
+FORECAST_REFRESH_SECONDS = float(os.getenv('FORECAST_REFRESH_SECONDS', 3600))
+FORECAST_LOOKBACK_DAYS = int(os.getenv('FORECAST_LOOKBACK_DAYS', 56))
+
+FORECASTER = (WaitForecaster(WAIT_HISTORY, PARK_IDS.values(), FORECAST_LOOKBACK_DAYS)
+              if WAIT_HISTORY is not None else None)
+
+def on_catalog_swap(rides):
+    """Point the refresher and forecasts at a reloaded catalog's parks and report what it still misses."""
+    if WAIT_CACHE_REFRESHER:
+        WAIT_CACHE.register(rides.park_ids.values())
+    if FORECASTER is not None:
+        FORECASTER.park_ids = list(rides.park_ids.values())  # picked up on the next rebuild
+    HERDING.ensure_capacity(rides.ride_id_limit)
+    print(f"📚 Catalog version {rides.version}: {len(rides.park_ids)} parks, {len(rides.ride_coords)} rides")
+    for park_name, park_id in rides.park_ids.items():
+        wait_times = WAIT_CACHE.peek(park_id).wait_times
+        unmatched = unmatched_upstream_rides(park_id, wait_times, rides) if wait_times else []
+        if unmatched:
+            print(f"   {park_name}: upstream rides still missing from the catalog: {', '.join(unmatched)}")
+
+CATALOG.add_listener(on_catalog_swap)
+
+def _forecast_wait_vector(park_index, park_id, waits, walk_row, weather, now=None):
+    """
+    Predicted wait on arrival for every ride in the park (None stays None).
+    walk_row: walking seconds to each ride (ParkIndex.walk_row)
+    now: epoch time the guest leaves; defaults to the current time
+    """
+    if FORECASTER is None:
+        return waits
+    FORECASTER.start_refresher(FORECAST_REFRESH_SECONDS)
+    now_minute = FORECASTER.minute_of_week(now or time.time())
+    return tuple(
+        FORECASTER.forecast(FORECASTER.curve(park_id, name, weather), wait,
+                            now_minute, seconds / 60)
+        for name, wait, seconds in zip(park_index.names, waits, walk_row)
+    )
+
+def _round_wait(wait):
+    return None if wait is None else round(wait, 1)
+
+def get_wait_snapshot(park_id):
+    """Return the cached Snapshot for a park (wait_times, fetched_at, version)."""
+    return WAIT_CACHE.get(park_id)
+
+def snapshot_age_seconds(snapshot):
+    """Age of a snapshot rounded for responses; None if we never got data."""
+    age = snapshot.age()
+    return None if age is None else round(age, 1)
 
 def fetch_wait_times(park_id):
     """
-    Fetch the live wait times JSON from Queue-Times.
+    Return the current wait times for a park from the shared snapshot cache.
     Returns a dict mapping ride names to their current wait times.
     """
-    url = QUEUE_TIMES_BASE.format(park_id)
+    return get_wait_snapshot(park_id).wait_times
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 4d) WAIT-TIME STREAM
+#    GET /stream pushes only the rides whose wait or open status changed, as
+#    Server-Sent Events, instead of clients re-polling /recommend. Each worker
+#    diffs each new snapshot once and shares the rendered events with every
+#    subscriber (see wait_stream.py); the last STREAM_HISTORY deltas per park are
+#    kept so reconnecting clients can resume from their last version.
+# ────────────────────────────────────────────────────────────────────────────────
+
+STREAM_HISTORY = int(os.getenv('STREAM_HISTORY', 256))
+STREAM_POLL_SECONDS = float(os.getenv('STREAM_POLL_SECONDS', 1))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+
+WAIT_STREAM = DeltaLog(get_wait_snapshot, history=STREAM_HISTORY, poll_interval=STREAM_POLL_SECONDS)
+
+def _parse_since(value):
+    """(version, error) from a Last-Event-ID header or ?since= value."""
     try:
-        resp = requests.get(url, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        rides_section = data.get("lands", [])  # each "land" has a list of rides
-        wait_times = {}
-        for land in rides_section:
-            for ride in land.get("rides", []):
-                name = ride.get("name")
-                wt = ride.get("wait_time", 0)
-                is_open = ride.get("is_open", False)
-                # Only include open rides with positive wait times
-                if name and is_open:
-                    wait_times[name] = wt
-        return wait_times
-    except Exception as e:
-        print(f"Error fetching wait times for park {park_id}: {e}")
-        return {}
+        return (int(value) if value else None), None
+    except ValueError:
+        return None, "'since' must be an integer version"
+
+def stream_wait_deltas(park_id, since=None):
+    """Yield SSE frames for a park forever, starting after version `since`."""
+    WAIT_STREAM.watch(park_id)
+    yield f"retry: {int(STREAM_POLL_SECONDS * 1000) + 1000}\n\n"
+    version = since
+    while True:
+        for version, event in WAIT_STREAM.events_since(park_id, version):
+            yield event
+        if not WAIT_STREAM.wait(park_id, version, STREAM_HEARTBEAT_SECONDS):
+            yield ": keep-alive\n\n"  # stops proxies from closing an idle stream
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 4e) GUEST SESSIONS
+#    With a "session_id", the server remembers the rides a guest has been on
+#    (their last_ride and anything they excluded) and excludes them on every
+#    later request, so clients don't resend a growing exclude_rides list.
+#    Visited sets are stored as bitsets over catalog ride ids (see session_store.py)
+#    in SESSION_STORE: "memory" (per worker) or "sqlite:///path" (shared by all
+#    workers and kept across restarts).
+# ────────────────────────────────────────────────────────────────────────────────
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+SESSION_TTL = float(os.getenv('SESSION_TTL', 12 * 3600))   # idle seconds before a session is dropped
+SESSION_MAX = int(os.getenv('SESSION_MAX', 100000))        # sessions kept (least recently used go first)
+MAX_SESSION_ID_LENGTH = 128
+
+SESSIONS = open_session_store(SESSION_STORE, SESSION_MAX, SESSION_TTL)
+
+def session_exclusions(session_id, last_ride=None, exclude_rides=None):
+    """
+    Record last_ride and exclude_rides as visited in the session and return
+    every ride the session has visited, as canonical names.
+    """
+    rides = CATALOG.current()
+    names = (resolve_ride_name(name, rides) for name in [last_ride, *(exclude_rides or [])] if name)
+    visited = SESSIONS.add(session_id, rides.ride_bits.encode(name for name in names if name))
+    return rides.ride_bits.decode(visited)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 4f) HERDING CONTROL
+#    Every recommendation we hand out is counted per ride over the last
+#    HERDING_WINDOW_SECONDS (see herding.py; counts are shared by all workers).
+#    Each count is scored as HERDING_MINUTES_PER_RECOMMENDATION of extra queue
+#    on that ride, because upstream waits only show the guests we sent there
+#    several minutes later; near-equal rides then share the crowd instead of
+#    one of them taking all of it. The extra wait is rounded down to
+#    HERDING_STEP_MINUTES so cached answers stay valid until it moves a step.
+# ────────────────────────────────────────────────────────────────────────────────
+
+HERDING_DIR = os.getenv('HERDING_DIR', os.path.join(tempfile.gettempdir(), 'udx-herding'))
+HERDING_MINUTES_PER_RECOMMENDATION = float(os.getenv('HERDING_MINUTES_PER_RECOMMENDATION', 0.05))  # 0 disables
+HERDING_WINDOW_SECONDS = float(os.getenv('HERDING_WINDOW_SECONDS', 300))
+HERDING_STEP_MINUTES = float(os.getenv('HERDING_STEP_MINUTES', 1))
+HERDING_REFRESH_SECONDS = float(os.getenv('HERDING_REFRESH_SECONDS', 0.25))  # lag before other workers' counts show
+
+HERDING = RecommendationCounter(HERDING_DIR, capacity=CATALOG.data.ride_id_limit,
+                                window_seconds=HERDING_WINDOW_SECONDS, refresh_interval=HERDING_REFRESH_SECONDS)
+METRICS.counter_source("recommendations_issued_total", lambda: HERDING.recorded)
+
+def induced_waits(rides, park_name):
+    """
+    Extra queue minutes per ride of a park (aligned with its ParkIndex) from
+    recent recommendations, or None when herding control is off.
+    """
+    if HERDING_MINUTES_PER_RECOMMENDATION <= 0:
+        return None
+    minutes = (count * HERDING_MINUTES_PER_RECOMMENDATION for count in HERDING.counts(rides.park_ride_ids[park_name]))
+    if HERDING_STEP_MINUTES <= 0:
+        return tuple(minutes)
+    return tuple(int(m / HERDING_STEP_MINUTES) * HERDING_STEP_MINUTES for m in minutes)
+
+def record_recommendation(rides, ride_name):
+    """Count a recommendation handed out for ride_name (cached answers count too)."""
+    ride_id = rides.ride_ids.get(ride_name)
+    if ride_id is not None and HERDING_MINUTES_PER_RECOMMENDATION > 0:
+        HERDING.record(ride_id)
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 5) RECOMMENDATION ALGORITHM (SIMPLE HEURISTIC)
@@ -200,76 +477,606 @@ def fetch_wait_times(park_id):
 #      3. For every other open ride with known coords, compute:
 #            distance (meters) + (wait_time * 10).
 #      4. Choose the ride with the lowest combined score.
+#
+#    Scoring runs against the park's ParkIndex (see park_index.py): the distance row of
+#    the last ride plus the weighted wait vector, masked and argmin'd in one pass.
+#    SCORING_MODE=loop switches back to the original per-ride haversine loop so
+#    the two can be compared and benchmarked.
 # ────────────────────────────────────────────────────────────────────────────────
 
-def recommend_next_ride(last_ride, current_park_name, weather=None, hour=None, exclude_rides=None):
+WAIT_WEIGHT = 10  # meters of walking one minute of queue is worth
+SCORING_MODE = os.getenv('SCORING_MODE', 'matrix')  # "matrix" or "loop"
+
+def _pick_ride_loop(last_ride, last_coord, wait_times, excluded, ride_coords, induced=None, order=None):
     """
-    last_ride: e.g., "Harry Potter and the Forbidden Journey"
-    current_park_name: one of the keys in PARK_IDS ("Islands of Adventure", etc.)
-    weather: optional string ("sunny", "rainy", etc.)
-    hour: optional int (0-23)
-    exclude_rides: optional list of ride names to exclude from recommendations
+    Original scalar scan over the upstream rides. Returns (ride, wait, distance).
+    induced: optional {ride_name: extra queue minutes} from herding control
+    order: optional {ride_name: position}; equal scores go to the earliest ride
+           in it, as in the matrix pass (ParkIndex.index)
     """
-    park_id = PARK_IDS.get(current_park_name)
-    if not park_id:
-        return {"error": f"Unknown park '{current_park_name}'"}
-
-    # 1) Fetch live wait times
-    wait_times = fetch_wait_times(park_id)
-
-    # 2) Check that we have coordinates for the last ride
-    if last_ride not in RIDE_COORDS:
-        return {"error": f"Coordinates for '{last_ride}' not found"}
-
-    last_coord = RIDE_COORDS[last_ride]
     best_score = float("inf")
+    best_position = 0
     best_ride = None
     best_ride_wait = None
     best_distance = None
 
-    # Convert exclude_rides to set for faster lookup
-    excluded = set(exclude_rides or [])
-
-    # 3) Find the best ride considering exclusions
     for ride_name, wait_time in wait_times.items():
         # Skip the last ride and any excluded rides
         if ride_name == last_ride or ride_name in excluded:
             continue
-            
-        if ride_name not in RIDE_COORDS:
+
+        if ride_name not in ride_coords:
             continue  # Skip rides we don't have coordinates for
 
-        ride_coord = RIDE_COORDS[ride_name]
+        ride_coord = ride_coords[ride_name]
         distance_m = haversine(last_coord, ride_coord)
 
         # Simple heuristic: distance + (wait_time * 10)
         # You can tune these weights or add weather/hour modifiers
-        score = distance_m + (wait_time * 10)
+        score = distance_m + ((wait_time + induced.get(ride_name, 0) if induced else wait_time) * WAIT_WEIGHT)
+        position = order.get(ride_name, len(order)) if order else 0
 
-        if score < best_score:
+        if score < best_score or (score == best_score and position < best_position):
             best_score = score
+            best_position = position
             best_ride = ride_name
             best_ride_wait = wait_time
             best_distance = distance_m
 
+    return best_ride, best_ride_wait, best_distance
+
+def _rank_rides_matrix(park_index, snapshot, last_ride, last_coord, excluded, k=1,
+                       wait_source="live", weather=None, induced=None, now=None):
+    """
+    Vectorized pass over the park's precomputed distance matrix.
+    Returns up to k (ride, wait, distance, score, scored_wait) tuples, best first;
+    scored_wait is the forecast wait when wait_source is "forecast" (as of `now`,
+    default the current time). Scores include the `induced` extra minutes per
+    ride (herding control), if given.
+    """
+    row = park_index.distance_row(last_ride, last_coord)
+    waits = park_index.wait_vector(snapshot.wait_times, snapshot.version)
+    scored_waits = waits
+    if wait_source == "forecast":
+        walk_row = park_index.walk_row(last_ride, last_coord)
+        scored_waits = _forecast_wait_vector(park_index, snapshot.park_id, waits, walk_row, weather, now)
+    ranking_waits = scored_waits
+    if induced is not None:
+        ranking_waits = tuple(None if w is None else w + extra for w, extra in zip(scored_waits, induced))
+    skip = park_index.mask(excluded)
+    skip.update(park_index.mask((last_ride,)))
+
+    return [
+        (park_index.names[i], waits[i], row[i], score, scored_waits[i])
+        for score, i in park_index.top(row, ranking_waits, skip, k, WAIT_WEIGHT)
+    ]
+
+def recommend_next_ride(last_ride, current_park_name, weather=None, hour=None, exclude_rides=None,
+                        scoring_mode=None, k=None, wait_source=None, origin=None, include_path=False,
+                        session_id=None):
+    """
+    last_ride: e.g., "Harry Potter and the Forbidden Journey"
+    current_park_name: one of the keys in PARK_IDS ("Islands of Adventure", etc.)
+    weather: optional string ("sunny", "rainy", etc.)
+    hour: optional int (0-23)
+    exclude_rides: optional list of ride names to exclude from recommendations
+    scoring_mode: optional "matrix" or "loop"; defaults to SCORING_MODE
+    k: optional int; also return the k best-scoring rides under "ranked"
+    wait_source: optional "live" or "forecast"; defaults to WAIT_SOURCE
+    origin: optional (lat, lon) of the guest, used instead of last_ride's coords
+    include_path: if true, add the walking path to the recommended ride as "path"
+    session_id: optional; also exclude every ride this session has visited
+    """
+    rides = CATALOG.current()
+    park_id = rides.park_ids.get(current_park_name)
+    if not park_id:
+        return {"error": f"Unknown park '{current_park_name}'"}
+    if session_id:
+        exclude_rides = session_exclusions(session_id, last_ride, exclude_rides)
+
+    # 1) Fetch live wait times (cached snapshot)
+    snapshot = get_wait_snapshot(park_id)
+    result = _recommend_from_snapshot(last_ride, current_park_name, snapshot, exclude_rides=exclude_rides,
+                                      scoring_mode=scoring_mode, k=k, wait_source=wait_source,
+                                      weather=weather, origin=origin, include_path=include_path, rides=rides)
+    record_recommendation(rides, result.get("recommendation"))
+    return result
+
+def _recommend_from_snapshot(last_ride, current_park_name, snapshot, exclude_rides=None, scoring_mode=None,
+                             k=None, wait_source=None, weather=None, origin=None, include_path=False,
+                             rides=None, induced=None, now=None):
+    """
+    Steps 2-4 of recommend_next_ride against an already-fetched snapshot.
+    rides: the RideData to score against; defaults to the current catalog
+    induced: extra queue minutes per ride from induced_waits; looked up if not given
+    now: epoch time forecasts are made for; defaults to the current time
+    """
+    wait_times = snapshot.wait_times
+    rides = rides or CATALOG.current()
+    park_index = rides.park_indexes[current_park_name]
+    if induced is None:
+        induced = induced_waits(rides, current_park_name)
+
+    # 2) Check that we have coordinates for the last ride (names are matched
+    #    loosely, so "Flight of the Hippogriff" finds "Flight of the Hippogriff™").
+    #    A raw guest position can stand in for the last ride.
+    if origin is not None and not last_ride:
+        last_ride = None
+        last_coord = tuple(origin)
+    else:
+        canonical_last_ride = resolve_ride_name(last_ride, rides)
+        if canonical_last_ride is None:
+            METRICS.inc("recommendations_total", {"outcome": "coords_not_found"})
+            return {"error": f"Coordinates for '{last_ride}' not found",
+                    "snapshot_age_seconds": snapshot_age_seconds(snapshot)}
+
+        last_ride = canonical_last_ride
+        last_coord = rides.ride_coords[last_ride]
+
+    # Convert exclude_rides to a set of canonical names for faster lookup
+    excluded = {resolve_ride_name(name, rides) or name for name in exclude_rides or []}
+
+    # 3) Find the best ride (and the k best, if asked) considering exclusions.
+    #    Alternates and forecasts always come from the matrix pass; the loop
+    #    only picks the best ride on live waits.
+    wait_source = wait_source or WAIT_SOURCE
+    use_loop = (scoring_mode or SCORING_MODE) == "loop" and wait_source == "live"
+    ranked = []
+    best_predicted = None
+    with METRICS.timer("scoring_seconds", {"mode": "loop" if use_loop else "matrix"}):
+        if k or not use_loop:
+            ranked = _rank_rides_matrix(park_index, snapshot,
+                                        last_ride, last_coord, excluded, k or 1,
+                                        wait_source=wait_source, weather=weather, induced=induced, now=now)
+        if use_loop:
+            best_ride, best_ride_wait, best_distance = _pick_ride_loop(
+                last_ride, last_coord, wait_times, excluded, rides.ride_coords,
+                dict(zip(park_index.names, induced)) if induced else None, park_index.index)
+        elif ranked:
+            best_ride, best_ride_wait, best_distance, _, best_predicted = ranked[0]
+        else:
+            best_ride = best_ride_wait = best_distance = None
+    outcome = "ok"
+
     # 4) If no suitable ride found, try to find any available ride not in exclusions
     if best_ride is None:
-        available_rides = [r for r in wait_times.keys() if r not in excluded and r != last_ride and r in RIDE_COORDS]
+        available_rides = [r for r in wait_times.keys() if r not in excluded and r != last_ride and r in rides.ride_coords]
         if available_rides:
             # Pick a random available ride
             best_ride = random.choice(available_rides)
             best_ride_wait = wait_times[best_ride]
-            best_distance = haversine(last_coord, RIDE_COORDS[best_ride])
+            best_distance = haversine(last_coord, rides.ride_coords[best_ride])
+            outcome = "random_fallback"
         else:
-            return {"error": "No suitable rides available (all may be excluded or closed)"}
+            METRICS.inc("recommendations_total", {"outcome": "no_suitable_rides"})
+            return {"error": "No suitable rides available (all may be excluded or closed)",
+                    "snapshot_age_seconds": snapshot_age_seconds(snapshot)}
+    METRICS.inc("recommendations_total", {"outcome": outcome})
 
-    return {
+    result = {
         "recommendation": best_ride,
         "wait_time": best_ride_wait,
         "distance_meters": best_distance,
         "excluded_count": len(excluded),
-        "last_ride": last_ride
+        "last_ride": last_ride,
+        "snapshot_age_seconds": snapshot_age_seconds(snapshot),
+        "wait_source": wait_source
     }
+    if last_ride is None:
+        result["origin"] = {"lat": last_coord[0], "lon": last_coord[1]}
+    if induced is not None:
+        target = park_index.index.get(best_ride)
+        result["induced_wait_time"] = induced[target] if target is not None else 0
+    if include_path:
+        target = park_index.index.get(best_ride)
+        if target is None:
+            polyline, source = [last_coord, rides.ride_coords[best_ride]], "straight_line"
+        else:
+            polyline, source = park_index.path(last_ride, last_coord, target)
+        result["path"] = [[lat, lon] for lat, lon in polyline]
+        result["path_source"] = source
+    if wait_source == "forecast":
+        result["predicted_wait_time"] = _round_wait(best_predicted)
+    if k:
+        result["ranked"] = [
+            {"ride": ride, "wait_time": wait, "distance_meters": distance, "score": score}
+            for ride, wait, distance, score, _ in ranked
+        ]
+        if wait_source == "forecast":
+            for entry, ranked_ride in zip(result["ranked"], ranked):
+                entry["predicted_wait_time"] = _round_wait(ranked_ride[4])
+    return result
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 5b) BATCH RECOMMENDATIONS
+#    Many guests in one call (group bookings, kiosks). Items are grouped by park
+#    so each park's snapshot is read once and its wait vector is built once;
+#    every item is then one distance-matrix row scored against that shared
+#    vector, with exactly the same rules as recommend_next_ride.
+# ────────────────────────────────────────────────────────────────────────────────
+
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 1000))
+MAX_TOP_K = int(os.getenv('MAX_TOP_K', 10))
+NEARBY_MAX_OFFSET_M = float(os.getenv('NEARBY_MAX_OFFSET_M', 2000))  # how far outside a park /nearby answers
+
+def _parse_origin(data):
+    """
+    (origin, error) from a request's optional "lat"/"lon".
+    origin is a (lat, lon) tuple or None; error is a message or None.
+    """
+    lat, lon = data.get("lat"), data.get("lon")
+    if lat is None and lon is None:
+        return None, None
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None, "'lat' and 'lon' must both be numbers"
+    if not (isfinite(lat) and isfinite(lon)):
+        return None, "'lat' and 'lon' must both be finite numbers"
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, "'lat'/'lon' out of range"
+    return (lat, lon), None
+
+def _wait_source_error(wait_source):
+    """Validation message for an optional wait_source, or None if it is usable."""
+    if wait_source is None or wait_source in WAIT_SOURCES:
+        return None
+    return f"'wait_source' must be one of {', '.join(WAIT_SOURCES)}"
+
+def _top_k_error(k):
+    """Validation message for an optional top-k value, or None if it is usable."""
+    if k is None:
+        return None
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= MAX_TOP_K:
+        return f"'k' must be an integer between 1 and {MAX_TOP_K}"
+    return None
+
+def _session_id_error(session_id):
+    """Validation message for an optional session_id, or None if it is usable."""
+    if session_id is None:
+        return None
+    if not isinstance(session_id, str) or not 0 < len(session_id) <= MAX_SESSION_ID_LENGTH:
+        return f"'session_id' must be a string of 1 to {MAX_SESSION_ID_LENGTH} characters"
+    return None
+
+def _ride_fields_error(data):
+    """Validation message if park/last_ride/weather/exclude_rides have the wrong types, or None."""
+    for field in ("park", "last_ride", "weather"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"'{field}' must be a string"
+    exclude_rides = data.get("exclude_rides")
+    if exclude_rides is not None and not (isinstance(exclude_rides, list)
+                                          and all(isinstance(name, str) for name in exclude_rides)):
+        return "'exclude_rides' must be a list of ride names"
+    return None
+
+def _batch_item_error(item):
+    """Validation message for one batch item, or None if it looks usable."""
+    if not isinstance(item, dict):
+        return "Each item must be a JSON object"
+    origin, origin_error = _parse_origin(item)
+    if origin_error:
+        return origin_error
+    if not (item.get("last_ride") or origin) or not item.get("park"):
+        return "Missing 'last_ride' or 'park' in request"
+    return (_ride_fields_error(item) or _top_k_error(item.get("k")) or _wait_source_error(item.get("wait_source"))
+            or _session_id_error(item.get("session_id")))
+
+def recommend_batch(items, scoring_mode=None, snapshots=None):
+    """
+    items: list of {"last_ride" or "lat"/"lon", "park", "exclude_rides", "k", "wait_source",
+                    "weather", "session_id"} dicts
+    snapshots: optional {park_id: Snapshot} already fetched (the async server awaits them)
+    Returns one result per item, in request order; failed items carry an "error".
+    """
+    rides = CATALOG.current()  # one catalog version for the whole batch
+    results = [None] * len(items)
+    positions_by_park = {}
+
+    for pos, item in enumerate(items):
+        error = _batch_item_error(item)
+        if error:
+            results[pos] = {"error": error}
+        else:
+            positions_by_park.setdefault(item["park"], []).append(pos)
+
+    for park, positions in positions_by_park.items():
+        park_id = rides.park_ids.get(park)
+        if not park_id:
+            for pos in positions:
+                results[pos] = {"error": f"Unknown park '{park}'"}
+            continue
+
+        # one snapshot per park for the whole batch
+        snapshot = snapshots[park_id] if snapshots and park_id in snapshots else get_wait_snapshot(park_id)
+        for pos in positions:
+            item = items[pos]
+            exclude_rides = item.get("exclude_rides") or []
+            if item.get("session_id"):
+                exclude_rides = session_exclusions(item["session_id"], item.get("last_ride"), exclude_rides)
+            results[pos] = _recommend_from_snapshot(
+                item.get("last_ride"), park, snapshot, exclude_rides=exclude_rides,
+                scoring_mode=scoring_mode, k=item.get("k"), wait_source=item.get("wait_source"),
+                weather=item.get("weather"), origin=_parse_origin(item)[0],
+                include_path=bool(item.get("include_path")), rides=rides)
+            # counted right away, so later guests in the batch see the earlier ones
+            record_recommendation(rides, results[pos].get("recommendation"))
+
+    return results
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 5c) MULTI-STOP ITINERARIES
+#    Orders a guest's remaining must-do rides to fit the most of them into a
+#    time budget with the least walking + queueing (see itinerary.py). Walks use
+#    the park's walking-time matrix; queues are the live wait,
+#    or with "wait_source": "forecast" the wait predicted for when the guest
+#    gets to each ride along the plan. Up to ITINERARY_EXACT_LIMIT rides are
+#    planned exactly; planning never runs longer than ITINERARY_TIME_LIMIT_MS.
+# ────────────────────────────────────────────────────────────────────────────────
+
+MAX_ITINERARY_RIDES = int(os.getenv('MAX_ITINERARY_RIDES', 25))
+ITINERARY_EXACT_LIMIT = int(os.getenv('ITINERARY_EXACT_LIMIT', 10))
+ITINERARY_TIME_LIMIT_MS = float(os.getenv('ITINERARY_TIME_LIMIT_MS', 250))
+
+def _itinerary_wait_fn(park_index, snapshot, targets, waits, wait_source, weather):
+    """wait_fn(i, arrive_seconds) -> queue seconds, memoized per forecast bucket."""
+    if wait_source != "forecast" or FORECASTER is None:
+        return lambda i, arrive: waits[i] * 60
+
+    FORECASTER.start_refresher(FORECAST_REFRESH_SECONDS)
+    now_minute = FORECASTER.minute_of_week(time.time())
+    curves = {i: FORECASTER.curve(snapshot.park_id, park_index.names[i], weather) for i in targets}
+    memo = {}
+
+    def wait_fn(i, arrive):
+        # Forecasts only change every BUCKET_MINUTES, so most lookups are repeats
+        key = (i, int((now_minute + arrive / 60) // BUCKET_MINUTES))
+        wait = memo.get(key)
+        if wait is None:
+            wait = memo[key] = FORECASTER.forecast(curves[i], waits[i], now_minute, arrive / 60) * 60
+        return wait
+
+    return wait_fn
+
+def plan_park_itinerary(start_ride, current_park_name, rides, budget_minutes, origin=None,
+                        wait_source=None, weather=None):
+    """
+    start_ride: ride the guest is at (or None with origin)
+    current_park_name: one of the keys in PARK_IDS
+    rides: ride names to fit in, in any order
+    budget_minutes: time the guest has left
+    origin: optional (lat, lon) of the guest, used instead of start_ride
+    wait_source: optional "live" or "forecast"; defaults to WAIT_SOURCE
+    """
+    catalog = CATALOG.current()
+    park_id = catalog.park_ids.get(current_park_name)
+    if not park_id:
+        return {"error": f"Unknown park '{current_park_name}'"}
+    snapshot = get_wait_snapshot(park_id)
+    park_index = catalog.park_indexes[current_park_name]
+
+    if origin is not None and not start_ride:
+        start_ride, start_coord = None, tuple(origin)
+    else:
+        canonical_start = resolve_ride_name(start_ride, catalog)
+        if canonical_start is None:
+            return {"error": f"Coordinates for '{start_ride}' not found",
+                    "snapshot_age_seconds": snapshot_age_seconds(snapshot)}
+        start_ride, start_coord = canonical_start, catalog.ride_coords[canonical_start]
+
+    waits = park_index.wait_vector(snapshot.wait_times, snapshot.version)
+    targets, unavailable = [], []
+    for name in rides:
+        i = park_index.index.get(park_index.name_index.resolve(name))
+        if i is None:
+            unavailable.append({"ride": name, "reason": "unknown"})
+        elif waits[i] is None:
+            unavailable.append({"ride": park_index.names[i], "reason": "closed"})
+        elif i not in targets:
+            targets.append(i)
+
+    start_row = park_index.distance_row(start_ride, start_coord)
+    start_walk = park_index.walk_row(start_ride, start_coord)
+    pair_walk = park_index.walk_times
+    wait_source = wait_source or WAIT_SOURCE
+    wait_fn = _itinerary_wait_fn(park_index, snapshot, targets, waits, wait_source, weather)
+
+    order, method = plan_itinerary(targets, start_walk, pair_walk, wait_fn, budget_minutes * 60,
+                                   exact_limit=ITINERARY_EXACT_LIMIT,
+                                   time_limit=ITINERARY_TIME_LIMIT_MS / 1000)
+
+    plan, walked, prev = [], 0.0, None
+    for i, (arrive, wait, finish) in zip(order, walk_plan(order, start_walk, pair_walk, wait_fn)):
+        meters = start_row[i] if prev is None else park_index.distances[prev][i]
+        walked += start_walk[i] if prev is None else pair_walk[prev][i]
+        stop = {
+            "ride": park_index.names[i],
+            "walk_meters": round(meters, 1),
+            "arrive_minutes": round(arrive / 60, 1),
+            "wait_time": waits[i],
+            "done_minutes": round(finish / 60, 1),
+        }
+        if wait_source == "forecast":
+            stop["predicted_wait_time"] = _round_wait(wait / 60)
+        plan.append(stop)
+        prev = i
+
+    total_minutes = plan[-1]["done_minutes"] if plan else 0.0
+    walking_minutes = round(walked / 60, 1)
+    result = {
+        "park": current_park_name,
+        "start_ride": start_ride,
+        "plan": plan,
+        "unscheduled": [park_index.names[i] for i in targets if i not in order],
+        "unavailable": unavailable,
+        "total_minutes": total_minutes,
+        "walking_minutes": walking_minutes,
+        "queue_minutes": round(total_minutes - walked / 60, 1),
+        "budget_minutes": budget_minutes,
+        "method": method,
+        "wait_source": wait_source,
+        "snapshot_age_seconds": snapshot_age_seconds(snapshot)
+    }
+    if start_ride is None:
+        result["origin"] = {"lat": start_coord[0], "lon": start_coord[1]}
+    return result
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 5d) RESPONSE CACHE
+#    Identical /recommend and /debug requests against the same snapshot version
+#    are answered from RESPONSE_CACHE (see response_cache.py) instead of being
+#    scored and serialized again; a new snapshot for a park drops its entries.
+#    Responses carry a weak ETag so unchanged answers come back as 304.
+# ────────────────────────────────────────────────────────────────────────────────
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 2048))  # 0 disables caching
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_SIZE)
+METRICS.counter_source("response_cache_requests_total", lambda: RESPONSE_CACHE.hits, {"result": "hit"})
+METRICS.counter_source("response_cache_requests_total", lambda: RESPONSE_CACHE.misses, {"result": "miss"})
+
+def _forecast_slot(park_index, rides, last_ride, origin, now):
+    """
+    The forecast buckets a forecast answer at `now` reads: the current one and
+    each ride's arrival bucket. Forecast answers only change when one of them
+    does, not just per snapshot.
+    """
+    if FORECASTER is None:
+        return None  # forecasts fall back to live waits
+    if origin is not None and not last_ride:
+        walk_row = park_index.walk_row(None, tuple(origin))
+    else:
+        canonical = resolve_ride_name(last_ride, rides)
+        if canonical is None:
+            return None  # answered with an error either way
+        walk_row = park_index.walk_row(canonical, rides.ride_coords[canonical])
+    now_minute = FORECASTER.minute_of_week(now)
+    return (int(now_minute // BUCKET_MINUTES),
+            tuple(int((now_minute + seconds / 60) // BUCKET_MINUTES) for seconds in walk_row))
+
+def _without(result, *fields):
+    for field in fields:
+        result.pop(field, None)
+    return result
+
+def _batch_items(data):
+    """(items, error) from a /recommend/batch body; error is a message or None."""
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return None, "Expected a non-empty list of items"
+    if len(items) > MAX_BATCH_SIZE:
+        return None, f"Batch too large (max {MAX_BATCH_SIZE} items)"
+    return items, None
+
+def _batch_park_ids(items):
+    """Known parks a batch needs a snapshot for."""
+    park_ids = CATALOG.current().park_ids
+    return {park_ids[item["park"]] for item in items
+            if isinstance(item, dict) and isinstance(item.get("park"), str) and item["park"] in park_ids}
+
+def _prepare_recommend(data):
+    """
+    Validate a /recommend body and record it in its session (if any).
+    Returns (request, None) with what _recommend_entry needs, or
+    (None, (body, status)) to send back as-is.
+    """
+    last_ride = data.get("last_ride")
+    park = data.get("park")
+    weather = data.get("weather", "sunny")
+    hour = data.get("hour", 14)
+    exclude_rides = data.get("exclude_rides", [])
+    k = data.get("k")
+    wait_source = data.get("wait_source")
+    origin, origin_error = _parse_origin(data)
+
+    if origin_error:
+        return None, ({"error": origin_error}, 400)
+    if not (last_ride or origin) or not park:
+        return None, ({"error": "Missing 'last_ride' or 'park' in request"}, 400)
+    session_id = data.get("session_id")
+    param_error = (_ride_fields_error(data) or _top_k_error(k) or _wait_source_error(wait_source)
+                   or _session_id_error(session_id))
+    if param_error:
+        return None, ({"error": param_error}, 400)
+
+    rides = CATALOG.current()
+    park_id = rides.park_ids.get(park)
+    if not park_id:
+        return None, (recommend_next_ride(last_ride, park, weather, hour, exclude_rides), 200)
+    if session_id:
+        exclude_rides = session_exclusions(session_id, last_ride, exclude_rides)
+
+    # Everything that changes the answer for a given snapshot (hour is unused),
+    # including the catalog version, so a catalog reload isn't answered from cache,
+    # and the herding penalties, which only change when one moves a step
+    wait_source = wait_source or WAIT_SOURCE
+    include_path = bool(data.get("include_path"))
+    induced = induced_waits(rides, park)
+    cache_key = ("recommend", rides.version, last_ride, tuple(sorted(map(str, exclude_rides or []))), k,
+                 wait_source, origin, include_path, induced)
+    now = time.time()
+    if wait_source == "forecast":
+        cache_key += (weather, _forecast_slot(rides.park_indexes[park], rides, last_ride, origin, now))
+
+    return {
+        "park_id": park_id,
+        "cache_key": cache_key,
+        "args": (last_ride, park),
+        "options": {"exclude_rides": exclude_rides, "k": k, "wait_source": wait_source,
+                    "weather": weather, "origin": origin, "include_path": include_path,
+                    "rides": rides, "induced": induced, "now": now},
+    }, None
+
+def _recommend_entry(prepared, snapshot, if_none_match=None):
+    """
+    (cached entry, volatile fields) answering a _prepare_recommend request.
+    if_none_match: the request's parsed ETags; a client revalidating an answer
+    it already has isn't counted as a new recommendation.
+    """
+    entry = RESPONSE_CACHE.get(prepared["park_id"], snapshot.version, prepared["cache_key"], lambda: _without(
+        _recommend_from_snapshot(*prepared["args"], snapshot, **prepared["options"]),
+        "snapshot_age_seconds"), meta=lambda result: result.get("recommendation"))
+    if if_none_match is None or not if_none_match.contains_weak(entry.etag):
+        record_recommendation(prepared["options"]["rides"], entry.meta)
+    return entry, {"snapshot_age_seconds": snapshot_age_seconds(snapshot)}
+
+def _debug_park_id(park):
+    return CATALOG.current().park_ids.get(park, 64)
+
+def _debug_entry(park_id, snapshot):
+    """(cached entry, volatile fields) for /debug."""
+    upstream = UPSTREAM.status()
+    # Breaker state is part of the key so a change in it changes the ETag
+    breakers = tuple(sorted((pid, b["state"], b["failures"]) for pid, b in upstream.items()))
+    rides = CATALOG.current()
+    entry = RESPONSE_CACHE.get(park_id, snapshot.version, ("debug", rides.version, breakers), lambda: {
+        "park_id": park_id,
+        "wait_times": snapshot.wait_times,
+        "unmatched_upstream_rides": unmatched_upstream_rides(park_id, snapshot.wait_times, rides),
+        "ride_coords_available": rides.ride_coords_available,
+        "catalog_version": rides.version
+    })
+    herding = HERDING.stats()
+    park_name = rides.park_names_by_id.get(park_id)
+    if park_name:
+        induced = induced_waits(rides, park_name) or ()
+        herding["induced_wait_times"] = {name: minutes for name, minutes
+                                         in zip(rides.park_indexes[park_name].names, induced) if minutes}
+    return entry, {
+        "snapshot_age_seconds": snapshot_age_seconds(snapshot),
+        "upstream": upstream,
+        "response_cache": RESPONSE_CACHE.stats(),
+        "herding": herding
+    }
+
+def _cached_json_response(entry, volatile):
+    """200 with the cached body (plus volatile fields), or 304 if the client has it."""
+    if request.if_none_match.contains_weak(entry.etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(entry.render(volatile), mimetype="application/json")
+    response.set_etag(entry.etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"  # always revalidate; it's cheap
+    return response
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 6) FLASK ENDPOINT: /recommend
@@ -284,6 +1091,24 @@ def recommend_next_ride(last_ride, current_park_name, weather=None, hour=None, e
 #    Returns JSON with the recommendation.
 # ────────────────────────────────────────────────────────────────────────────────
 
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.profiler = PROFILER.maybe_start()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    if getattr(g, "profiler", None) is not None:
+        PROFILER.finish(g.profiler, endpoint)
+        g.profiler = None
+        METRICS.inc("profiles_total", {"endpoint": endpoint})
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        METRICS.observe("request_seconds", time.perf_counter() - started, {"endpoint": endpoint})
+    METRICS.inc("requests_total", {"endpoint": endpoint, "status": response.status_code})
+    return response
+
 @app.route('/recommend', methods=['POST'])
 def recommend_endpoint():
     """
@@ -293,36 +1118,188 @@ def recommend_endpoint():
       "park": "Islands of Adventure",
       "weather": "sunny",
       "hour": 14,
-      "exclude_rides": ["The Simpsons Ride™", "MEN IN BLACK™ Alien Attack!™"]
+      "exclude_rides": ["The Simpsons Ride™", "MEN IN BLACK™ Alien Attack!™"],
+      "k": 3,                                 # optional: also return the 3 best rides
+      "wait_source": "forecast",              # optional: "live" (default) or "forecast"
+      "session_id": "2f1c..."                 # optional: also exclude rides visited in this session
     }
+    Instead of "last_ride", "lat" and "lon" may give the guest's position.
+    "include_path": true adds the walking polyline to the recommended ride.
     """
     data = request.get_json()
     if not data:
         return jsonify({"error": "No JSON provided"}), 400
 
-    last_ride = data.get("last_ride")
+    prepared, error = _prepare_recommend(data)
+    if error:
+        body, status = error
+        return jsonify(body), status
+
+    snapshot = get_wait_snapshot(prepared["park_id"])
+    return _cached_json_response(*_recommend_entry(prepared, snapshot, request.if_none_match))
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch_endpoint():
+    """
+    Expected JSON:
+    {
+      "items": [
+        {"last_ride": "Flight of the Hippogriff™", "park": "Islands of Adventure", "exclude_rides": []},
+        {"last_ride": "Revenge of the Mummy™", "park": "Universal Studios"}
+      ]
+    }
+    A bare JSON list of items is accepted too. Returns {"results": [...]} in request order.
+    """
+    items, error = _batch_items(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+
+    return jsonify({"results": recommend_batch(items)})
+
+@app.route('/itinerary', methods=['POST'])
+def itinerary_endpoint():
+    """
+    Expected JSON:
+    {
+      "start_ride": "Flight of the Hippogriff™",   # or "lat"/"lon"
+      "park": "Islands of Adventure",
+      "rides": ["Jurassic World VelociCoaster", "Skull Island: Reign of Kong™"],
+      "time_budget_minutes": 120,
+      "wait_source": "forecast"                    # optional: "live" (default) or "forecast"
+    }
+    Returns the rides in visiting order under "plan"; rides that don't fit the
+    budget are listed under "unscheduled".
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON provided"}), 400
+
+    start_ride = data.get("start_ride") or data.get("last_ride")
     park = data.get("park")
-    weather = data.get("weather", "sunny")
-    hour = data.get("hour", 14)
-    exclude_rides = data.get("exclude_rides", [])
+    rides = data.get("rides")
+    budget = data.get("time_budget_minutes")
+    wait_source = data.get("wait_source")
+    origin, origin_error = _parse_origin(data)
 
-    if not last_ride or not park:
-        return jsonify({"error": "Missing 'last_ride' or 'park' in request"}), 400
+    if origin_error:
+        return jsonify({"error": origin_error}), 400
+    if not (start_ride or origin) or not park:
+        return jsonify({"error": "Missing 'start_ride' or 'park' in request"}), 400
+    if not isinstance(rides, list) or not rides or not all(isinstance(name, str) for name in rides):
+        return jsonify({"error": "'rides' must be a non-empty list of ride names"}), 400
+    if len(rides) > MAX_ITINERARY_RIDES:
+        return jsonify({"error": f"Too many rides (max {MAX_ITINERARY_RIDES})"}), 400
+    if isinstance(budget, bool) or not isinstance(budget, (int, float)) or not (isfinite(budget) and budget > 0):
+        return jsonify({"error": "'time_budget_minutes' must be a positive number"}), 400
+    if not isinstance(start_ride, (str, type(None))):
+        return jsonify({"error": "'start_ride' must be a string"}), 400
+    param_error = _ride_fields_error(data) or _wait_source_error(wait_source)
+    if param_error:
+        return jsonify({"error": param_error}), 400
 
-    result = recommend_next_ride(last_ride, park, weather, hour, exclude_rides)
+    result = plan_park_itinerary(start_ride, park, rides, budget, origin=origin,
+                                 wait_source=wait_source, weather=data.get("weather"))
     return jsonify(result)
 
-@app.route('/debug', methods=['GET'])
-def debug_endpoint():
-    """Debug endpoint to see what wait times are being fetched"""
-    park_id = 64  # Islands of Adventure
-    wait_times = fetch_wait_times(park_id)
+@app.route('/session', methods=['POST'])
+def create_session_endpoint():
+    """Start a guest session; pass the returned session_id to /recommend."""
+    return jsonify({"session_id": uuid.uuid4().hex})
+
+@app.route('/session/<session_id>', methods=['GET', 'DELETE'])
+def session_endpoint(session_id):
+    """GET the rides a session has visited, or DELETE to start it over."""
+    error = _session_id_error(session_id)
+    if error:
+        return jsonify({"error": error}), 400
+    if request.method == 'DELETE':
+        SESSIONS.clear(session_id)
+        return jsonify({"session_id": session_id, "visited": []})
+    return jsonify({"session_id": session_id, "visited": CATALOG.current().ride_bits.decode(SESSIONS.get(session_id))})
+
+@app.route('/nearby', methods=['GET'])
+def nearby_endpoint():
+    """
+    Open rides near a position, with their current waits:
+      GET /nearby?park=Islands%20of%20Adventure&lat=28.4722&lon=-81.4724&radius=300
+      GET /nearby?park=Islands%20of%20Adventure&lat=28.4722&lon=-81.4724&k=5
+    radius is in meters (default 300); k returns the k nearest open rides instead.
+    The position must be within NEARBY_MAX_OFFSET_M of the park's rides.
+    """
+    park = request.args.get("park")
+    rides = CATALOG.current()
+    park_id = rides.park_ids.get(park)
+    if not park_id:
+        return jsonify({"error": f"Unknown park '{park}'"}), 400
+    origin, origin_error = _parse_origin(request.args)
+    if origin_error or origin is None:
+        return jsonify({"error": origin_error or "Missing 'lat' and 'lon'"}), 400
+    try:
+        k = int(request.args["k"]) if "k" in request.args else None
+        radius = float(request.args.get("radius", 300))
+    except ValueError:
+        return jsonify({"error": "'k' and 'radius' must be numbers"}), 400
+    if (k is not None and k < 1) or not (isfinite(radius) and radius > 0):
+        return jsonify({"error": "'k' and 'radius' must be positive"}), 400
+
+    park_index = rides.park_indexes[park]
+    grid = park_index.grid
+    if grid.distance_from_center(origin) > grid.extent_m + NEARBY_MAX_OFFSET_M:
+        return jsonify({"error": f"Position is not near {park}"}), 400
+    # No ride is farther than this from an accepted origin
+    radius = min(radius, 2 * grid.extent_m + NEARBY_MAX_OFFSET_M)
+
+    snapshot = get_wait_snapshot(park_id)
+    waits = park_index.wait_vector(snapshot.wait_times, snapshot.version)
+    is_open = lambda i: waits[i] is not None
+    if k is not None:
+        found = grid.nearest(origin, k, accept=is_open)
+    else:
+        found = grid.within(origin, radius, accept=is_open)
+
     return jsonify({
-        "park_id": park_id,
-        "wait_times": wait_times,
-        "ride_coords_available": list(RIDE_COORDS.keys())
+        "park": park,
+        "origin": {"lat": origin[0], "lon": origin[1]},
+        "rides": [
+            {"ride": park_index.names[i], "distance_meters": distance, "wait_time": waits[i]}
+            for distance, i in found
+        ],
+        "snapshot_age_seconds": snapshot_age_seconds(snapshot)
     })
 
+@app.route('/stream', methods=['GET'])
+def stream_endpoint():
+    """
+    Server-Sent Events of wait-time changes for one park:
+      GET /stream?park=Islands%20of%20Adventure
+    The first event is a full "snapshot"; after that each new snapshot version
+    sends a "delta" with only the rides that changed. Reconnect with the
+    Last-Event-ID header (browsers do this automatically) or ?since=<version>
+    to resume where you left off.
+    """
+    park = request.args.get("park")
+    park_id = PARK_IDS.get(park)
+    if not park_id:
+        return jsonify({"error": f"Unknown park '{park}'"}), 400
+    since, error = _parse_since(request.headers.get("Last-Event-ID") or request.args.get("since"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    return Response(stream_wait_deltas(park_id, since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics for the whole service (all workers)."""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/debug', methods=['GET'])
+def debug_endpoint():
+    """Debug endpoint to see what wait times are being fetched (?park=..., default Islands of Adventure)"""
+    park_id = _debug_park_id(request.args.get("park"))
+    snapshot = get_wait_snapshot(park_id)
+    return _cached_json_response(*_debug_entry(park_id, snapshot))
+
 # ────────────────────────────────────────────────────────────────────────────────
 # 7) MAIN GUARD: RUN FLASK APP
 #
@@ -344,6 +1321,12 @@ if __name__ == '__main__':
     print("="*60)
     print("📡 Available endpoints:")
     print(f"   POST /recommend - Get ride recommendations")
+    print(f"   POST /recommend/batch - Recommendations for many guests at once")
+    print(f"   POST /itinerary - Order must-do rides within a time budget")
+    print(f"   POST /session   - Start a guest session (server remembers visited rides)")
+    print(f"   GET  /nearby    - Open rides near a lat/lon")
+    print(f"   GET  /stream    - Live wait-time changes (Server-Sent Events)")
+    print(f"   GET  /metrics   - Prometheus metrics")
     print(f"   GET  /debug     - View wait times and available rides")
     print("="*60)
     
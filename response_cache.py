@@ -0,0 +1,121 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Versioned Response Cache
+#
+# A recommendation only depends on the request and the park's wait-time
+# snapshot, so identical requests against the same snapshot version get the
+# same answer. Answers are cached already serialized, in a bounded LRU keyed by
+#
+#   (park_id, snapshot version, request key)
+#
+# and the first request that sees a newer version of a park drops every entry
+# for that park. An older version this cache has already moved past is a
+# straggler and is answered without touching the newer entries; an older
+# version it has never seen means the snapshot versions were reset, and is
+# treated like a newer one. Fields that change between identical requests (how old the
+# snapshot is, breaker countdowns) are left out of the cached body and spliced
+# onto the end when the response is sent, so a hit costs no JSON encoding.
+#
+# Each entry also carries a weak ETag, so clients that send If-None-Match get a
+# 304 with no body at all.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict, deque
+
+
+class CachedResponse:
+    """Serialized body (without the volatile fields) plus its ETag."""
+
+    __slots__ = ("body", "etag", "meta")
+
+    def __init__(self, body, etag, meta=None):
+        self.body = body
+        self.etag = etag
+        self.meta = meta
+
+    def render(self, volatile):
+        """The full JSON body with `volatile` fields added."""
+        if not volatile:
+            return self.body
+        extra = json.dumps(volatile, sort_keys=True)[1:-1]
+        if self.body == "{}":
+            return "{" + extra + "}"
+        return self.body[:-1] + "," + extra + "}"
+
+
+class ResponseCache:
+    """
+    max_entries: LRU bound across every park; 0 disables caching
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (park_id, version, key) -> CachedResponse
+        self._versions = {}            # park_id -> newest snapshot version seen
+        self._superseded = {}          # park_id -> recent versions it replaced
+        self._lock = threading.Lock()
+
+    def get(self, park_id, version, key, compute, meta=None):
+        """
+        The cached response for this request, calling compute() -> dict to build
+        it on a miss. `key` must be hashable and cover every request input that
+        changes the answer. meta: optional callable(dict) -> value kept on the
+        entry as .meta, for callers that need part of the answer on a hit.
+        """
+        cache_key = (park_id, version, key)
+        with self._lock:
+            if self._versions.get(park_id) != version:
+                self._invalidate(park_id, version)
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        result = compute()
+        entry = self._build(cache_key, result)
+        if meta is not None:
+            entry.meta = meta(result)
+        if self.max_entries > 0:
+            with self._lock:
+                if self._versions.get(park_id) == version:
+                    self._entries[cache_key] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._superseded.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _invalidate(self, park_id, version):
+        """Drop a park's entries when its snapshot version moves on (or was reset)."""
+        previous = self._versions.get(park_id)
+        superseded = self._superseded.setdefault(park_id, deque(maxlen=16))
+        if previous is not None and version is not None and version < previous:
+            if version in superseded:
+                return  # a straggler still holding an older snapshot; keep the newer entries
+            print(f"Snapshot version for park {park_id} went back from {previous} to {version}; "
+                  f"dropping its cached responses")
+            superseded.clear()
+        elif previous is not None:
+            superseded.append(previous)
+        self._versions[park_id] = version
+        for cache_key in [k for k in self._entries if k[0] == park_id]:
+            del self._entries[cache_key]
+
+    @staticmethod
+    def _build(cache_key, result):
+        body = json.dumps(result, sort_keys=True)
+        digest = hashlib.blake2b(repr(cache_key).encode() + body.encode(), digest_size=8).hexdigest()
+        return CachedResponse(body, f"{cache_key[1]}-{digest}")
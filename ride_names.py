@@ -0,0 +1,94 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Ride Name Index
+#
+# Guests, the Flutter app and queue-times.com all spell rides a little
+# differently ("Flight of the Hippogriff" vs "Flight of the Hippogriff™",
+# "Hagrid’s" vs "Hagrid's"). Every known ride is indexed once under a
+# normalized key (case-folded, accents, ™/®/© and punctuation stripped), and
+# anything that still doesn't match exactly falls back to trigram similarity.
+# Lookups are memoized, so repeat names resolve with a single dict hit.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import re
+import unicodedata
+
+_APOSTROPHES = re.compile(r"['’‘`]")
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_MARKS = str.maketrans("", "", "™®©℠")
+
+
+def normalize_name(name):
+    """Comparison key for a ride name: 'Hagrid’s Magical…™' -> 'hagrids magical'."""
+    text = unicodedata.normalize("NFKD", name.translate(_MARKS))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.replace("&", " and ")
+    text = _APOSTROPHES.sub("", text)
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RideNameIndex:
+    """
+    names: canonical ride names (e.g. the catalog's ride names)
+    aliases: optional {alias: canonical name}, matched like names
+    min_similarity: Dice coefficient of trigrams a fuzzy match must reach
+    """
+
+    def __init__(self, names, min_similarity=0.6, cache_size=4096, aliases=None):
+        self.names = tuple(names)
+        self.min_similarity = min_similarity
+        self.cache_size = cache_size
+        self._exact = {}
+        for name in self.names:
+            self._exact.setdefault(normalize_name(name), name)
+        for alias, name in (aliases or {}).items():
+            self._exact.setdefault(normalize_name(alias), name)
+
+        self._grams = [_trigrams(key) for key in self._exact]
+        self._keys = list(self._exact)
+        self._postings = {}  # trigram -> indices into _keys
+        for i, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+        self._cache = {}
+
+    def resolve(self, name):
+        """Canonical name for `name`, or None if nothing is close enough."""
+        if not name:
+            return None
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        key = normalize_name(name)
+        canonical = self._exact.get(key)
+        if canonical is None:
+            canonical = self._fuzzy(key)
+
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[name] = canonical
+        return canonical
+
+    def _fuzzy(self, key):
+        grams = _trigrams(key)
+        overlap = {}
+        for gram in grams:
+            for i in self._postings.get(gram, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+        if not overlap:
+            return None
+
+        best_i, best_score = None, 0.0
+        for i, shared in overlap.items():
+            score = 2 * shared / (len(grams) + len(self._grams[i]))
+            if score > best_score:
+                best_i, best_score = i, score
+        if best_score < self.min_similarity:
+            return None
+        return self._exact[self._keys[best_i]]
@@ -0,0 +1,209 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Guest Session Store
+#
+# Remembers which rides a guest has already been on, so the app can send a
+# session id instead of an ever-growing exclude_rides list. Each session's
+# visited set is a bitset held in one Python int: bit n is set when the ride
+# with id n (see RideBits) has been visited, so a guest who has done every
+# ride in all three parks costs a few bytes.
+#
+# Two backends share one interface (get / add / clear):
+#
+#   memory             per-process OrderedDict; fastest, lost on restart and
+#                      not shared between gunicorn workers
+#   sqlite:///<path>   one small SQLite table on local disk; shared by every
+#                      worker on the machine and survives restarts
+#
+# Both evict sessions idle for longer than `ttl` seconds and, past
+# `max_sessions`, the least recently used ones.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class RideBits:
+    """Maps ride names to bit positions; ids are positions in `names` (None for unused ids)."""
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.ids = {name: i for i, name in enumerate(self.names) if name is not None}
+
+    def encode(self, names):
+        """Bitset of the known rides in `names` (unknown names are ignored)."""
+        bits = 0
+        for name in names:
+            i = self.ids.get(name)
+            if i is not None:
+                bits |= 1 << i
+        return bits
+
+    def decode(self, bits):
+        """Ride names whose bits are set, in id order (ids no longer in use are skipped)."""
+        names = []
+        i = 0
+        while bits and i < len(self.names):
+            if bits & 1 and self.names[i] is not None:
+                names.append(self.names[i])
+            bits >>= 1
+            i += 1
+        return names
+
+
+class MemorySessionStore:
+    """
+    max_sessions: LRU bound on live sessions
+    ttl: seconds a session may sit idle before it is forgotten
+    """
+
+    def __init__(self, max_sessions=100000, ttl=12 * 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> (visited bits, last used)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Visited bitset for a session (0 if unknown or expired)."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return 0
+            if now - entry[1] > self.ttl:
+                del self._sessions[session_id]
+                return 0
+            self._sessions[session_id] = (entry[0], now)
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def add(self, session_id, bits):
+        """Mark more rides visited; returns the session's new bitset."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            visited = entry[0] if entry is not None and now - entry[1] <= self.ttl else 0
+            visited |= bits
+            self._sessions[session_id] = (visited, now)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return visited
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now):
+        # Oldest first: stop at the first session that is neither expired nor over the bound
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+
+
+class SqliteSessionStore:
+    """
+    path: SQLite database file (created if missing), shared by every worker
+    max_sessions: LRU bound on stored sessions
+    ttl: seconds a session may sit idle before it is forgotten
+    """
+
+    EVICT_EVERY = 256  # writes between eviction sweeps
+
+    def __init__(self, path, max_sessions=100000, ttl=12 * 3600):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # A throwaway connection, so a gunicorn master that preloads the app
+        # doesn't hand an open SQLite connection to its forked workers
+        db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        try:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, visited BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        finally:
+            db.close()
+
+    def _connect(self):
+        """One connection per thread and process (connections don't survive fork)."""
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def get(self, session_id):
+        """Visited bitset for a session (0 if unknown or expired)."""
+        now = time.time()
+        db = self._connect()
+        row = db.execute("SELECT visited, last_used FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            return 0
+        db.execute("UPDATE sessions SET last_used = ? WHERE id = ?", (now, session_id))
+        return _from_blob(row[0])
+
+    def add(self, session_id, bits):
+        """Mark more rides visited; returns the session's new bitset."""
+        now = time.time()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT visited, last_used FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            visited = _from_blob(row[0]) if row is not None and now - row[1] <= self.ttl else 0
+            visited |= bits
+            db.execute("INSERT OR REPLACE INTO sessions (id, visited, last_used) VALUES (?, ?, ?)",
+                       (session_id, _to_blob(visited), now))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict(now)
+        return visited
+
+    def clear(self, session_id):
+        self._connect().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _evict(self, now):
+        db = self._connect()
+        db.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.ttl,))
+        db.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY last_used DESC"
+            " LIMIT -1 OFFSET ?)", (self.max_sessions,)
+        )
+
+
+def _to_blob(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def _from_blob(blob):
+    return int.from_bytes(blob, "little")
+
+
+def open_session_store(url, max_sessions=100000, ttl=12 * 3600):
+    """Backend for SESSION_STORE: "memory" or "sqlite:///path/to/sessions.db"."""
+    if url.startswith("sqlite:///"):
+        return SqliteSessionStore(url[len("sqlite:///"):], max_sessions, ttl)
+    if url != "memory":
+        print(f"Unknown session store '{url}', using memory")
+    return MemorySessionStore(max_sessions, ttl)
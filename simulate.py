@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+🎢 Guest-Flow Simulator
+
+Offline evaluation of ride-scoring policies. Tens of thousands of simulated
+guests spend a park day riding whatever their policy recommends, scored with
+the API's own scoring core (ParkIndex.best over the park's distance matrix,
+distance + wait * weight), while the queues they join grow and feed back into
+the waits everyone else sees. Every policy replays the same day with the same
+guests, so the per-policy numbers can be compared directly.
+
+Usage:
+    python3 simulate.py --guests 20000 --replicates 4 --output sim.json
+    python3 simulate.py --policies current greedy "peak:wait_weight=10,peak_wait_weight=20"
+    python3 simulate.py --history /tmp/udx-wait-history --date 2026-06-14 --park "Epic Universe"
+
+Waits:
+    By default a synthetic day is generated per replicate (popularity, a midday
+    peak and the odd breakdown per ride). With --history/--date the park's
+    recorded snapshots for that park-local day are replayed instead (see
+    wait_history.py). Either way those are the waits of the real crowd; the
+    simulated guests queue on top of them: a ride's wait is its recorded wait
+    plus the simulated guests in line divided by its hourly capacity. Policies
+    only see waits as of the last --snapshot-minutes boundary, like the lagging
+    upstream feed.
+
+Policies (--policies):
+    current          the API as configured: WAIT_WEIGHT plus herding control
+    greedy           distance + wait * WAIT_WEIGHT, no herding control
+    nearest          closest open ride
+    shortest_wait    shortest posted wait, distance breaks ties
+    random           any open ride (a baseline)
+    NAME:KEY=VALUE,...  a custom policy; keys are wait_weight, peak_wait_weight,
+                     peak_hours (e.g. 11-17), rainy_wait_weight, herding
+                     (minutes per recent recommendation) and random (0/1)
+
+Runs are spread over --processes worker processes, one (policy, replicate)
+simulation per task. Guest state is kept as parallel arrays, one slot per
+guest, and guests due at the same minute are scored against one shared wait
+vector, the way /recommend/batch scores a batch.
+
+Results: a table per policy (means over replicates) and, with --output, JSON
+{"mode", "params", "environment", "policies": {name: {metric: mean}}, "runs"}.
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import time
+from array import array
+from datetime import datetime, time as dt_time
+
+from benchmark import environment, go_offline, write_results
+
+# Hourly capacity and ride length (minutes) by catalog ride type
+RIDE_PROFILES = {
+    "coaster": (1400, 3), "dark_ride": (1800, 5), "simulator": (1500, 5), "water_ride": (1200, 6),
+    "flat_ride": (700, 3), "drop_tower": (600, 2), "carousel": (900, 3), "train": (1500, 8),
+    "show": (2500, 20), "other": (1000, 5),
+}
+
+DECIDE, JOIN, BOARD = 0, 1, 2  # event kinds, packed as guest * 4 + kind
+
+
+class Policy:
+    """
+    How a simulated guest picks their next ride.
+
+    name: label in the results
+    wait_weight: meters of walking one minute of queue is worth
+    peak_wait_weight: wait_weight during peak_hours (None: same as wait_weight)
+    peak_hours: (from, to) park-local hours
+    rainy_wait_weight: wait_weight on a rainy day (None: same as wait_weight)
+    herding: extra queue minutes scored per recent recommendation of a ride
+    random: pick any open ride instead of scoring
+    """
+
+    def __init__(self, name, wait_weight=10, peak_wait_weight=None, peak_hours=(11, 17),
+                 rainy_wait_weight=None, herding=0.0, random=False):
+        self.name = name
+        self.wait_weight = wait_weight
+        self.peak_wait_weight = peak_wait_weight
+        self.peak_hours = peak_hours
+        self.rainy_wait_weight = rainy_wait_weight
+        self.herding = herding
+        self.random = random
+
+    def wait_weight_at(self, hour, weather):
+        if weather == "rainy" and self.rainy_wait_weight is not None:
+            return self.rainy_wait_weight
+        if self.peak_wait_weight is not None and self.peak_hours[0] <= hour < self.peak_hours[1]:
+            return self.peak_wait_weight
+        return self.wait_weight
+
+
+def builtin_policies(app):
+    return {
+        "current": Policy("current", app.WAIT_WEIGHT, herding=app.HERDING_MINUTES_PER_RECOMMENDATION),
+        "greedy": Policy("greedy", app.WAIT_WEIGHT),
+        "nearest": Policy("nearest", 0),
+        "shortest_wait": Policy("shortest_wait", 1000),
+        "random": Policy("random", random=True),
+    }
+
+
+def parse_policy(spec, builtins):
+    """A built-in policy name, or "name:key=value,..." for a custom one."""
+    if spec in builtins:
+        return builtins[spec]
+    name, _, options = spec.partition(":")
+    if not options:
+        raise SystemExit(f"Unknown policy '{spec}' (built-ins: {', '.join(builtins)})")
+    policy = Policy(name)
+    for option in options.split(","):
+        key, _, value = option.partition("=")
+        try:
+            if key == "peak_hours":
+                start, end = value.split("-")
+                policy.peak_hours = (float(start), float(end))
+            elif key == "random":
+                policy.random = value not in ("0", "false", "")
+            elif key in ("wait_weight", "peak_wait_weight", "rainy_wait_weight", "herding"):
+                setattr(policy, key, float(value))
+            else:
+                raise SystemExit(f"Unknown policy option '{key}' in '{spec}'")
+        except ValueError:
+            raise SystemExit(f"Bad value for '{key}' in '{spec}'")
+    return policy
+
+
+# ── waits ───────────────────────────────────────────────────────────────────────
+
+def synthetic_waits(ride_types, minutes, seed, weather="sunny", snapshot_minutes=5):
+    """
+    One wait vector per minute for a made-up day: each ride gets a popularity,
+    a peak time and maybe one breakdown; waits move in 5-minute steps like
+    queue-times. Rain shortens queues and closes water rides.
+    """
+    rng = random.Random(seed)
+    profiles = []
+    for ride_type in ride_types:
+        outage = None
+        if rng.random() < 0.3:
+            start = rng.uniform(0, minutes)
+            outage = (start, start + rng.uniform(15, 90))
+        profiles.append((rng.uniform(0.2, 1.0), rng.uniform(0.35, 0.7), outage,
+                         weather == "rainy" and ride_type == "water_ride"))
+
+    waits, vector = [], None
+    for minute in range(minutes):
+        if vector is None or minute % snapshot_minutes == 0:
+            x = minute / minutes
+            vector = []
+            for popularity, peak, outage, rained_out in profiles:
+                if rained_out or (outage and outage[0] <= minute < outage[1]):
+                    vector.append(None)
+                    continue
+                shape = 0.25 + 0.75 * math.exp(-((x - peak) / 0.3) ** 2)
+                wait = popularity * 100 * shape * (0.7 if weather == "rainy" else 1.0) + rng.gauss(0, 4)
+                vector.append(max(0, 5 * round(wait / 5)))
+            vector = tuple(vector)
+        waits.append(vector)
+    return waits
+
+
+def recorded_waits(history_dir, park_id, names, date, open_hour, minutes, tz):
+    """One wait vector per minute from a recorded park-local day (see wait_history.py)."""
+    from wait_history import CLOSED, WaitHistory
+    history = WaitHistory(history_dir, tz)
+    day = datetime.strptime(date, "%Y-%m-%d").date()
+    start = datetime.combine(day, dt_time(int(open_hour)), history.tz).timestamp()
+    lo, hi = history.row_range(park_id, start, start + minutes * 60)
+    if lo == hi:
+        raise SystemExit(f"No recorded snapshots for park {park_id} on {date} in {history_dir}")
+
+    ts = history.timestamps(park_id)
+    columns = [history.waits(park_id, name) for name in names]
+    waits, row = [], lo
+    for minute in range(minutes):
+        while row + 1 < hi and ts[row + 1] <= start + minute * 60:
+            row += 1  # the newest snapshot at this minute (the day's first until then)
+        waits.append(tuple(
+            None if column is None or row >= len(column) or column[row] == CLOSED else column[row]
+            for column in columns
+        ))
+    return waits
+
+
+# ── simulation ──────────────────────────────────────────────────────────────────
+
+class _Visited(int):
+    """A guest's visited bitset, usable as ParkIndex's `skip` set."""
+
+    def __contains__(self, i):
+        return self >> i & 1
+
+
+class Scenario:
+    """
+    Everything about a simulated day that doesn't depend on the policy.
+
+    park_index: the park's ParkIndex (distance matrix and scoring core)
+    capacities: guests per hour per ride; durations: ride minutes per ride
+    waits: per-minute wait vectors from park open, aligned with park_index.names
+    guests: simulated guests; guest_weight: real guests each one stands for
+    """
+
+    def __init__(self, park_index, capacities, durations, waits, guests, guest_weight=1.0,
+                 open_hour=9, weather="sunny", snapshot_minutes=5, walking_speed_mps=1.4,
+                 herding_window_minutes=5, herding_step=1.0):
+        self.park_index = park_index
+        self.capacities = capacities
+        self.durations = durations
+        self.waits = waits
+        self.guests = guests
+        self.guest_weight = guest_weight
+        self.open_hour = open_hour
+        self.weather = weather
+        self.snapshot_minutes = max(1, int(snapshot_minutes))
+        self.walking_speed_mps = walking_speed_mps
+        self.herding_window_minutes = max(1, int(herding_window_minutes))
+        self.herding_step = herding_step
+
+
+def simulate(scenario, policy, seed):
+    """Run one park day for one policy. Returns a dict of metrics."""
+    started = time.perf_counter()
+    index = scenario.park_index
+    n_rides, minutes, n = len(index), len(scenario.waits), scenario.guests
+    rng = random.Random(seed)  # guests are identical for every policy with the same seed
+    choice_rng = random.Random(seed + 1)
+    per_minute = [capacity / 60 / scenario.guest_weight for capacity in scenario.capacities]
+    durations = [max(1, int(d)) for d in scenario.durations]
+    meters_per_minute = scenario.walking_speed_mps * 60
+
+    # Guest state: parallel arrays, one slot per guest
+    location = array("i", (rng.randrange(n_rides) for _ in range(n)))  # ride they're at
+    arrive_at = array("i", (int(rng.triangular(0, minutes * 0.4, minutes * 0.05)) for _ in range(n)))
+    leave_at = array("d", (a + rng.uniform(0.35, 0.85) * minutes for a in arrive_at))
+    target = array("i", [-1]) * n
+    waited = array("d", [0.0]) * n
+    walked = array("d", [0.0]) * n
+    rides = array("i", [0]) * n
+    visited = [0] * n  # bitset of ride indexes, one Python int per guest
+
+    # Ride state
+    queue = [0] * n_rides       # simulated guests in line
+    recent = [0] * n_rides      # recommendations within the herding window
+    window = [[0] * n_rides for _ in range(scenario.herding_window_minutes)]
+    step = scenario.herding_step
+
+    events = {}
+    for g, minute in enumerate(arrive_at):
+        events.setdefault(minute, []).append(g * 4 + DECIDE)
+
+    join_waits = array("d")
+    closed_arrivals = 0
+    peak_queue = 0
+    observed = None
+    t = 0
+    while events:
+        batch = events.pop(t, None)
+        base = scenario.waits[min(t, minutes - 1)]
+        if observed is None or t % scenario.snapshot_minutes == 0:
+            # What the (lagging) upstream feed shows until the next snapshot
+            observed = tuple(None if b is None else b + queue[r] / per_minute[r] for r, b in enumerate(base))
+        expired = window[t % len(window)]
+        for r in range(n_rides):
+            recent[r] -= expired[r]
+            expired[r] = 0
+        if not batch:
+            t += 1
+            continue
+
+        wait_weight = policy.wait_weight_at(scenario.open_hour + t / 60, scenario.weather)
+        scored = observed
+        i = 0
+        while i < len(batch):
+            g, kind = batch[i] >> 2, batch[i] & 3
+            i += 1
+            if kind == DECIDE:
+                if t >= leave_at[g] or t >= minutes:
+                    continue  # heads home
+                here = location[g]
+                skip = _Visited(visited[g] | 1 << here)
+                if policy.random:
+                    options = [r for r in range(n_rides) if observed[r] is not None and r not in skip]
+                    choice = choice_rng.choice(options) if options else None
+                else:
+                    if policy.herding:
+                        scored = tuple(None if w is None else w + int(recent[r] * policy.herding / step) * step
+                                       for r, w in enumerate(observed))
+                    choice = index.best(index.distances[here], scored, skip, wait_weight)
+                if choice is None:
+                    # Done everything open: start the list over, or wait for rides to reopen
+                    delay = 1 if visited[g] else 10
+                    visited[g] = 0
+                    events.setdefault(t + delay, []).append(g * 4 + DECIDE)
+                    continue
+                recent[choice] += 1
+                expired[choice] += 1  # this minute's slot in the herding window
+                meters = index.distances[here][choice]
+                walked[g] += meters
+                target[g] = choice
+                events.setdefault(t + max(1, math.ceil(meters / meters_per_minute)), []).append(g * 4 + JOIN)
+            elif kind == JOIN:
+                r = target[g]
+                location[g] = r
+                if base[r] is None:
+                    closed_arrivals += 1
+                    visited[g] |= 1 << r  # don't walk straight back to it
+                    batch.append(g * 4 + DECIDE)
+                    continue
+                wait = base[r] + queue[r] / per_minute[r]
+                queue[r] += 1
+                waited[g] += wait
+                join_waits.append(wait)
+                events.setdefault(t + max(1, math.ceil(wait)), []).append(g * 4 + BOARD)
+            else:
+                r = target[g]
+                queue[r] -= 1
+                rides[g] += 1
+                visited[g] |= 1 << r
+                events.setdefault(t + durations[r], []).append(g * 4 + DECIDE)
+        peak_queue = max(peak_queue, sum(queue))
+        t += 1
+
+    total_rides = sum(rides)
+    guest_waits = sorted(waited)
+    join_waits = sorted(join_waits)
+    return {
+        "guests": n,
+        "rides_completed": total_rides,
+        "rides_per_guest": total_rides / n,
+        "wait_minutes_per_guest": sum(waited) / n,
+        "wait_minutes_per_ride": sum(join_waits) / len(join_waits) if join_waits else 0.0,
+        "p90_wait_minutes_per_ride": _percentile(join_waits, 90),
+        "p90_wait_minutes_per_guest": _percentile(guest_waits, 90),
+        "walk_km_per_guest": sum(walked) / n / 1000,
+        "closed_arrivals": closed_arrivals,
+        "peak_simulated_queue": peak_queue,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+# ── running policies in parallel ────────────────────────────────────────────────
+
+_SCENARIOS = None
+
+
+def _init_worker(scenarios):
+    global _SCENARIOS
+    _SCENARIOS = scenarios
+
+
+def _run_task(task):
+    policy, replicate, seed = task
+    return policy.name, replicate, simulate(_SCENARIOS[replicate], policy, seed)
+
+
+def run_policies(scenarios, policies, seed, processes=None):
+    """
+    Simulate every policy against every scenario (one per replicate), spread
+    over a process pool. Returns [(policy name, replicate, metrics), ...].
+    """
+    tasks = [(policy, replicate, seed + 1000 * replicate)
+             for replicate in range(len(scenarios)) for policy in policies]
+    processes = min(processes or os.cpu_count() or 1, len(tasks))
+    if processes <= 1:
+        _init_worker(scenarios)
+        return [_run_task(task) for task in tasks]
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(scenarios,)) as pool:
+        return list(pool.imap_unordered(_run_task, tasks))
+
+
+def summarize(runs, policies):
+    """{policy: {metric: mean over replicates}}, plus the spread of wait per guest."""
+    summary = {}
+    for policy in policies:
+        results = [metrics for name, _, metrics in runs if name == policy.name]
+        summary[policy.name] = {key: statistics.fmean(m[key] for m in results) for key in results[0]}
+        waits = [m["wait_minutes_per_guest"] for m in results]
+        summary[policy.name]["wait_minutes_per_guest_stdev"] = statistics.stdev(waits) if len(waits) > 1 else 0.0
+    return summary
+
+
+def print_summary(summary):
+    columns = [("rides_per_guest", "rides/guest"), ("wait_minutes_per_guest", "wait/guest"),
+               ("wait_minutes_per_ride", "wait/ride"), ("p90_wait_minutes_per_ride", "p90 wait"),
+               ("walk_km_per_guest", "walk km"), ("closed_arrivals", "closed")]
+    print(f"{'policy':<20}" + "".join(f"{label:>13}" for _, label in columns))
+    for name, metrics in summary.items():
+        print(f"{name:<20}" + "".join(f"{metrics[key]:>13.2f}" for key, _ in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate guest flow to compare ride-scoring policies")
+    parser.add_argument("--park", default="Islands of Adventure")
+    parser.add_argument("--policies", nargs="+", default=["current", "greedy", "nearest", "shortest_wait", "random"])
+    parser.add_argument("--guests", type=int, default=20000)
+    parser.add_argument("--guest-weight", type=float, default=1.0, help="real guests each simulated guest stands for")
+    parser.add_argument("--replicates", type=int, default=2, help="independent days per policy")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all CPUs)")
+    parser.add_argument("--open-hour", type=float, default=9)
+    parser.add_argument("--close-hour", type=float, default=21)
+    parser.add_argument("--weather", choices=("sunny", "cloudy", "rainy"), default="sunny")
+    parser.add_argument("--snapshot-minutes", type=int, default=5, help="how stale the waits policies see are")
+    parser.add_argument("--history", default=None, help="wait history directory to replay (with --date)")
+    parser.add_argument("--date", default=None, help="park-local day to replay, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    if bool(args.history) != bool(args.date):
+        parser.error("--history and --date go together")
+
+    go_offline()  # the simulator never calls upstream; keep the app away from real dirs
+    os.environ["WAIT_CACHE_REFRESHER"] = "false"
+    import predictive_in_park as app
+
+    rides = app.CATALOG.data  # no reload watcher in an offline run
+    if args.park not in rides.park_indexes:
+        raise SystemExit(f"Unknown park '{args.park}' (catalog has: {', '.join(rides.park_indexes)})")
+    park_index = rides.park_indexes[args.park]
+    park = next(p for p in rides.catalog.parks if p.name == args.park)
+    profiles = [RIDE_PROFILES.get(ride_type, RIDE_PROFILES["other"]) for ride_type in park.types]
+    minutes = int((args.close_hour - args.open_hour) * 60)
+    builtins = builtin_policies(app)
+    policies = [parse_policy(spec, builtins) for spec in args.policies]
+
+    recorded = (recorded_waits(args.history, park.park_id, park_index.names, args.date,
+                               args.open_hour, minutes, app.PARK_TIMEZONE) if args.history else None)
+    scenarios = []
+    for replicate in range(args.replicates):
+        if recorded:
+            waits = recorded  # replicates differ only in their guests
+        else:
+            waits = synthetic_waits(park.types, minutes, args.seed + 1000 * replicate, args.weather,
+                                    args.snapshot_minutes)
+        scenarios.append(Scenario(
+            park_index, [c for c, _ in profiles], [d for _, d in profiles], waits, args.guests,
+            guest_weight=args.guest_weight, open_hour=args.open_hour, weather=args.weather,
+            snapshot_minutes=args.snapshot_minutes, walking_speed_mps=app.WALKING_SPEED_MPS,
+            herding_window_minutes=app.HERDING_WINDOW_SECONDS / 60, herding_step=app.HERDING_STEP_MINUTES or 1e-9,
+        ))
+
+    print(f"🎢 {args.park}: {args.guests} guests x {len(policies)} policies x {args.replicates} days "
+          f"({'recorded ' + args.date if args.history else 'synthetic waits'})")
+    started = time.perf_counter()
+    runs = run_policies(scenarios, policies, args.seed, args.processes)
+    summary = summarize(runs, policies)
+    print_summary(summary)
+    print(f"⏱️  {time.perf_counter() - started:.1f}s")
+
+    write_results({
+        "mode": "simulate",
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": environment(),
+        "policies": summary,
+        "runs": [{"policy": name, "replicate": replicate, "metrics": metrics}
+                 for name, replicate, metrics in sorted(runs, key=lambda run: (run[0], run[1]))],
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from wait_time_cache import Snapshot
+
+
+@pytest.fixture
+def api():
+    """The Flask API module (settings pinned in the root conftest.py)."""
+    import predictive_in_park
+    return predictive_in_park
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
+
+
+@pytest.fixture
+def set_waits(api):
+    """Store a fresh wait-time snapshot for a park (by name), as if just fetched."""
+    def set_waits(park, wait_times):
+        park_id = api.CATALOG.current().park_ids[park]
+        current = api.WAIT_CACHE.peek(park_id)
+        api.WAIT_CACHE._store(Snapshot(park_id, dict(wait_times), time.time(), current.version + 1))
+        return park_id
+    return set_waits
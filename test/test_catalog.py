@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from catalog import CatalogError, CatalogStore, load_catalog, parse_catalog
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.path.join(HERE, "..", "data", "catalog.json")
+
+
+def catalog_doc(version=1, rides=None):
+    return {"version": version, "parks": [{"id": 64, "name": "Park", "rides": rides or [
+        {"id": 0, "name": "Coaster", "type": "coaster", "lat": 28.47, "lon": -81.47},
+        {"id": 1, "name": "Dark Ride", "aliases": ["The Dark"], "type": "dark_ride", "lat": 28.471, "lon": -81.47},
+    ]}]}
+
+
+def write(path, doc):
+    path.write_text(json.dumps(doc), encoding="utf-8")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+
+
+def test_bundled_catalog_is_valid():
+    catalog = load_catalog(CATALOG_PATH)
+    assert catalog.parks and all(len(park) for park in catalog.parks)
+
+
+def test_rejects_duplicate_names_and_bad_coordinates():
+    rides = catalog_doc()["parks"][0]["rides"]
+    with pytest.raises(CatalogError, match="also names"):
+        parse_catalog(catalog_doc(rides=rides + [dict(rides[0], id=2, name="coaster")]))
+    with pytest.raises(CatalogError, match="'lat'"):
+        parse_catalog(catalog_doc(rides=[dict(rides[0], lat=95)]))
+
+
+def test_reload_swaps_new_versions_only(tmp_path):
+    path = tmp_path / "catalog.json"
+    write(path, catalog_doc(version=1))
+    store = CatalogStore(str(path), lambda catalog: catalog, check_interval=0)
+    swapped = []
+    store.add_listener(swapped.append)
+
+    doc = catalog_doc(version=1)
+    doc["parks"][0]["rides"][0]["name"] = "Renamed Coaster"
+    write(path, doc)
+    assert store.reload() is False  # changed but not re-versioned
+
+    doc["version"] = 2
+    write(path, doc)
+    assert store.reload() is True
+    assert store.current().version == 2 and swapped == [store.current()]
+
+
+def test_reload_keeps_current_catalog_on_bad_file(tmp_path):
+    path = tmp_path / "catalog.json"
+    write(path, catalog_doc(version=1))
+    store = CatalogStore(str(path), lambda catalog: catalog, check_interval=0)
+
+    path.write_text("{not json", encoding="utf-8")
+    assert store.reload(force=True) is False
+
+    moved = catalog_doc(version=2)
+    moved["parks"][0]["rides"][0]["id"] = 7  # an existing ride may not change id
+    write(path, moved)
+    assert store.reload() is False
+    assert store.current().version == 1
@@ -0,0 +1,54 @@
+from herding import RecommendationCounter
+
+
+def make_counter(tmp_path, **kwargs):
+    return RecommendationCounter(str(tmp_path), capacity=4, window_seconds=300, bucket_seconds=30,
+                                 refresh_interval=0, **kwargs)
+
+
+def test_counts_recent_recommendations(tmp_path):
+    counter = make_counter(tmp_path)
+    now = 1_000_000.0
+    counter.record(1, now)
+    counter.record(1, now + 10)
+    counter.record(3, now + 40)
+    assert counter.counts([0, 1, 2, 3], now + 50) == [0, 2, 0, 1]
+    assert counter.recorded == 3
+
+
+def test_old_recommendations_age_out(tmp_path):
+    counter = make_counter(tmp_path)
+    now = 1_000_000.0
+    counter.record(2, now)
+    assert counter.counts([2], now + 100) == [1]
+    assert counter.counts([2], now + 400) == [0]
+
+
+def test_reused_slot_is_cleared(tmp_path):
+    counter = make_counter(tmp_path)
+    now = 1_000_000.0
+    counter.record(2, now)
+    counter.record(2, now + 300)  # same ring slot, one window later
+    assert counter.counts([2], now + 300) == [1]
+
+
+def test_other_workers_shards_are_summed(tmp_path):
+    worker = make_counter(tmp_path)
+    now = 1_000_000.0
+    worker.record(1, now)
+    # Stand-in for another worker: same shard layout under a live pid (1)
+    other = make_counter(tmp_path)
+    other._path = lambda pid=None: str(tmp_path / "herding-1.bin")
+    other.record(1, now)
+    assert worker.counts([1], now) == [2]
+
+
+def test_ensure_capacity_keeps_counts(tmp_path):
+    counter = make_counter(tmp_path)
+    now = 1_000_000.0
+    counter.record(1, now)
+    counter.record(9, now)  # beyond capacity: ignored
+    counter.ensure_capacity(10)
+    counter.record(9, now)
+    counter.refresh(now)
+    assert counter.counts([1, 9], now) == [1, 1]
@@ -0,0 +1,75 @@
+import itertools
+import random
+
+from itinerary import held_karp, plan_itinerary, walk_plan
+
+
+def random_park(n, seed):
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 600), rng.uniform(0, 600)) for _ in range(n + 1)]
+    walk = lambda a, b: ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5 / 1.4
+    start_walk = [walk(points[-1], p) for p in points[:n]]
+    pair_walk = [[walk(p, q) for q in points[:n]] for p in points[:n]]
+    waits = [rng.randrange(5, 60) * 60 for _ in range(n)]
+    return start_walk, pair_walk, waits
+
+
+def finish(order, start_walk, pair_walk, wait_fn):
+    return walk_plan(order, start_walk, pair_walk, wait_fn)[-1][2]
+
+
+def test_walk_plan_timeline():
+    timeline = walk_plan([1, 0], [100, 50], [[0, 30], [30, 0]], lambda i, arrive: 600)
+    assert timeline == [(50, 600, 650), (680, 600, 1280)]
+
+
+def test_exact_plan_matches_brute_force():
+    start_walk, pair_walk, waits = random_park(6, seed=3)
+    wait_fn = lambda i, arrive: waits[i] + arrive * 0.1  # queues grow through the day
+    order, method = plan_itinerary(range(6), start_walk, pair_walk, wait_fn, budget=1e9)
+    best = min(finish(list(p), start_walk, pair_walk, wait_fn) for p in itertools.permutations(range(6)))
+    assert method == "exact"
+    assert sorted(order) == list(range(6))
+    assert abs(finish(order, start_walk, pair_walk, wait_fn) - best) < 1e-6
+
+
+def test_budget_keeps_most_rides_that_fit():
+    start_walk, pair_walk, waits = random_park(5, seed=7)
+    wait_fn = lambda i, arrive: waits[i]
+    budget = sorted(start_walk[i] + waits[i] for i in range(5))[1] + 1
+    order = held_karp(list(range(5)), start_walk, pair_walk, wait_fn, budget, deadline=float("inf"))
+    assert order and finish(order, start_walk, pair_walk, wait_fn) <= budget
+
+
+def test_heuristic_for_large_sets_fits_budget():
+    start_walk, pair_walk, waits = random_park(20, seed=11)
+    wait_fn = lambda i, arrive: waits[i]
+    order, method = plan_itinerary(range(20), start_walk, pair_walk, wait_fn, budget=4 * 3600, exact_limit=8)
+    assert method == "heuristic"
+    assert len(set(order)) == len(order)
+    assert finish(order, start_walk, pair_walk, wait_fn) <= 4 * 3600
+
+
+def test_nothing_fits():
+    order, _ = plan_itinerary([0], [600], [[0]], lambda i, arrive: 600, budget=60)
+    assert order == []
+
+
+ITINERARY = {"start_ride": "E.T. Adventure™", "park": "Universal Studios", "time_budget_minutes": 240}
+
+
+def test_itinerary_endpoint_plans_and_lists_unavailable(client, set_waits):
+    set_waits("Universal Studios", {"Revenge of the Mummy™": 30, "E.T. Adventure™": 10})
+    resp = client.post("/itinerary", json={**ITINERARY, "rides": ["Revenge of the Mummy™", "No Such Ride"]})
+
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert [stop["ride"] for stop in body["plan"]] == ["Revenge of the Mummy™"]
+    assert body["unavailable"] == [{"ride": "No Such Ride", "reason": "unknown"}]
+
+
+def test_itinerary_endpoint_rejects_non_string_rides(client):
+    for rides in (["Revenge of the Mummy™", {"name": "E.T. Adventure™"}], [["Revenge of the Mummy™"]], [42]):
+        resp = client.post("/itinerary", json={**ITINERARY, "rides": rides})
+        assert resp.status_code == 400
+        assert resp.get_json()["error"] == "'rides' must be a non-empty list of ride names"
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+from metrics import Metrics, retire_worker
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def write_worker_file(directory, pid, count, open_breakers):
+    with open(os.path.join(directory, f"metrics-{pid}.json"), "w", encoding="utf-8") as f:
+        json.dump({"counters": {"requests_total": {"": count}}, "histograms": {},
+                   "gauges": {"upstream_circuit_open": [[{"park_id": 64}, open_breakers]]}}, f)
+
+
+def make_metrics(directory):
+    metrics = Metrics(str(directory), flush_interval=3600)
+    metrics.counter("requests_total", "Requests.")
+    metrics.gauge("upstream_circuit_open", "Open breakers.", lambda: [({"park_id": 64}, 0)], per_worker=True)
+    return metrics
+
+
+def test_dead_workers_are_folded_into_retired_totals(tmp_path):
+    metrics = make_metrics(tmp_path)
+    metrics.inc("requests_total", value=2)
+    pid = dead_pid()
+    write_worker_file(tmp_path, pid, 5, 1)
+
+    text = metrics.render()
+    assert "udx_requests_total 7" in text
+    assert not os.path.exists(tmp_path / f"metrics-{pid}.json")
+    assert f'pid="{pid}"' not in text  # dead workers' breakers aren't reported
+
+    # Counters don't go backwards once the dead worker's file is gone
+    assert "udx_requests_total 7" in metrics.render()
+
+
+def test_per_worker_gauges_have_pid_labels(tmp_path):
+    metrics = make_metrics(tmp_path)
+    text = metrics.render()
+    assert f'udx_upstream_circuit_open{{park_id="64",pid="{os.getpid()}"}} 0' in text
+
+
+def test_retire_worker_is_idempotent(tmp_path):
+    metrics = make_metrics(tmp_path)
+    pid = dead_pid()
+    write_worker_file(tmp_path, pid, 3, 0)
+    retire_worker(str(tmp_path), pid)
+    retire_worker(str(tmp_path), pid)
+    assert "udx_requests_total 3" in metrics.render()
@@ -0,0 +1,41 @@
+import pytest
+
+PARK = "Universal Studios"
+MUMMY = (28.476781, -81.469866)
+
+
+@pytest.fixture(autouse=True)
+def waits(set_waits):
+    set_waits(PARK, {"Revenge of the Mummy™": 30, "E.T. Adventure™": 10})
+
+
+def nearby(client, **params):
+    return client.get("/nearby", query_string={"park": PARK, **params})
+
+
+def test_nearby_lists_open_rides_by_distance(client):
+    resp = nearby(client, lat=MUMMY[0], lon=MUMMY[1], k=2)
+    assert resp.status_code == 200
+    rides = resp.get_json()["rides"]
+    assert rides[0]["ride"] == "Revenge of the Mummy™"
+    assert [r["distance_meters"] for r in rides] == sorted(r["distance_meters"] for r in rides)
+    assert {r["ride"] for r in rides} == {"Revenge of the Mummy™", "E.T. Adventure™"}
+
+
+@pytest.mark.parametrize("radius", ["nan", "inf", "-inf", "0", "-5"])
+def test_nearby_rejects_non_finite_or_non_positive_radius(client, radius):
+    resp = nearby(client, lat=MUMMY[0], lon=MUMMY[1], radius=radius)
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("lat, lon", [("nan", MUMMY[1]), (MUMMY[0], "nan"), ("inf", MUMMY[1]), (MUMMY[0], "-inf")])
+def test_nearby_rejects_non_finite_position(client, lat, lon):
+    resp = nearby(client, lat=lat, lon=lon)
+    assert resp.status_code == 400
+
+
+def test_recommend_rejects_non_finite_position(client):
+    resp = client.post("/recommend", data='{"park": "Universal Studios", "lat": NaN, "lon": -81.47}',
+                       content_type="application/json")
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "'lat' and 'lon' must both be finite numbers"
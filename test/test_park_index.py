@@ -0,0 +1,71 @@
+import time
+from math import asin, cos, radians, sin, sqrt
+
+from park_index import SpatialGrid
+
+RIDES = [(28.4700 + 0.001 * (i % 5), -81.4700 - 0.001 * (i // 5)) for i in range(20)]
+
+
+def haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(radians, (*a, *b))
+    h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * asin(sqrt(h))
+
+
+def brute_force(coord, coords):
+    return sorted((haversine(coord, c), i) for i, c in enumerate(coords))
+
+
+def test_within_matches_brute_force():
+    grid = SpatialGrid(RIDES, haversine)
+    origin = (28.4712, -81.4715)
+    expected = [(d, i) for d, i in brute_force(origin, RIDES) if d <= 250]
+    assert grid.within(origin, 250) == expected
+
+
+def test_nearest_matches_brute_force():
+    grid = SpatialGrid(RIDES, haversine)
+    origin = (28.4695, -81.4690)
+    assert grid.nearest(origin, 3) == brute_force(origin, RIDES)[:3]
+
+
+def test_nearest_respects_accept():
+    grid = SpatialGrid(RIDES, haversine)
+    found = grid.nearest(RIDES[0], 2, accept=lambda i: i % 2 == 1)
+    assert [i for _, i in found] == [i for _, i in brute_force(RIDES[0], RIDES) if i % 2 == 1][:2]
+
+
+def test_far_and_large_queries_are_bounded():
+    grid = SpatialGrid(RIDES, haversine)
+    started = time.perf_counter()
+    assert len(grid.within(RIDES[0], 1e9)) == len(RIDES)
+    far = (29.5, -81.47)  # ~100 km north
+    assert grid.nearest(far, 1) == brute_force(far, RIDES)[:1]
+    assert grid.within(far, 1000) == []
+    assert time.perf_counter() - started < 0.5
+
+
+def test_empty_grid():
+    grid = SpatialGrid([], haversine)
+    assert grid.within((28.47, -81.47), 300) == []
+    assert grid.nearest((28.47, -81.47), 3) == []
+
+
+def test_walk_times_use_walkway_edge_seconds():
+    from park_index import ParkIndex
+    from walkways import WalkwayGraph
+
+    coords = {"A": (28.4700, -81.4700), "B": (28.4710, -81.4700)}
+    graph = WalkwayGraph(
+        [{"id": "a", "lat": 28.4700, "lon": -81.4700, "ride": "A"},
+         {"id": "b", "lat": 28.4710, "lon": -81.4700, "ride": "B"}],
+        [["a", "b", {"meters": 120, "seconds": 300}]],
+        haversine,
+    )
+    index = ParkIndex("Park", coords, haversine, walkways=graph, walking_speed_mps=1.4)
+    assert index.distances[0][1] == 120
+    assert index.walk_times[0][1] == 300
+    assert index.walk_row("A", coords["A"]) == (0.0, 300)
+
+    plain = ParkIndex("Park", coords, haversine, walking_speed_mps=1.4)
+    assert plain.walk_times[0][1] == plain.distances[0][1] / 1.4
@@ -0,0 +1,73 @@
+import pytest
+
+PARK = "Universal Studios"
+WAITS = {
+    "Revenge of the Mummy™": 30,
+    "Hollywood Rip Ride Rockit™": 45,
+    "E.T. Adventure™": 10,
+    "Despicable Me Minion Mayhem™": 25,
+}
+
+
+@pytest.fixture(autouse=True)
+def waits(set_waits):
+    set_waits(PARK, WAITS)
+
+
+def post_batch(client, items):
+    resp = client.post("/recommend/batch", json={"items": items})
+    assert resp.status_code == 200
+    return resp.get_json()["results"]
+
+
+def test_batch_answers_match_single_requests(client):
+    items = [
+        {"last_ride": "Revenge of the Mummy™", "park": PARK},
+        {"last_ride": "E.T. Adventure™", "park": PARK, "exclude_rides": ["Revenge of the Mummy™"]},
+    ]
+    results = post_batch(client, items)
+
+    assert len(results) == len(items)
+    for item, result in zip(items, results):
+        single = client.post("/recommend", json=item).get_json()
+        assert result["recommendation"] == single["recommendation"]
+
+
+@pytest.mark.parametrize("bad_item, error", [
+    ("not an object", "Each item must be a JSON object"),
+    ({"last_ride": "E.T. Adventure™"}, "Missing 'last_ride' or 'park' in request"),
+    ({"last_ride": "E.T. Adventure™", "park": [PARK]}, "'park' must be a string"),
+    ({"last_ride": "E.T. Adventure™", "park": {"name": PARK}}, "'park' must be a string"),
+    ({"last_ride": ["E.T. Adventure™"], "park": PARK}, "'last_ride' must be a string"),
+    ({"last_ride": "E.T. Adventure™", "park": PARK, "exclude_rides": "E.T. Adventure™"},
+     "'exclude_rides' must be a list of ride names"),
+    ({"last_ride": "E.T. Adventure™", "park": PARK, "exclude_rides": [{"name": "E.T. Adventure™"}]},
+     "'exclude_rides' must be a list of ride names"),
+    ({"last_ride": "E.T. Adventure™", "park": PARK, "k": 0}, "'k' must be an integer between 1 and"),
+])
+def test_bad_item_fails_alone(client, bad_item, error):
+    good = {"last_ride": "Revenge of the Mummy™", "park": PARK}
+    results = post_batch(client, [good, bad_item, good])
+
+    assert results[1]["error"].startswith(error)
+    assert results[0]["recommendation"]
+    assert results[2]["recommendation"] == results[0]["recommendation"]
+
+
+def test_unknown_park_is_reported_per_item(client):
+    results = post_batch(client, [{"last_ride": "E.T. Adventure™", "park": "Nowhere Land"},
+                                  {"last_ride": "E.T. Adventure™", "park": PARK}])
+    assert results[0] == {"error": "Unknown park 'Nowhere Land'"}
+    assert results[1]["recommendation"]
+
+
+def test_single_recommend_rejects_wrong_types(client):
+    resp = client.post("/recommend", json={"last_ride": "E.T. Adventure™", "park": PARK,
+                                           "exclude_rides": [{"name": "E.T. Adventure™"}]})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "'exclude_rides' must be a list of ride names"
+
+
+def test_batch_body_must_be_a_list_of_items(client):
+    assert client.post("/recommend/batch", json={"items": "nope"}).status_code == 400
+    assert client.post("/recommend/batch", json={"items": []}).status_code == 400
@@ -0,0 +1,32 @@
+from response_cache import ResponseCache
+
+
+def test_new_version_drops_old_entries():
+    cache = ResponseCache()
+    first = cache.get(64, 1, "key", lambda: {"ride": "A"})
+    assert cache.get(64, 1, "key", lambda: {"ride": "B"}) is first
+    assert cache.get(64, 2, "key", lambda: {"ride": "B"}).body == '{"ride": "B"}'
+
+
+def test_straggler_keeps_newer_entries():
+    cache = ResponseCache()
+    cache.get(64, 1, "key", lambda: {"ride": "A"})
+    newer = cache.get(64, 2, "key", lambda: {"ride": "B"})
+    assert cache.get(64, 1, "key", lambda: {"ride": "A"}).body == '{"ride": "A"}'
+    assert cache.get(64, 2, "key", lambda: {"ride": "C"}) is newer
+
+
+def test_version_reset_is_cached_again():
+    cache = ResponseCache()
+    cache.get(64, 50, "key", lambda: {"ride": "A"})
+    reset = cache.get(64, 3, "key", lambda: {"ride": "B"})
+    assert cache.get(64, 3, "key", lambda: {"ride": "C"}) is reset
+    assert cache.stats()["entries"] == 1
+
+
+def test_etag_changes_with_body():
+    cache = ResponseCache()
+    a = cache.get(64, 1, "a", lambda: {"ride": "A"})
+    b = cache.get(64, 1, "b", lambda: {"ride": "B"})
+    assert a.etag != b.etag
+    assert a.render({"age": 3}) == '{"ride": "A","age": 3}'
@@ -0,0 +1,45 @@
+from ride_names import RideNameIndex, normalize_name
+
+NAMES = [
+    "Flight of the Hippogriff™",
+    "Hagrid's Magical Creatures Motorbike Adventure™",
+    "The Incredible Hulk Coaster®",
+    "Jurassic World VelociCoaster",
+]
+
+
+def test_normalize_name():
+    assert normalize_name("Hagrid’s Magical Creatures™") == "hagrids magical creatures"
+    assert normalize_name("Café & Bar®") == "cafe and bar"
+
+
+def test_resolve_exact_ignores_marks_case_and_apostrophes():
+    index = RideNameIndex(NAMES)
+    assert index.resolve("Flight of the Hippogriff™") == "Flight of the Hippogriff™"
+    assert index.resolve("flight of the hippogriff") == "Flight of the Hippogriff™"
+    assert index.resolve("Hagrid’s Magical Creatures Motorbike Adventure") == NAMES[1]
+
+
+def test_resolve_fuzzy():
+    index = RideNameIndex(NAMES)
+    assert index.resolve("Incredible Hulk Coaster") == "The Incredible Hulk Coaster®"
+    assert index.resolve("Jurassic World Velocicoster") == "Jurassic World VelociCoaster"
+
+
+def test_resolve_miss():
+    index = RideNameIndex(NAMES)
+    assert index.resolve("Space Mountain") is None
+    assert index.resolve("") is None
+    assert index.resolve(None) is None
+
+
+def test_resolve_alias():
+    index = RideNameIndex(NAMES, aliases={"VelociCoaster": "Jurassic World VelociCoaster"})
+    assert index.resolve("velocicoaster") == "Jurassic World VelociCoaster"
+
+
+def test_cached_misses_stay_misses():
+    index = RideNameIndex(NAMES, cache_size=1)
+    assert index.resolve("Space Mountain") is None
+    assert index.resolve("Space Mountain") is None
+    assert index.resolve("Flight of the Hippogriff") == "Flight of the Hippogriff™"
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from catalog import RideData, parse_catalog
+from wait_time_cache import Snapshot
+
+# A few spots 0-200 m apart, so rides share positions and scores often tie
+SPOTS = [(28.4700 + 0.0009 * dy, -81.4700 + 0.0009 * dx) for dy in range(3) for dx in range(3)]
+
+
+def random_park(rng, park_id):
+    names = [f"Ride {park_id}-{i}" for i in range(rng.randint(2, 12))]
+    rides = [{"id": park_id * 100 + i, "name": name, "type": "coaster",
+              "lat": spot[0], "lon": spot[1]}
+             for i, (name, spot) in enumerate((name, rng.choice(SPOTS)) for name in names)]
+    return {"id": park_id, "name": f"Park {park_id}", "rides": rides}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_loop_and_matrix_pick_the_same_ride(api, seed):
+    rng = random.Random(seed)
+    catalog = parse_catalog({"version": seed, "parks": [random_park(rng, park_id) for park_id in (1, 2)]})
+    rides = RideData(catalog, api.haversine)
+
+    for trial in range(50):
+        park = rng.choice(list(rides.park_ids))
+        names = list(rides.park_indexes[park].names)
+        # Upstream order differs from the catalog's, and lists rides we have no coordinates for
+        open_rides = [name for name in names if rng.random() < 0.8] + ["Unmapped Ride"]
+        rng.shuffle(open_rides)
+        wait_times = {name: rng.choice((0, 5, 10, 15)) for name in open_rides}
+        snapshot = Snapshot(rides.park_ids[park], wait_times, None, trial + 1)
+        last_ride = rng.choice(names)
+        exclude_rides = rng.sample(names, rng.randint(0, len(names) // 2))
+
+        matrix, loop = (
+            api._recommend_from_snapshot(last_ride, park, snapshot, exclude_rides=exclude_rides,
+                                         scoring_mode=mode, wait_source="live", rides=rides)
+            for mode in ("matrix", "loop"))
+        assert (loop.get("recommendation"), loop.get("wait_time"), loop.get("distance_meters")) == \
+               (matrix.get("recommendation"), matrix.get("wait_time"), matrix.get("distance_meters"))
@@ -0,0 +1,48 @@
+import pytest
+
+from session_store import RideBits, open_session_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    url = "memory" if request.param == "memory" else f"sqlite:///{tmp_path / 'sessions.db'}"
+    return open_session_store(url, max_sessions=2, ttl=3600)
+
+
+def test_ride_bits_round_trip():
+    bits = RideBits(["A", None, "B", "C"])
+    encoded = bits.encode(["C", "A", "Unknown"])
+    assert encoded == 0b1001
+    assert bits.decode(encoded) == ["A", "C"]
+    assert bits.decode(0b0010) == []  # retired id
+
+
+def test_add_accumulates_and_clear_forgets(store):
+    assert store.get("guest") == 0
+    assert store.add("guest", 0b01) == 0b01
+    assert store.add("guest", 0b10) == 0b11
+    assert store.get("guest") == 0b11
+    store.clear("guest")
+    assert store.get("guest") == 0
+
+
+def test_large_bitsets_survive(store):
+    bits = 1 << 500 | 1
+    store.add("guest", bits)
+    assert store.get("guest") == bits
+
+
+def test_expired_sessions_start_over(tmp_path):
+    store = open_session_store("memory", ttl=-1)
+    store.add("guest", 0b1)
+    assert store.get("guest") == 0
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = open_session_store("memory", max_sessions=2)
+    store.add("a", 1)
+    store.add("b", 1)
+    store.get("a")
+    store.add("c", 1)
+    assert len(store) == 2
+    assert store.get("b") == 0 and store.get("a") == 1
@@ -0,0 +1,63 @@
+from math import asin, cos, radians, sin, sqrt
+
+import pytest
+
+from park_index import ParkIndex
+from simulate import Policy, Scenario, run_policies, simulate, synthetic_waits
+
+# Four rides 100-300 m apart
+RIDES = {f"Ride {i}": (28.4700 + 0.0009 * (i % 2), -81.4700 + 0.0009 * (i // 2)) for i in range(4)}
+MINUTES = 180
+
+
+def haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(radians, (*a, *b))
+    h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * asin(sqrt(h))
+
+
+@pytest.fixture(scope="module")
+def park_index():
+    return ParkIndex("Test Park", RIDES, haversine)
+
+
+def scenario(park_index, guests, waits=None, capacity=600):
+    waits = waits or synthetic_waits(["coaster"] * len(RIDES), MINUTES, seed=3)
+    return Scenario(park_index, [capacity] * len(RIDES), [3] * len(RIDES), waits, guests)
+
+
+def metrics(result):
+    return {key: value for key, value in result.items() if key != "seconds"}
+
+
+def test_same_seed_same_day(park_index):
+    day = scenario(park_index, guests=40)
+    for policy in (Policy("greedy"), Policy("random", random=True)):
+        assert metrics(simulate(day, policy, seed=7)) == metrics(simulate(day, policy, seed=7))
+    assert metrics(simulate(day, Policy("greedy"), seed=7)) != metrics(simulate(day, Policy("greedy"), seed=8))
+
+
+def test_every_policy_plays_the_same_days_with_the_same_guests(park_index):
+    days = [scenario(park_index, guests=40), scenario(park_index, guests=40,
+                                                      waits=synthetic_waits(["coaster"] * 4, MINUTES, seed=4))]
+    # Two policies that only differ in name must see identical days and guests
+    policies = [Policy("greedy"), Policy("greedy too"), Policy("nearest", wait_weight=0)]
+    runs = {(name, replicate): metrics(result) for name, replicate, result in run_policies(days, policies, 5, 1)}
+
+    assert len(runs) == len(days) * len(policies)
+    for replicate in range(len(days)):
+        assert runs["greedy", replicate] == runs["greedy too", replicate]
+        assert runs["greedy", replicate]["guests"] == runs["nearest", replicate]["guests"] == 40
+    assert runs["greedy", 0] != runs["greedy", 1]
+
+
+def test_simulated_queues_feed_back_into_waits(park_index):
+    no_lines = [(0,) * len(RIDES)] * MINUTES  # the real crowd never queues
+
+    alone = simulate(scenario(park_index, guests=1, waits=no_lines), Policy("greedy"), seed=1)
+    assert alone["rides_completed"] > 0
+    assert alone["wait_minutes_per_ride"] == 0
+
+    crowd = simulate(scenario(park_index, guests=300, waits=no_lines, capacity=120), Policy("greedy"), seed=1)
+    assert crowd["peak_simulated_queue"] > 0
+    assert crowd["wait_minutes_per_ride"] > 0
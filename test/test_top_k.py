@@ -0,0 +1,47 @@
+import pytest
+
+PARK = "Universal Studios"
+WAITS = {
+    "Revenge of the Mummy™": 30,
+    "Hollywood Rip Ride Rockit™": 45,
+    "E.T. Adventure™": 10,
+    "Despicable Me Minion Mayhem™": 25,
+}
+
+
+@pytest.fixture(autouse=True)
+def waits(set_waits):
+    set_waits(PARK, WAITS)
+
+
+def recommend(client, **body):
+    return client.post("/recommend", json={"last_ride": "Revenge of the Mummy™", "park": PARK, **body})
+
+
+@pytest.mark.parametrize("mode", ["matrix", "loop"])
+def test_ranked_starts_with_the_recommendation(api, client, monkeypatch, mode):
+    monkeypatch.setattr(api, "SCORING_MODE", mode)
+    single = recommend(client).get_json()
+    body = recommend(client, k=3).get_json()
+
+    assert "ranked" not in single
+    assert body["recommendation"] == single["recommendation"]
+    ranked = body["ranked"]
+    assert len(ranked) == 3
+    assert ranked[0]["ride"] == body["recommendation"]
+    assert ranked[0]["wait_time"] == body["wait_time"]
+    assert [r["score"] for r in ranked] == sorted(r["score"] for r in ranked)
+    assert "Revenge of the Mummy™" not in {r["ride"] for r in ranked}
+
+
+def test_fewer_open_rides_than_k(client):
+    body = recommend(client, k=10, exclude_rides=["E.T. Adventure™"]).get_json()
+    assert [r["ride"] for r in body["ranked"]][0] == body["recommendation"]
+    assert {r["ride"] for r in body["ranked"]} == {"Hollywood Rip Ride Rockit™", "Despicable Me Minion Mayhem™"}
+
+
+@pytest.mark.parametrize("k", [0, -1, 10 ** 6, 2.5, "3", True, [3]])
+def test_bad_k_is_rejected(api, client, k):
+    resp = recommend(client, k=k)
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == f"'k' must be an integer between 1 and {api.MAX_TOP_K}"
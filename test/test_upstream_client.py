@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from fake_queue_times import FakeQueueTimes
+from upstream_client import AsyncUpstreamClient, CircuitBreaker, CircuitOpenError, UpstreamClient, UpstreamError
+from wait_time_cache import WaitTimeCache
+
+PARKS = {64: ["Ride A", "Ride B"], 65: ["Ride C"]}
+
+
+@pytest.fixture
+def fake():
+    fake = FakeQueueTimes(PARKS, seed=7)
+    server = fake.serve()
+    fake.base_url = f"http://127.0.0.1:{server.server_port}/parks/{{}}/queue_times.json"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(fake, **kwargs):
+    kwargs.setdefault("base_backoff", 0.05)
+    return UpstreamClient(fake.base_url, timeout=(1.0, 1.0), failure_threshold=3, **kwargs)
+
+
+def test_breaker_opens_after_threshold_and_backs_off():
+    breaker = CircuitBreaker(failure_threshold=3, base_backoff=5.0, max_backoff=300.0)
+    for _ in range(2):
+        breaker.record_failure(now=100.0)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow(now=100.0)
+
+    breaker.record_failure(now=100.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow(now=104.9)
+
+    assert breaker.allow(now=105.0)  # one half-open trial
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow(now=105.0)
+
+    breaker.record_failure(now=105.0)  # trial failed: open again for twice as long
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow(now=114.9)
+    assert breaker.allow(now=115.0)
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_open_breaker_fails_fast_without_calling_upstream(fake):
+    client = make_client(fake, base_backoff=60.0)
+    fake.fail_parks.add(64)
+    for _ in range(3):
+        with pytest.raises(UpstreamError):
+            client.fetch_wait_times(64)
+    served = fake.requests_served
+
+    with pytest.raises(CircuitOpenError):
+        client.fetch_wait_times(64)
+    assert fake.requests_served == served
+    assert client.status()[64]["state"] == CircuitBreaker.OPEN
+
+    assert set(client.fetch_wait_times(65)) <= set(PARKS[65])  # other parks are unaffected
+
+
+def test_half_open_probe_recovers(fake):
+    client = make_client(fake)
+    fake.fail_parks.add(64)
+    for _ in range(3):
+        with pytest.raises(UpstreamError):
+            client.fetch_wait_times(64)
+    with pytest.raises(CircuitOpenError):
+        client.fetch_wait_times(64)
+
+    fake.fail_parks.clear()
+    time.sleep(0.06)
+    assert set(client.fetch_wait_times(64)) <= set(PARKS[64])
+    assert client.breaker(64).state == CircuitBreaker.CLOSED
+
+
+def test_cache_keeps_serving_last_good_snapshot_while_open(fake, tmp_path):
+    client = make_client(fake, base_backoff=60.0)
+    cache = WaitTimeCache(client.fetch_wait_times, str(tmp_path), ttl=60)
+    good = cache.refresh(64, force=True)
+    assert good.fetched_at is not None
+
+    fake.fail_parks.add(64)
+    for _ in range(5):  # failing, then failing fast once the breaker opens
+        assert cache.refresh(64, force=True).version == good.version
+    assert client.breaker(64).state == CircuitBreaker.OPEN
+    assert cache.get(64).wait_times == good.wait_times
+
+
+def test_async_client_shares_the_sync_breakers(fake):
+    pytest.importorskip("httpx")
+    client = make_client(fake, base_backoff=60.0)
+    async_client = AsyncUpstreamClient(fake.base_url, client.breaker, timeout=(1.0, 1.0))
+    fake.fail_parks.add(64)
+
+    async def fail_three_times():
+        try:
+            for _ in range(3):
+                with pytest.raises(UpstreamError):
+                    await async_client.fetch_wait_times(64)
+            with pytest.raises(CircuitOpenError):
+                await async_client.fetch_wait_times(64)
+            return await async_client.fetch_wait_times(65)
+        finally:
+            await async_client.aclose()
+
+    assert set(asyncio.run(fail_three_times())) <= set(PARKS[65])
+    with pytest.raises(CircuitOpenError):
+        client.fetch_wait_times(64)  # opened by the async path
@@ -0,0 +1,128 @@
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from wait_forecast import BUCKETS_PER_DAY, WEATHER_FACTORS, WEEK_BUCKETS, WaitForecaster
+from wait_history import WaitHistory
+
+TZ = ZoneInfo("America/New_York")
+PARK_ID = 64
+
+
+def local(day, hour, minute, second=0):
+    """Epoch time on 2026-06-<day> in park-local time; June 1st 2026 is a Monday."""
+    return datetime(2026, 6, day, hour, minute, second, tzinfo=TZ).timestamp()
+
+
+def bucket(weekday, hour, minute):
+    return weekday * BUCKETS_PER_DAY + (hour * 60 + minute) // 15
+
+
+def build(tmp_path, rows, park_id=PARK_ID):
+    history = WaitHistory(str(tmp_path))
+    for ts, wait_times in rows:
+        history.append(park_id, wait_times, ts)
+    forecaster = WaitForecaster(history, [park_id])
+    forecaster.rebuild(now=local(14, 0, 0))
+    return forecaster
+
+
+def test_rows_land_in_their_weekday_and_quarter_hour(tmp_path):
+    forecaster = build(tmp_path, [
+        (local(1, 10, 14, 59), {"A": 10}),   # Monday, last second of 10:00-10:15
+        (local(1, 10, 15), {"A": 40}),       # Monday, first second of 10:15-10:30
+        (local(2, 10, 15), {"A": 70}),       # Tuesday, same time of day
+        (local(7, 23, 59), {"A": 5}),        # Sunday, last bucket of the week
+        (local(8, 10, 15), {"A": 60}),       # the Monday after
+    ])
+    curve = forecaster.curve(PARK_ID, "A")
+
+    assert len(curve) == WEEK_BUCKETS
+    assert curve[bucket(0, 10, 0)] == 10
+    assert curve[bucket(0, 10, 15)] == 50
+    assert curve[bucket(1, 10, 15)] == 70
+    assert curve[WEEK_BUCKETS - 1] == 5
+    assert forecaster.minute_of_week(local(7, 23, 59)) == 7 * 1440 - 1
+
+
+def test_empty_bucket_falls_back_to_same_time_on_any_weekday(tmp_path):
+    forecaster = build(tmp_path, [
+        (local(1, 10, 15), {"A": 40}),
+        (local(2, 10, 15), {"A": 70, "B": 30}),
+        (local(2, 10, 30), {"A": None}),  # closed rows don't count
+    ])
+    curve = forecaster.curve(PARK_ID, "A")
+
+    assert curve[bucket(2, 10, 15)] == 55      # Wednesday: mean of Monday and Tuesday
+    assert curve[bucket(1, 10, 30)] is None     # never seen open at 10:30
+    assert forecaster.curve(PARK_ID, "B")[bucket(0, 10, 15)] == 30
+    assert forecaster.curve(PARK_ID, "Unknown") is None
+    assert forecaster.curve(65, "A") is None
+
+
+def test_weather_scales_the_curve(tmp_path):
+    forecaster = build(tmp_path, [(local(1, 10, 15), {"A": 40})])
+    b = bucket(0, 10, 15)
+
+    assert forecaster.curve(PARK_ID, "A", "rainy")[b] == 40 * WEATHER_FACTORS["rainy"]
+    assert forecaster.curve(PARK_ID, "A", "Stormy")[b] == 40 * WEATHER_FACTORS["stormy"]
+    assert forecaster.curve(PARK_ID, "A", "volcanic")[b] == 40  # unknown weather: no scaling
+    assert forecaster.curve(PARK_ID, "A")[b] == 40
+
+
+def test_forecast_shifts_live_wait_by_the_curve(tmp_path):
+    forecaster = build(tmp_path, [
+        (local(1, 10, 0), {"A": 20}),
+        (local(1, 10, 15), {"A": 50}),
+        (local(7, 23, 45), {"A": 30}),
+        (local(8, 0, 0), {"A": 10}),
+    ])
+    curve = forecaster.curve(PARK_ID, "A")
+    now = forecaster.minute_of_week(local(1, 10, 10))
+
+    assert forecaster.forecast(curve, 25, now, 4) == 25           # same bucket on arrival
+    assert forecaster.forecast(curve, 25, now, 5) == 55           # arrives in the busier bucket
+    assert forecaster.forecast(curve, 25, now, 30) == 25          # no history for 10:30
+    assert forecaster.forecast(curve, None, now, 5) is None       # closed stays closed
+    assert forecaster.forecast(None, 25, now, 5) == 25            # no curve: the live wait
+
+    sunday_night = forecaster.minute_of_week(local(7, 23, 50))
+    assert forecaster.forecast(curve, 5, sunday_night, 15) == 0   # wraps to Monday, never negative
+
+
+@pytest.fixture
+def frozen_monday(monkeypatch):
+    """The API's clock stopped one second before 10:15 on a Monday."""
+    now = local(1, 10, 14, 59)
+    monkeypatch.setattr(time, "time", lambda: now)
+    return now
+
+
+def test_forecast_responses_carry_predicted_wait(api, client, set_waits, tmp_path, monkeypatch, frozen_monday):
+    park = "Universal Studios"
+    waits = {"Revenge of the Mummy™": 30, "E.T. Adventure™": 10, "Hollywood Rip Ride Rockit™": 45}
+    park_id = set_waits(park, waits)
+    history = WaitHistory(str(tmp_path))
+    history.append(park_id, {name: 20 for name in waits}, local(1, 10, 0))
+    history.append(park_id, {name: 50 for name in waits}, local(1, 10, 15))
+    forecaster = WaitForecaster(history, [park_id])
+    forecaster.rebuild(now=local(1, 11, 0))
+    forecaster._refresher_pid = os.getpid()  # tables are built; no background rebuilds
+    monkeypatch.setattr(api, "FORECASTER", forecaster)
+
+    body = client.post("/recommend", json={"last_ride": "Revenge of the Mummy™", "park": park,
+                                           "wait_source": "forecast", "k": 2}).get_json()
+
+    # Every walk from the Mummy ends after 10:15, in the bucket 30 minutes busier
+    assert body["wait_source"] == "forecast"
+    assert body["predicted_wait_time"] == body["wait_time"] + 30
+    assert len(body["ranked"]) == 2
+    for entry in body["ranked"]:
+        assert entry["predicted_wait_time"] == entry["wait_time"] + 30
+
+    live = client.post("/recommend", json={"last_ride": "Revenge of the Mummy™", "park": park,
+                                           "wait_source": "live"}).get_json()
+    assert "predicted_wait_time" not in live
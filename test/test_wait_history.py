@@ -0,0 +1,86 @@
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from wait_history import MAX_WAIT, WaitHistory
+
+TZ = ZoneInfo("America/New_York")
+T0 = 1_700_000_000
+
+
+def local(*args):
+    return int(datetime(*args, tzinfo=TZ).timestamp())
+
+
+def test_append_query_round_trip(tmp_path):
+    history = WaitHistory(str(tmp_path))
+    history.append(64, {"A": 10, "B": 25}, T0)
+    history.append(64, {"A": 15, "B": 30}, T0 + 60)
+    history.append(64, {"A": 20, "B": 35}, T0 + 120)
+
+    assert history.ride_names(64) == ["A", "B"]
+    assert history.query(64, "A", T0, T0 + 180) == [(T0, 10), (T0 + 60, 15), (T0 + 120, 20)]
+    assert history.query(64, "B", T0 + 60, T0 + 120) == [(T0 + 60, 30)]  # end is exclusive
+    assert history.query(64, "Unknown", T0, T0 + 180) == []
+    assert history.query(65, "A", T0, T0 + 180) == []
+
+
+def test_open_and_closed_encoding(tmp_path):
+    history = WaitHistory(str(tmp_path))
+    history.append(64, {"Open": 0, "Closed": None, "Huge": 10 ** 6, "Negative": -5}, T0)
+    history.append(64, {"Open": 5}, T0 + 60)  # the others went unreported
+
+    assert history.query(64, "Open", T0, T0 + 120) == [(T0, 0), (T0 + 60, 5)]
+    assert history.query(64, "Closed", T0, T0 + 120) == [(T0, None), (T0 + 60, None)]
+    assert history.query(64, "Huge", T0, T0 + 120) == [(T0, MAX_WAIT), (T0 + 60, None)]
+    assert history.query(64, "Negative", T0, T0 + 120) == [(T0, 0), (T0 + 60, None)]
+
+
+def test_new_ride_is_closed_for_earlier_rows(tmp_path):
+    history = WaitHistory(str(tmp_path))
+    history.append(64, {"A": 10}, T0)
+    history.append(64, {"A": 10, "New": 40}, T0 + 60)
+    assert history.query(64, "New", T0, T0 + 120) == [(T0, None), (T0 + 60, 40)]
+
+
+def test_out_of_order_rows_are_dropped(tmp_path):
+    history = WaitHistory(str(tmp_path))
+    history.append(64, {"A": 10}, T0 + 60)
+    history.append(64, {"A": 99}, T0 + 60)
+    history.append(64, {"A": 99}, T0)
+    assert history.query(64, "A", 0, T0 * 2) == [(T0 + 60, 10)]
+
+
+def test_columns_left_uneven_by_a_crash_are_repaired(tmp_path):
+    history = WaitHistory(str(tmp_path))
+    for i in range(3):
+        history.append(64, {"A": 10 + i, "B": 20 + i}, T0 + 60 * i)
+
+    # A crash before the ts.i64 commit: A got its row for the next snapshot, B lost its last one
+    with open(history._ride_path(64, 0), "ab") as f:
+        f.write(b"\x07\x00")
+    with open(history._ride_path(64, 1), "r+b") as f:
+        f.truncate(2 * 2)
+
+    history.append(64, {"A": 13, "B": 23}, T0 + 180)
+
+    for ride_id in (0, 1):
+        assert os.path.getsize(history._ride_path(64, ride_id)) == 4 * 2
+    assert history.query(64, "A", T0, T0 + 240) == [(T0, 10), (T0 + 60, 11), (T0 + 120, 12), (T0 + 180, 13)]
+    assert history.query(64, "B", T0, T0 + 240) == [(T0, 20), (T0 + 60, 21), (T0 + 120, None), (T0 + 180, 23)]
+
+
+def test_hour_window_is_in_park_local_time(tmp_path):
+    history = WaitHistory(str(tmp_path), tz="America/New_York")
+    # Daylight saving starts on 2026-03-08, so 14:00 local is a different UTC hour each day
+    rows = [local(2026, 3, day, hour, minute) for day in (7, 8) for hour, minute in
+            ((13, 59), (14, 0), (14, 45), (15, 0))]
+    for i, ts in enumerate(rows):
+        history.append(64, {"A": i}, ts)
+
+    found = history.query(64, "A", rows[0], rows[-1] + 1, hour_from=14, hour_to=15)
+    assert found == [(local(2026, 3, 7, 14, 0), 1), (local(2026, 3, 7, 14, 45), 2),
+                     (local(2026, 3, 8, 14, 0), 5), (local(2026, 3, 8, 14, 45), 6)]
+
+    late = history.query(64, "A", rows[0], rows[-1] + 1, hour_from=15)
+    assert [wait for _, wait in late] == [3, 7]
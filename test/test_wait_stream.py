@@ -0,0 +1,64 @@
+import time
+
+from wait_stream import DeltaLog
+from wait_time_cache import Snapshot
+
+
+class FakeCache:
+    def __init__(self):
+        self.snapshots = {}
+
+    def set(self, park_id, wait_times, version):
+        self.snapshots[park_id] = Snapshot(park_id, wait_times, time.time(), version)
+
+    def get(self, park_id):
+        return self.snapshots.get(park_id) or Snapshot.empty(park_id)
+
+
+def make_log():
+    cache = FakeCache()
+    cache.set(1, {"Hagrid's": 60}, 5)
+    log = DeltaLog(cache.get, history=4, poll_interval=60)
+    log.watch(1)
+    return cache, log
+
+
+def test_first_connect_gets_snapshot():
+    _, log = make_log()
+    [(version, event)] = log.events_since(1, None)
+    assert version == 5
+    assert event.startswith("id: 5\nevent: snapshot\n")
+
+
+def test_resume_gets_missed_deltas():
+    cache, log = make_log()
+    cache.set(1, {"Hagrid's": 45}, 6)
+    log._observe(1)
+    [(version, event)] = log.events_since(1, 5)
+    assert version == 6
+    assert "event: delta" in event and '"Hagrid\'s":45' in event
+    assert log.events_since(1, 6) == []
+
+
+def test_since_ahead_of_latest_resets_to_snapshot():
+    _, log = make_log()
+    [(version, event)] = log.events_since(1, 10 ** 12)
+    assert version == 5
+    assert "event: snapshot" in event
+
+
+def test_wait_blocks_unless_newer_version():
+    _, log = make_log()
+    started = time.monotonic()
+    assert log.wait(1, 10 ** 12, 0.2) is False
+    assert log.wait(1, 5, 0.2) is False
+    assert time.monotonic() - started >= 0.4
+    assert log.wait(1, 4, 0.2) is True
+    assert log.wait(1, None, 0.2) is True
+
+
+def test_wait_ignores_never_fetched_park():
+    log = DeltaLog(FakeCache().get, poll_interval=60)
+    log.watch(2)
+    assert log.events_since(2, None) == []
+    assert log.wait(2, None, 0.1) is False
@@ -0,0 +1,59 @@
+import os
+import shutil
+
+import pytest
+
+import wait_time_cache
+from wait_time_cache import WaitTimeCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A frozen wall clock the cache reads through time.time()."""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(wait_time_cache.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(cache_dir):
+    fetches = iter(range(100))
+    return WaitTimeCache(lambda park_id: {"Ride": next(fetches)}, str(cache_dir), ttl=60)
+
+
+def test_versions_increase_within_the_same_millisecond(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    first = cache.refresh(64, force=True)
+    second = cache.refresh(64, force=True)
+    assert first.version == 1_700_000_000_000
+    assert second.version == first.version + 1
+
+
+def test_versions_keep_increasing_after_cache_dir_is_wiped(tmp_path, clock):
+    cache_dir = tmp_path / "cache"
+    cache = make_cache(cache_dir)
+    cache.refresh(64, force=True)
+    last = cache.refresh(64, force=True)  # bumped one past the clock
+
+    shutil.rmtree(cache_dir)
+    clock[0] += 0.5
+    assert make_cache(cache_dir).refresh(64, force=True).version > last.version
+
+
+def test_worker_continues_from_a_deleted_snapshot(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.refresh(64, force=True)
+    last = cache.refresh(64, force=True)
+
+    os.unlink(tmp_path / "park-64.json")  # same millisecond: only this worker's copy is left
+    assert cache.refresh(64, force=True).version > last.version
+
+    shutil.rmtree(tmp_path)
+    assert cache.refresh(64, force=True).version > last.version + 1
+
+
+def test_get_serves_fresh_snapshot_without_refetching(tmp_path):
+    calls = []
+    cache = WaitTimeCache(lambda park_id: calls.append(park_id) or {"Ride": 10}, str(tmp_path), ttl=60)
+    first = cache.get(64)
+    assert cache.get(64).version == first.version
+    assert calls == [64]
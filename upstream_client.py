@@ -0,0 +1,228 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Queue-Times Upstream Client
+#
+# One pooled HTTP session per process (keep-alive, no new TCP+TLS handshake per
+# fetch) and one circuit breaker per park. When a park keeps failing its breaker
+# opens and further fetches fail immediately instead of blocking a worker for
+# the full timeout; after an exponentially growing backoff a single trial fetch
+# is let through (half-open) to see whether upstream has recovered.
+#
+# Failures are raised, never swallowed: the snapshot cache (wait_time_cache.py)
+# catches them and keeps serving the last good snapshot.
+#
+# AsyncUpstreamClient is the same fetch for the ASGI server (asgi.py): it awaits
+# httpx instead of blocking on requests, and shares the sync client's breakers
+# so both see the same per-park health.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx  # only needed for the async server (asgi.py)
+except ImportError:
+    httpx = None
+
+
+class UpstreamError(Exception):
+    """Raised when a park's wait times could not be fetched."""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without touching the network while a park's breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    failure_threshold: consecutive failures that open the breaker
+    base_backoff: seconds the breaker stays open after first tripping
+    max_backoff: cap for the doubling backoff
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=3, base_backoff=5.0, max_backoff=300.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self, now=None):
+        """True if a request may go out now; moves open -> half-open after backoff."""
+        now = now or time.monotonic()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now >= self.retry_at:
+                self.state = self.HALF_OPEN
+                return True  # exactly one trial request
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0
+
+    def record_failure(self, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                backoff = min(self.max_backoff, self.base_backoff * (2 ** self.trips))
+                self.trips += 1
+                self.state = self.OPEN
+                self.retry_at = now + backoff
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in_seconds": max(0.0, round(self.retry_at - time.monotonic(), 1))
+            if self.state == self.OPEN else 0.0,
+        }
+
+
+def parse_wait_times(data):
+    """Turn a queue_times.json payload into {ride_name: wait_minutes} for open rides."""
+    wait_times = {}
+    for land in data.get("lands", []):  # each "land" has a list of rides
+        for ride in land.get("rides", []):
+            name = ride.get("name")
+            wt = ride.get("wait_time", 0)
+            is_open = ride.get("is_open", False)
+            # Only include open rides with positive wait times
+            if name and is_open:
+                wait_times[name] = wt
+    return wait_times
+
+
+def upstream_ride_names(data):
+    """Every ride name in a queue_times.json payload, open or closed."""
+    return [ride["name"] for land in data.get("lands", []) for ride in land.get("rides", [])
+            if ride.get("name")] + [ride["name"] for ride in data.get("rides", []) if ride.get("name")]
+
+
+class UpstreamClient:
+    """
+    base_url: format string with one {} for the park id
+    timeout: (connect, read) seconds for each request
+    pool_size: keep-alive connections kept per host
+    """
+
+    def __init__(self, base_url, timeout=(2.0, 5.0), pool_size=10,
+                 failure_threshold=3, base_backoff=5.0, max_backoff=300.0):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._breakers = {}
+        self._breakers_guard = threading.Lock()
+
+    def breaker(self, park_id):
+        with self._breakers_guard:
+            breaker = self._breakers.get(park_id)
+            if breaker is None:
+                breaker = self._breakers[park_id] = CircuitBreaker(
+                    self.failure_threshold, self.base_backoff, self.max_backoff)
+            return breaker
+
+    def fetch_wait_times(self, park_id):
+        """Fetch one park through its circuit breaker. Raises UpstreamError on failure."""
+        return self._fetch(park_id, parse_wait_times)
+
+    def fetch_ride_names(self, park_id):
+        """Every ride upstream lists for a park, open or closed (for catalog checks)."""
+        return self._fetch(park_id, upstream_ride_names)
+
+    def _fetch(self, park_id, parse):
+        breaker = self.breaker(park_id)
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for park {park_id}")
+
+        url = self.base_url.format(park_id)
+        try:
+            resp = self.session.get(url, timeout=self.timeout)
+            resp.raise_for_status()
+            result = parse(resp.json())
+        except Exception as e:
+            breaker.record_failure()
+            raise UpstreamError(f"park {park_id}: {e}") from e
+
+        breaker.record_success()
+        return result
+
+    def status(self):
+        """Breaker state per park, for diagnostics."""
+        with self._breakers_guard:
+            breakers = dict(self._breakers)
+        return {park_id: b.to_dict() for park_id, b in breakers.items()}
+
+
+class AsyncUpstreamClient:
+    """
+    base_url: format string with one {} for the park id
+    breakers: callable(park_id) -> CircuitBreaker, e.g. UpstreamClient.breaker
+    timeout: (connect, read) seconds for each request
+    pool_size: keep-alive connections kept per host
+    """
+
+    def __init__(self, base_url, breakers, timeout=(2.0, 5.0), pool_size=10):
+        self.base_url = base_url
+        self.breaker = breakers
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._client = None
+        self._client_pid = None
+
+    def _http(self):
+        """One pooled httpx client per process (connections don't survive fork)."""
+        if self._client is None or self._client_pid != os.getpid():
+            if httpx is None:
+                raise UpstreamError("httpx is not installed; pip install httpx")
+            connect, read = self.timeout
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+            )
+            self._client_pid = os.getpid()
+        return self._client
+
+    async def fetch_wait_times(self, park_id):
+        """Fetch one park through its circuit breaker. Raises UpstreamError on failure."""
+        breaker = self.breaker(park_id)
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for park {park_id}")
+
+        url = self.base_url.format(park_id)
+        try:
+            resp = await self._http().get(url)
+            resp.raise_for_status()
+            wait_times = parse_wait_times(resp.json())
+        except Exception as e:
+            breaker.record_failure()
+            raise UpstreamError(f"park {park_id}: {e}") from e
+
+        breaker.record_success()
+        return wait_times
+
+    async def aclose(self):
+        if self._client is not None and self._client_pid == os.getpid():
+            await self._client.aclose()
+        self._client = None
@@ -0,0 +1,178 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Wait-Time Forecasting
+#
+# Predicts what a ride's queue will be when the guest actually gets there,
+# instead of what it is now. Forecasts are precomputed from the history store
+# (wait_history.py) into lookup tables, so a request only does table lookups:
+#
+#   tables[park_id][ride][weather] -> 672 expected waits
+#                                     (7 weekdays x 96 fifteen-minute buckets)
+#
+# Each bucket is the mean open wait seen in that weekday/time slot over the
+# lookback window, falling back to the same time of day on any weekday. The
+# weather dimension scales the curve by WEATHER_FACTORS (we don't record
+# historical weather, so these are fixed multipliers).
+#
+# At request time the live wait is shifted by how the historical curve moves
+# between now and the guest's arrival:
+#
+#   forecast = live + table[arrival bucket] - table[now bucket]
+#
+# Tables are rebuilt on a schedule in a background thread and swapped in whole.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from wait_history import CLOSED
+
+BUCKET_MINUTES = 15
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+WEEK_BUCKETS = 7 * BUCKETS_PER_DAY
+
+# How much busier (>1) or quieter (<1) queues run in each kind of weather
+WEATHER_FACTORS = {
+    "sunny": 1.0,
+    "cloudy": 1.0,
+    "hot": 0.95,
+    "rainy": 0.8,
+    "stormy": 0.6,
+}
+
+
+class WaitForecaster:
+    """
+    history: WaitHistory to learn from
+    park_ids: parks to build tables for
+    lookback_days: how much history each rebuild reads
+    """
+
+    def __init__(self, history, park_ids, lookback_days=56, weather_factors=None):
+        self.history = history
+        self.park_ids = list(park_ids)
+        self.tz = history.tz
+        self.lookback_days = lookback_days
+        self.weather_factors = weather_factors or WEATHER_FACTORS
+        self.tables = {}
+        self.built_at = None
+        self._refresher_pid = None
+
+    # ── inference ───────────────────────────────────────────────────────────────
+
+    def minute_of_week(self, timestamp):
+        """Park-local minutes since Monday 00:00 for an epoch time."""
+        local = datetime.fromtimestamp(timestamp, self.tz)
+        return local.weekday() * 1440 + local.hour * 60 + local.minute + local.second / 60
+
+    def curve(self, park_id, ride_name, weather=None):
+        """The 672-bucket expected-wait curve for a ride, or None without history."""
+        rides = self.tables.get(park_id)
+        if not rides or ride_name not in rides:
+            return None
+        by_weather = rides[ride_name]
+        return by_weather.get((weather or "").lower(), by_weather[None])
+
+    def forecast(self, curve, live_wait, now_minute, travel_minutes):
+        """Expected wait on arrival, from a curve returned by `curve`."""
+        if live_wait is None:
+            return None
+        if curve is None:
+            return live_wait
+        now_bucket = int(now_minute // BUCKET_MINUTES) % WEEK_BUCKETS
+        arrival_bucket = int((now_minute + travel_minutes) // BUCKET_MINUTES) % WEEK_BUCKETS
+        expected_now, expected_arrival = curve[now_bucket], curve[arrival_bucket]
+        if expected_now is None or expected_arrival is None:
+            return live_wait
+        return max(0.0, live_wait + expected_arrival - expected_now)
+
+    # ── table building ──────────────────────────────────────────────────────────
+
+    def rebuild(self, now=None):
+        """Recompute every park's tables from history and swap them in."""
+        now = now or time.time()
+        start = now - self.lookback_days * 86400
+        tables = {}
+        for park_id in self.park_ids:
+            try:
+                tables[park_id] = self._build_park(park_id, start, now)
+            except Exception as e:
+                print(f"Error building wait forecasts for park {park_id}: {e}")
+                tables[park_id] = self.tables.get(park_id, {})
+        self.tables = tables
+        self.built_at = now
+        return tables
+
+    def _build_park(self, park_id, start, end):
+        ts = self.history.timestamps(park_id)
+        if not len(ts):
+            return {}
+        lo, hi = self.history.row_range(park_id, start, end)
+
+        # Bucket of every row; local time only changes bucket every 15 minutes.
+        row_buckets = []
+        last_slot, last_bucket = None, None
+        for i in range(lo, hi):
+            slot = ts[i] // (BUCKET_MINUTES * 60)
+            if slot != last_slot:
+                last_slot = slot
+                last_bucket = int(self.minute_of_week(ts[i]) // BUCKET_MINUTES)
+            row_buckets.append(last_bucket)
+
+        tables = {}
+        for ride_name in self.history.ride_names(park_id):
+            waits = self.history.waits(park_id, ride_name)
+            sums = [0] * WEEK_BUCKETS
+            counts = [0] * WEEK_BUCKETS
+            for offset, i in enumerate(range(lo, min(hi, len(waits)))):
+                w = waits[i]
+                if w != CLOSED:
+                    b = row_buckets[offset]
+                    sums[b] += w
+                    counts[b] += 1
+            base = _bucket_means(sums, counts)
+            if all(v is None for v in base):
+                continue
+            by_weather = {None: tuple(base)}
+            for weather, factor in self.weather_factors.items():
+                by_weather[weather] = tuple(None if v is None else v * factor for v in base)
+            tables[ride_name] = by_weather
+        return tables
+
+    # ── scheduling ──────────────────────────────────────────────────────────────
+
+    def start_refresher(self, interval):
+        """Rebuild now and then every `interval` seconds (once per process)."""
+        if self._refresher_pid == os.getpid():
+            return
+        self._refresher_pid = os.getpid()
+
+        def loop():
+            while True:
+                try:
+                    self.rebuild()
+                except Exception as e:
+                    print(f"Wait forecast refresher error: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name="wait-forecast-refresher", daemon=True).start()
+
+
+def _bucket_means(sums, counts):
+    """Mean per weekday bucket, falling back to the same time of day on any weekday."""
+    tod_sums = [0] * BUCKETS_PER_DAY
+    tod_counts = [0] * BUCKETS_PER_DAY
+    for b in range(WEEK_BUCKETS):
+        tod_sums[b % BUCKETS_PER_DAY] += sums[b]
+        tod_counts[b % BUCKETS_PER_DAY] += counts[b]
+
+    means = []
+    for b in range(WEEK_BUCKETS):
+        if counts[b]:
+            means.append(sums[b] / counts[b])
+        elif tod_counts[b % BUCKETS_PER_DAY]:
+            means.append(tod_sums[b % BUCKETS_PER_DAY] / tod_counts[b % BUCKETS_PER_DAY])
+        else:
+            means.append(None)
+    return means
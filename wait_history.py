@@ -0,0 +1,234 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Historical Wait-Time Store
+#
+# Every park snapshot the cache fetches is appended here, so we can later learn
+# from it (step 8 of the header in predictive_in_park.py). The store is an
+# append-only, column-per-file layout on local disk:
+#
+#   <root>/park-<id>/rides.json      ride names; a ride's position is its int id
+#   <root>/park-<id>/ts.i64          one int64 epoch-seconds timestamp per row
+#   <root>/park-<id>/ride-<n>.i16    one int16 per row for ride n: the wait in
+#                                    minutes, or -1 when the ride was closed or
+#                                    not reported (the sign is the open flag)
+#
+# A year of one-minute snapshots is ~4 MB of timestamps plus ~1 MB per ride
+# (little-endian). Reads memory-map the files, so a query only touches the
+# pages it needs: timestamps are sorted, so each day's time window is found by
+# binary search and only that slice of the ride's column is read.
+#
+# ts.i64 is written last on every append and is the commit point; columns left
+# longer or shorter by a crash are repaired the next time the park is written.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+CLOSED = -1
+MAX_WAIT = 32767
+
+_TS = struct.Struct("<q")
+_WAIT = struct.Struct("<h")
+
+
+class _Column:
+    """Read-only memory map of one column file, remapped when the file grows."""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self._size = -1
+        self._map = None
+        self._view = ()
+
+    def view(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size != self._size:
+            # Old maps are left to the garbage collector: another thread may
+            # still be reading through a view of them.
+            view = ()
+            if size:
+                with open(self.path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(self._map).cast(self.fmt)
+            self._view, self._size = view, size
+        return self._view
+
+
+class WaitHistory:
+    """
+    root: directory holding one sub-directory per park
+    tz: park-local time zone used for hour-of-day queries
+    """
+
+    def __init__(self, root, tz="America/New_York"):
+        self.root = root
+        self.tz = ZoneInfo(tz)
+        self._lock = threading.Lock()
+        self._columns = {}  # path -> _Column
+        os.makedirs(root, exist_ok=True)
+
+    # ── writing ─────────────────────────────────────────────────────────────────
+
+    def append(self, park_id, wait_times, timestamp):
+        """
+        Append one snapshot row. Rides missing from wait_times are recorded as
+        closed; rides seen for the first time get the next int id.
+        Only one process may write a park at a time (the cache's refresh lock).
+        """
+        with self._lock:
+            park_dir = self._park_dir(park_id)
+            os.makedirs(park_dir, exist_ok=True)
+            names = self._read_names(park_id)
+            rows = self._row_count(park_id)
+            if rows and int(timestamp) <= self._last_timestamp(park_id):
+                return  # rows must stay sorted for binary search
+
+            known = set(names)
+            new_names = [n for n in wait_times if n not in known]
+            if new_names:
+                names = names + new_names
+                self._write_names(park_id, names)
+
+            self._repair(park_id, len(names), rows)
+
+            for ride_id, name in enumerate(names):
+                wait = wait_times.get(name)
+                value = CLOSED if wait is None else max(0, min(MAX_WAIT, int(wait)))
+                with open(self._ride_path(park_id, ride_id), "ab") as f:
+                    f.write(_WAIT.pack(value))
+
+            with open(self._ts_path(park_id), "ab") as f:
+                f.write(_TS.pack(int(timestamp)))
+
+    def _repair(self, park_id, ride_count, rows):
+        """Make every ride column exactly `rows` long before appending."""
+        row_bytes = rows * _WAIT.size
+        for ride_id in range(ride_count):
+            path = self._ride_path(park_id, ride_id)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size > row_bytes:
+                with open(path, "r+b") as f:
+                    f.truncate(row_bytes)
+            elif size < row_bytes:
+                padding = (row_bytes - size) // _WAIT.size
+                with open(path, "ab") as f:
+                    f.write(_WAIT.pack(CLOSED) * padding)
+
+    # ── reading ─────────────────────────────────────────────────────────────────
+
+    def ride_names(self, park_id):
+        """Ride names in id order."""
+        return self._read_names(park_id)
+
+    def timestamps(self, park_id):
+        """Memory-mapped int64 timestamps (epoch seconds) for every row."""
+        return self._column(self._ts_path(park_id), "q").view()
+
+    def waits(self, park_id, ride_name):
+        """Memory-mapped int16 waits for one ride (CLOSED = -1), or None if unknown."""
+        names = self._read_names(park_id)
+        if ride_name not in names:
+            return None
+        return self._column(self._ride_path(park_id, names.index(ride_name)), "h").view()
+
+    def row_range(self, park_id, start, end):
+        """(first, last) row indices with start <= ts < end (epoch seconds)."""
+        ts = self.timestamps(park_id)
+        return bisect.bisect_left(ts, math.ceil(start)), bisect.bisect_left(ts, math.ceil(end))
+
+    def query(self, park_id, ride_name, start, end, hour_from=None, hour_to=None):
+        """
+        Waits for one ride between two epoch times, optionally only within a
+        park-local hour window each day (e.g. hour_from=14, hour_to=15).
+        Returns [(timestamp, wait_or_None), ...]; None means closed.
+        """
+        ts = self.timestamps(park_id)
+        waits = self.waits(park_id, ride_name)
+        if waits is None or not len(ts):
+            return []
+        rows = min(len(ts), len(waits))
+
+        results = []
+        for lo_t, hi_t in self._windows(start, end, hour_from, hour_to):
+            lo = bisect.bisect_left(ts, math.ceil(lo_t), 0, rows)
+            hi = bisect.bisect_left(ts, math.ceil(hi_t), lo, rows)
+            for i in range(lo, hi):
+                w = waits[i]
+                results.append((ts[i], None if w == CLOSED else w))
+        return results
+
+    def _windows(self, start, end, hour_from, hour_to):
+        """Epoch [lo, hi) intervals covering start..end, clipped to the daily hour window."""
+        if hour_from is None and hour_to is None:
+            yield start, end
+            return
+        hour_from = hour_from or 0
+        hour_to = 24 if hour_to is None else hour_to
+
+        day = datetime.fromtimestamp(start, self.tz).date()
+        last_day = datetime.fromtimestamp(end, self.tz).date()
+        while day <= last_day:
+            lo = datetime.combine(day, dt_time(hour_from), self.tz).timestamp()
+            if hour_to >= 24:
+                hi = datetime.combine(day + timedelta(days=1), dt_time(0), self.tz).timestamp()
+            else:
+                hi = datetime.combine(day, dt_time(hour_to), self.tz).timestamp()
+            lo, hi = max(lo, start), min(hi, end)
+            if lo < hi:
+                yield lo, hi
+            day += timedelta(days=1)
+
+    # ── files ───────────────────────────────────────────────────────────────────
+
+    def _park_dir(self, park_id):
+        return os.path.join(self.root, f"park-{park_id}")
+
+    def _ts_path(self, park_id):
+        return os.path.join(self._park_dir(park_id), "ts.i64")
+
+    def _ride_path(self, park_id, ride_id):
+        return os.path.join(self._park_dir(park_id), f"ride-{ride_id}.i16")
+
+    def _names_path(self, park_id):
+        return os.path.join(self._park_dir(park_id), "rides.json")
+
+    def _row_count(self, park_id):
+        try:
+            return os.path.getsize(self._ts_path(park_id)) // _TS.size
+        except FileNotFoundError:
+            return 0
+
+    def _last_timestamp(self, park_id):
+        with open(self._ts_path(park_id), "rb") as f:
+            f.seek(-_TS.size, os.SEEK_END)
+            return _TS.unpack(f.read(_TS.size))[0]
+
+    def _read_names(self, park_id):
+        try:
+            with open(self._names_path(park_id), encoding="utf-8") as f:
+                return json.load(f)["names"]
+        except FileNotFoundError:
+            return []
+
+    def _write_names(self, park_id, names):
+        path = self._names_path(park_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"names": names}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _column(self, path, fmt):
+        column = self._columns.get(path)
+        if column is None:
+            column = self._columns[path] = _Column(path, fmt)
+        return column
@@ -0,0 +1,166 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Wait-Time Delta Stream
+#
+# Lets clients subscribe to a park instead of polling /recommend. One pump
+# thread per worker watches the shared snapshot cache (wait_time_cache.py) for
+# new versions of the parks someone is subscribed to; each new version is
+# diffed against the previous one once, serialized once as a Server-Sent
+# Event, and appended to a per-park ring buffer. Every subscriber then just
+# reads the same pre-rendered events, so a snapshot costs one diff however
+# many clients are connected.
+#
+#   event: snapshot   full {ride: wait} map (first connect, or resume too old)
+#   event: delta      {ride: wait or null} for rides whose wait or open status
+#                     changed since base_version (null = closed / not reported)
+#
+# The SSE id is the snapshot version, which only ever increases, so a client
+# reconnecting with Last-Event-ID (or ?since=) gets exactly the deltas it
+# missed, or a fresh snapshot if they have dropped out of the buffer (or if
+# its version is ahead of ours, e.g. after the snapshot cache was reset).
+# ────────────────────────────────────────────────────────────────────────────────
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+def diff_wait_times(old, new):
+    """{ride: new_wait_or_None} for every ride whose wait or open status changed."""
+    changes = {name: wait for name, wait in new.items() if old.get(name) != wait}
+    for name in old:
+        if name not in new:
+            changes[name] = None
+    return changes
+
+
+def format_event(event, version, data):
+    """One Server-Sent Event frame."""
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class _ParkLog:
+    def __init__(self, history):
+        self.latest = None                    # last Snapshot seen
+        self.snapshot_event = None            # latest rendered as a full "snapshot" event
+        self.deltas = deque(maxlen=history)   # (base_version, version, rendered "delta" event)
+
+
+class DeltaLog:
+    """
+    get_snapshot: callable(park_id) -> Snapshot (e.g. WaitTimeCache.get)
+    history: how many deltas per park are kept for resuming clients
+    poll_interval: seconds between checks for a new snapshot version
+    """
+
+    def __init__(self, get_snapshot, history=256, poll_interval=1.0):
+        self.get_snapshot = get_snapshot
+        self.history = history
+        self.poll_interval = poll_interval
+        self._parks = {}                      # park_id -> _ParkLog
+        self._changed = threading.Condition()
+        self._pump_pid = None
+
+    # ── subscribers ─────────────────────────────────────────────────────────────
+
+    def watch(self, park_id):
+        """Start following a park (and the pump thread) if we aren't already."""
+        with self._changed:
+            if park_id not in self._parks:
+                self._parks[park_id] = _ParkLog(self.history)
+        if self._parks[park_id].latest is None:
+            self._observe(park_id)
+        self._ensure_pump()
+
+    def latest_version(self, park_id):
+        log = self._parks.get(park_id)
+        return None if log is None or log.latest is None else log.latest.version
+
+    def events_since(self, park_id, since):
+        """
+        [(version, rendered event), ...] that bring a client at version `since`
+        up to date: the missed deltas, a full snapshot, or nothing. A `since`
+        ahead of the latest version (the cache was reset, or the client
+        resumed from a worker that is further along) gets a fresh snapshot too.
+        """
+        log = self._parks.get(park_id)
+        if log is None or log.latest is None or log.latest.fetched_at is None:
+            return []
+        latest = log.latest.version
+        if since == latest:
+            return []  # up to date
+
+        if since is not None and since < latest:
+            deltas = list(log.deltas)
+            for start, (base, _, _) in enumerate(deltas):
+                if base == since:
+                    return [(version, event) for _, version, event in deltas[start:]]
+        return [(latest, log.snapshot_event)]
+
+    def wait(self, park_id, version, timeout):
+        """Block until the park has a snapshot newer than `version`; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                log = self._parks.get(park_id)
+                latest = log.latest if log is not None else None
+                if latest is not None and latest.fetched_at is not None and (version is None or latest.version > version):
+                    return True  # a client ahead of us is reset by events_since, not here
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+
+    # ── pump ────────────────────────────────────────────────────────────────────
+
+    def _observe(self, park_id):
+        """Record the park's current snapshot if its version is new."""
+        snapshot = self.get_snapshot(park_id)
+        log = self._parks[park_id]
+        previous = log.latest
+        if previous is not None and snapshot.version == previous.version:
+            return
+
+        snapshot_event = format_event("snapshot", snapshot.version, {
+            "park_id": park_id,
+            "version": snapshot.version,
+            "fetched_at": snapshot.fetched_at,
+            "wait_times": snapshot.wait_times,
+        })
+        delta = None
+        if previous is not None and previous.version < snapshot.version:
+            delta = (previous.version, snapshot.version, format_event("delta", snapshot.version, {
+                "park_id": park_id,
+                "version": snapshot.version,
+                "base_version": previous.version,
+                "fetched_at": snapshot.fetched_at,
+                "changes": diff_wait_times(previous.wait_times, snapshot.wait_times),
+            }))
+
+        with self._changed:
+            if log.latest is not previous:
+                return  # the pump and a new subscriber raced; the other one recorded it
+            if delta is None:
+                log.deltas.clear()  # first sight, or the cache was reset
+            else:
+                log.deltas.append(delta)
+            log.latest, log.snapshot_event = snapshot, snapshot_event
+            self._changed.notify_all()
+
+    def _ensure_pump(self):
+        """One pump thread per process (threads don't survive a fork)."""
+        if self._pump_pid == os.getpid():
+            return
+        self._pump_pid = os.getpid()
+
+        def loop():
+            while True:
+                for park_id in list(self._parks):
+                    try:
+                        self._observe(park_id)
+                    except Exception as e:
+                        print(f"Wait-time stream error for park {park_id}: {e}")
+                time.sleep(self.poll_interval)
+
+        threading.Thread(target=loop, name="wait-time-stream", daemon=True).start()
@@ -0,0 +1,372 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Wait-Time Snapshot Cache
+#
+# Sits in front of the queue-times.com fetch so that guests never wait on the
+# upstream API. Every park has one snapshot file in a shared directory; all
+# gunicorn workers read the same files, and only one of them refreshes a park
+# at a time (a per-park thread lock inside a worker, plus a file lock across
+# workers). Snapshots are served with stale-while-revalidate semantics:
+#
+#   age < ttl                → served as-is
+#   ttl <= age < max_stale   → served as-is, a refresh is kicked off in the background
+#   age >= max_stale / none  → the caller waits for a refresh
+#
+# A background refresher thread keeps every registered park warm, fetching
+# stale parks in parallel.
+#
+# Snapshot versions are derived from the fetch time, so they keep growing
+# across a wiped cache directory (reboot, tmp cleaner, new container) as long
+# as the clock has moved past the last version; a worker that saw the lost
+# snapshot continues from it. Stream ids, ETags and response-cache keys rely on
+# that, and both the stream and the response cache recover from a regression.
+#
+# get_async / refresh_async are the same lookups for the ASGI server: a miss
+# awaits `fetch_async` on the event loop instead of blocking a thread, and
+# concurrent coroutines for one park share a single in-flight fetch task.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl  # POSIX only; on Windows we fall back to per-worker locking
+except ImportError:
+    fcntl = None
+
+
+class Snapshot:
+    """One park's wait times as fetched at `fetched_at` (epoch seconds)."""
+
+    __slots__ = ("park_id", "wait_times", "fetched_at", "version")
+
+    def __init__(self, park_id, wait_times, fetched_at, version):
+        self.park_id = park_id
+        self.wait_times = wait_times
+        self.fetched_at = fetched_at
+        self.version = version
+
+    def age(self, now=None):
+        """Seconds since the snapshot was fetched, or None if it never was."""
+        if self.fetched_at is None:
+            return None
+        return max(0.0, (now or time.time()) - self.fetched_at)
+
+    def to_dict(self):
+        return {
+            "park_id": self.park_id,
+            "wait_times": self.wait_times,
+            "fetched_at": self.fetched_at,
+            "version": self.version,
+        }
+
+    @classmethod
+    def empty(cls, park_id):
+        return cls(park_id, {}, None, 0)
+
+
+class WaitTimeCache:
+    """
+    fetch_fn: callable(park_id) -> {ride_name: wait_minutes}; must raise on failure
+    cache_dir: directory shared by every worker process
+    ttl: seconds a snapshot is considered fresh
+    max_stale: seconds a stale snapshot may still be served while refreshing
+    fetch_async: optional coroutine function(park_id) for get_async; without it
+                 fetch_fn runs in a worker thread
+    """
+
+    def __init__(self, fetch_fn, cache_dir, ttl=60, max_stale=600, fetch_async=None):
+        self.fetch_fn = fetch_fn
+        self.fetch_async = fetch_async
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.park_ids = []
+        self.listeners = []        # callables(snapshot) run after each successful refresh
+        self.hits = 0              # served fresh
+        self.stale_hits = 0        # served stale while refreshing in the background
+        self.misses = 0            # caller had to wait for upstream
+
+        self._memory = {}          # park_id -> (file stat key, Snapshot)
+        self._locks = {}           # park_id -> threading.Lock (single-flight)
+        self._locks_guard = threading.Lock()
+        self._inflight = {}        # park_id -> asyncio.Task of refresh_async
+        self._refresher_pid = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ── public API ──────────────────────────────────────────────────────────────
+
+    def get(self, park_id):
+        """Return the best available Snapshot for a park (never raises)."""
+        self._ensure_refresher()
+        snapshot = self._load(park_id)
+        age = snapshot.age()
+
+        if age is not None and age < self.ttl:
+            self.hits += 1
+            return snapshot
+        if age is not None and age < self.max_stale:
+            self.stale_hits += 1
+            self._refresh_in_background(park_id)
+            return snapshot
+        self.misses += 1
+        return self.refresh(park_id)
+
+    def peek(self, park_id):
+        """The stored Snapshot for a park, without triggering any refresh."""
+        return self._load(park_id)
+
+    def refresh(self, park_id, force=False):
+        """
+        Fetch a new snapshot unless another thread or worker already did.
+        Concurrent callers for the same park share a single upstream request.
+        """
+        lock = self._lock_for(park_id)
+        if not lock.acquire(blocking=False):
+            # Someone in this worker is already fetching; wait for their result.
+            with lock:
+                pass
+            return self._load(park_id)
+
+        try:
+            with self._file_lock(park_id):
+                current = self._load(park_id)
+                age = current.age()
+                if not force and age is not None and age < self.ttl:
+                    return current  # another worker refreshed while we waited
+
+                try:
+                    wait_times = self.fetch_fn(park_id)
+                except Exception as e:
+                    print(f"Error refreshing wait times for park {park_id}: {e}")
+                    return current  # keep serving the last good snapshot
+
+                snapshot = _next_snapshot(current, wait_times)
+                self._store(snapshot)
+                self._notify(snapshot)
+                return snapshot
+        finally:
+            lock.release()
+
+    async def get_async(self, park_id):
+        """get() for the event loop: never blocks on upstream or on other workers."""
+        self._ensure_refresher()
+        snapshot = self._load(park_id)
+        age = snapshot.age()
+
+        if age is not None and age < self.ttl:
+            self.hits += 1
+            return snapshot
+        if age is not None and age < self.max_stale:
+            self.stale_hits += 1
+            self._refresh_task(park_id)
+            return snapshot
+        self.misses += 1
+        return await self.refresh_async(park_id)
+
+    async def refresh_async(self, park_id, force=False):
+        """refresh() for the event loop; coroutines for one park share one fetch."""
+        return await asyncio.shield(self._refresh_task(park_id, force))
+
+    def _refresh_task(self, park_id, force=False):
+        task = self._inflight.get(park_id)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._inflight[park_id] = asyncio.ensure_future(self._refresh_async(park_id, force))
+        return task
+
+    async def _refresh_async(self, park_id, force):
+        lock = self._lock_for(park_id)
+        if not lock.acquire(blocking=False):
+            # The refresher thread is already fetching this park; wait for it off the loop.
+            await asyncio.to_thread(_wait_released, lock)
+            return self._load(park_id)
+
+        try:
+            file_lock = self._file_lock(park_id)
+            await asyncio.to_thread(file_lock.__enter__)  # another worker may hold it
+            try:
+                current = self._load(park_id)
+                age = current.age()
+                if not force and age is not None and age < self.ttl:
+                    return current  # another worker refreshed while we waited
+
+                try:
+                    if self.fetch_async is not None:
+                        wait_times = await self.fetch_async(park_id)
+                    else:
+                        wait_times = await asyncio.to_thread(self.fetch_fn, park_id)
+                except Exception as e:
+                    print(f"Error refreshing wait times for park {park_id}: {e}")
+                    return current  # keep serving the last good snapshot
+
+                snapshot = _next_snapshot(current, wait_times)
+                self._store(snapshot)
+                self._notify(snapshot)
+                return snapshot
+            finally:
+                file_lock.__exit__(None, None, None)
+        finally:
+            lock.release()
+
+    def add_listener(self, fn):
+        """
+        Call fn(snapshot) for every new snapshot. Listeners run in the worker that
+        fetched it, while it still holds the park's file lock, so across all
+        workers each snapshot is seen by exactly one listener call.
+        """
+        self.listeners.append(fn)
+
+    def _notify(self, snapshot):
+        for fn in self.listeners:
+            try:
+                fn(snapshot)
+            except Exception as e:
+                print(f"Wait-time listener error for park {snapshot.park_id}: {e}")
+
+    def register(self, park_ids):
+        """Parks the background refresher keeps warm."""
+        self.park_ids = list(park_ids)
+
+    def refresh_all(self):
+        """Refresh every registered park whose snapshot is no longer fresh, concurrently."""
+        stale = []
+        for park_id in self.park_ids:
+            age = self._load(park_id).age()
+            if age is None or age >= self.ttl:
+                stale.append(park_id)
+        if len(stale) <= 1:
+            for park_id in stale:
+                self.refresh(park_id)
+            return
+        with ThreadPoolExecutor(max_workers=len(stale), thread_name_prefix="wait-time-fetch") as pool:
+            list(pool.map(self.refresh, stale))
+
+    # ── background refresh ──────────────────────────────────────────────────────
+
+    def start_refresher(self, interval=None):
+        """
+        Start the refresher thread for this process. Safe to call repeatedly and
+        after a fork: threads don't survive fork, so each worker starts its own.
+        """
+        if self._refresher_pid == os.getpid():
+            return
+        self._refresher_pid = os.getpid()
+        interval = interval or max(1.0, self.ttl / 2)
+
+        def loop():
+            while True:
+                try:
+                    self.refresh_all()
+                except Exception as e:
+                    print(f"Wait-time refresher error: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name="wait-time-refresher", daemon=True).start()
+
+    def _ensure_refresher(self):
+        if self.park_ids and self._refresher_pid != os.getpid():
+            self.start_refresher()
+
+    def _refresh_in_background(self, park_id):
+        if self._lock_for(park_id).locked():
+            return  # a refresh is already in flight
+        threading.Thread(target=self.refresh, args=(park_id,), daemon=True).start()
+
+    # ── storage ─────────────────────────────────────────────────────────────────
+
+    def _path(self, park_id):
+        return os.path.join(self.cache_dir, f"park-{park_id}.json")
+
+    def _load(self, park_id):
+        """Read the shared snapshot file, reusing the parsed copy if unchanged."""
+        path = self._path(park_id)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return self._memory.get(park_id, (None, Snapshot.empty(park_id)))[1]
+
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._memory.get(park_id)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            snapshot = Snapshot(park_id, data["wait_times"], data["fetched_at"], data["version"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable wait-time snapshot {path}: {e}")
+            return cached[1] if cached else Snapshot.empty(park_id)
+
+        self._memory[park_id] = (key, snapshot)
+        return snapshot
+
+    def _store(self, snapshot):
+        """Write atomically so readers in other workers never see a partial file."""
+        path = self._path(snapshot.park_id)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".park-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot.to_dict(), f)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        # Kept as the fallback if the file disappears, so the next version still follows it
+        self._memory[snapshot.park_id] = (None, snapshot)
+
+    def _lock_for(self, park_id):
+        with self._locks_guard:
+            lock = self._locks.get(park_id)
+            if lock is None:
+                lock = self._locks[park_id] = threading.Lock()
+            return lock
+
+    def _file_lock(self, park_id):
+        os.makedirs(self.cache_dir, exist_ok=True)  # a tmp cleaner may have removed it
+        return _FileLock(os.path.join(self.cache_dir, f"park-{park_id}.lock"))
+
+
+def _next_snapshot(current, wait_times):
+    """
+    The snapshot after `current`. Versions are milliseconds since the epoch,
+    bumped past the previous one if the clock hasn't moved. When the cache
+    directory was wiped and `current` is empty, the new version is only
+    larger than the lost one if the clock has passed it since.
+    """
+    fetched_at = time.time()
+    return Snapshot(current.park_id, wait_times, fetched_at, max(current.version + 1, int(fetched_at * 1000)))
+
+
+def _wait_released(lock):
+    with lock:
+        pass
+
+
+class _FileLock:
+    """Exclusive advisory lock shared by every worker on the same machine."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        return False
@@ -0,0 +1,141 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# Park Walkway Graphs
+#
+# Straight-line distance badly underestimates walks around lagoons and walls
+# (e.g. across the Islands of Adventure lagoon). A walkway graph describes the
+# paths guests can actually take; it is loaded at startup and every shortest
+# walk is precomputed, so scoring stays a matrix lookup per ride pair.
+#
+# File format, one JSON file per park (see data/walkways/README.md):
+#
+#   {
+#     "park": "Islands of Adventure",
+#     "version": 1,
+#     "nodes": [
+#       {"id": "port-of-entry", "lat": 28.4718, "lon": -81.4705},
+#       {"id": "hippogriff", "lat": 28.472233, "lon": -81.472426,
+#        "ride": "Flight of the Hippogriff™"}
+#     ],
+#     "edges": [
+#       ["port-of-entry", "hippogriff"],
+#       ["a", "b", {"meters": 120, "seconds": 150}]
+#     ]
+#   }
+#
+# Nodes are junctions or ride entrances ("ride" is the ride's catalog name).
+# Edges are two-way; length defaults to the straight line between the nodes and
+# walking time to length / walking speed.
+#
+# Shortest distances, walk times and predecessors for all node pairs are kept in
+# flat typed arrays (n x n), so a 300-node park costs about 1.8 MB.
+# ────────────────────────────────────────────────────────────────────────────────
+
+import heapq
+import json
+import os
+import re
+from array import array
+
+UNREACHABLE = float("inf")
+
+
+class WalkwayGraph:
+    """
+    nodes: [{"id", "lat", "lon", optional "ride"}]
+    edges: [[a_id, b_id, optional {"meters", "seconds"}]]
+    """
+
+    def __init__(self, nodes, edges, distance_fn, walking_speed_mps=1.4, version=None):
+        self.version = version
+        self.ids = [node["id"] for node in nodes]
+        self.coords = [(float(node["lat"]), float(node["lon"])) for node in nodes]
+        self.node_index = {node_id: i for i, node_id in enumerate(self.ids)}
+        if len(self.node_index) != len(self.ids):
+            raise ValueError("duplicate node ids in walkway graph")
+        self.ride_nodes = {node["ride"]: i for i, node in enumerate(nodes) if node.get("ride")}
+
+        self.adjacency = [[] for _ in self.ids]  # i -> [(j, meters, seconds)]
+        for edge in edges:
+            a, b = self.node_index[edge[0]], self.node_index[edge[1]]
+            extra = edge[2] if len(edge) > 2 else {}
+            meters = float(extra.get("meters", distance_fn(self.coords[a], self.coords[b])))
+            seconds = float(extra.get("seconds", meters / walking_speed_mps))
+            self.adjacency[a].append((b, meters, seconds))
+            self.adjacency[b].append((a, meters, seconds))
+
+        self.distance_fn = distance_fn
+        self._all_pairs()
+
+    @classmethod
+    def load(cls, path, distance_fn, walking_speed_mps=1.4):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["nodes"], data["edges"], distance_fn, walking_speed_mps, data.get("version"))
+
+    def _all_pairs(self):
+        """Dijkstra from every node into flat n x n arrays."""
+        n = len(self.ids)
+        self.meters = array("d", [UNREACHABLE]) * (n * n)
+        self.seconds = array("d", [UNREACHABLE]) * (n * n)
+        self.pred = array("i", [-1]) * (n * n)
+
+        for source in range(n):
+            base = source * n
+            self.meters[base + source] = 0.0
+            self.seconds[base + source] = 0.0
+            heap = [(0.0, source)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > self.meters[base + u]:
+                    continue
+                for v, meters, seconds in self.adjacency[u]:
+                    nd = d + meters
+                    if nd < self.meters[base + v]:
+                        self.meters[base + v] = nd
+                        self.seconds[base + v] = self.seconds[base + u] + seconds
+                        self.pred[base + v] = u
+                        heapq.heappush(heap, (nd, v))
+
+    def distance(self, a, b):
+        """Shortest walk in meters between two node indices."""
+        return self.meters[a * len(self.ids) + b]
+
+    def walk_seconds(self, a, b):
+        """Walking time in seconds along the shortest walk between two node indices."""
+        return self.seconds[a * len(self.ids) + b]
+
+    def path(self, a, b):
+        """[(lat, lon), ...] along the shortest walk from node a to node b, or None."""
+        n = len(self.ids)
+        if self.meters[a * n + b] == UNREACHABLE:
+            return None
+        nodes = [b]
+        while nodes[-1] != a:
+            nodes.append(self.pred[a * n + nodes[-1]])
+        return [self.coords[i] for i in reversed(nodes)]
+
+    def nearest_node(self, coord):
+        """(node index, meters) of the node closest to a position."""
+        return min(
+            ((i, self.distance_fn(coord, c)) for i, c in enumerate(self.coords)),
+            key=lambda pair: pair[1],
+        )
+
+
+def park_slug(park_name):
+    """File name stem for a park: 'Islands of Adventure' -> 'islands_of_adventure'."""
+    return re.sub(r"[^0-9a-z]+", "_", park_name.lower()).strip("_")
+
+
+def load_park_walkways(directory, park_names, distance_fn, walking_speed_mps=1.4):
+    """{park_name: WalkwayGraph} for every park with a <slug>.json file in directory."""
+    graphs = {}
+    for park_name in park_names:
+        path = os.path.join(directory, f"{park_slug(park_name)}.json")
+        if not os.path.exists(path):
+            continue
+        try:
+            graphs[park_name] = WalkwayGraph.load(path, distance_fn, walking_speed_mps)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"Ignoring walkway graph {path}: {e}")
+    return graphs